@@ -0,0 +1,215 @@
+"""
+Persistent answer cache for /api/chat, shared by every worker process.
+
+Answers live in a SQLite database in WAL mode, so readers in any number of
+processes never block on the single writer. Each thread keeps its own
+connection, and the statements are fixed strings so sqlite3's statement cache
+prepares them once per connection. Writes are queued and flushed in batches by
+a background thread, so a request never waits on the disk. Entries expire after
+`ttl` seconds and the table is trimmed to `max_entries` (oldest first) after
+every flush. On open, the newest entries are read into memory so the first
+requests after a restart don't touch the database at all.
+
+With a `soft_ttl` below `ttl`, an entry older than `soft_ttl` is still served
+but reported as stale, and `refresh()` recomputes it on a background thread
+(one refresh per key per process at a time). Only past `ttl` does a request
+have to wait for a new answer.
+"""
+
+import hashlib
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from api.context import fingerprint, normalize_question
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS answers ("
+    " key TEXT PRIMARY KEY, reply TEXT NOT NULL, created REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS answers_created ON answers (created)",
+)
+SELECT_SQL = "SELECT reply, created FROM answers WHERE key = ? AND created > ?"
+UPSERT_SQL = "INSERT OR REPLACE INTO answers (key, reply, created) VALUES (?, ?, ?)"
+EXPIRE_SQL = "DELETE FROM answers WHERE created <= ?"
+TRIM_SQL = (
+    "DELETE FROM answers WHERE key IN"
+    " (SELECT key FROM answers ORDER BY created DESC LIMIT -1 OFFSET ?)"
+)
+WARM_SQL = "SELECT key, reply, created FROM answers WHERE created > ? ORDER BY created DESC LIMIT ?"
+
+
+def cache_key(question: str, context_hash: str, history: Optional[List[dict]] = None) -> str:
+    """Key covering everything the answer depends on: question, context and prior turns."""
+    history_hash = fingerprint(json.dumps(history or [], sort_keys=True, separators=(',', ':')))
+    raw = '\0'.join((normalize_question(question), context_hash, history_hash))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class AnswerCache:
+    def __init__(self, path: str, ttl: float = 86400.0, max_entries: int = 5000,
+                 warm_entries: int = 256, batch_size: int = 64, clock=time.time, soft_ttl: float = 0.0,
+                 refresh_workers: int = 2, on_event: Optional[Callable[[str], None]] = None):
+        self.path = path
+        self.ttl = ttl
+        self.soft_ttl = soft_ttl if 0 < soft_ttl < ttl else ttl
+        self.on_event = on_event
+        self.max_entries = max_entries
+        self.warm_entries = warm_entries
+        self.batch_size = batch_size
+        self._clock = clock
+        self._local = threading.local()
+        self._connections = []
+        self._conn_lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (reply, created), newest last
+        self._memory_lock = threading.Lock()
+        self._pending = queue.Queue()
+        self._closed = False
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix='answer-cache-refresh')
+
+        conn = self._connection()
+        with conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+        self.warm()
+        self._writer = threading.Thread(target=self._write_loop, name='answer-cache-writer', daemon=True)
+        self._writer.start()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._conn_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _remember(self, key: str, reply: str, created: float):
+        if self.warm_entries <= 0:
+            return
+        with self._memory_lock:
+            self._memory[key] = (reply, created)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.warm_entries:
+                self._memory.popitem(last=False)
+
+    def warm(self) -> int:
+        """Load the newest unexpired entries into memory. Returns how many were loaded."""
+        if self.warm_entries <= 0:
+            return 0
+        rows = self._connection().execute(WARM_SQL, (self._clock() - self.ttl, self.warm_entries)).fetchall()
+        for key, reply, created in reversed(rows):
+            self._remember(key, reply, created)
+        return len(rows)
+
+    def _event(self, name: str):
+        if self.on_event:
+            self.on_event(name)
+
+    def lookup(self, key: str) -> Optional[Tuple[str, bool]]:
+        """(reply, stale) for an unexpired entry, where stale means older than `soft_ttl`."""
+        now = self._clock()
+        cutoff = now - self.ttl
+        with self._memory_lock:
+            hit = self._memory.get(key)
+            if hit is not None and hit[1] > cutoff:
+                self._memory.move_to_end(key)
+                return hit[0], hit[1] <= now - self.soft_ttl
+        try:
+            row = self._connection().execute(SELECT_SQL, (key, cutoff)).fetchone()
+        except sqlite3.Error as e:
+            print(f"⚠️  Answer cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+        self._remember(key, row[0], row[1])
+        return row[0], row[1] <= now - self.soft_ttl
+
+    def get(self, key: str) -> Optional[str]:
+        hit = self.lookup(key)
+        return hit[0] if hit is not None else None
+
+    def refresh(self, key: str, produce: Callable[[], str]) -> bool:
+        """
+        Replace a stale entry with `produce()` in the background. Returns False
+        if a refresh for this key is already running (or the cache is closed).
+        """
+        with self._refresh_lock:
+            if self._closed or key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+        self._refresher.submit(self._run_refresh, key, produce)
+        return True
+
+    def _run_refresh(self, key: str, produce: Callable[[], str]):
+        try:
+            reply = produce()
+        except Exception:
+            self._event('refresh_failed')
+        else:
+            self.put(key, reply)
+            self._event('refreshes')
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(key)
+
+    def put(self, key: str, reply: str):
+        """Record an answer. Returns immediately; the row is written by the background writer."""
+        if self._closed:
+            return
+        created = self._clock()
+        self._remember(key, reply, created)
+        self._pending.put((key, reply, created))
+
+    def _write_loop(self):
+        while True:
+            item = self._pending.get()
+            batch = [item]
+            while item is not None and len(batch) < self.batch_size:
+                try:
+                    item = self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+            rows = [row for row in batch if row is not None]
+            if rows:
+                self._write(rows)
+            for _ in batch:
+                self._pending.task_done()
+            if batch[-1] is None:
+                return
+
+    def _write(self, rows):
+        conn = self._connection()
+        try:
+            with conn:
+                conn.executemany(UPSERT_SQL, rows)
+                conn.execute(EXPIRE_SQL, (self._clock() - self.ttl,))
+                conn.execute(TRIM_SQL, (self.max_entries,))
+        except sqlite3.Error as e:
+            print(f"⚠️  Answer cache write failed ({len(rows)} rows dropped): {e}")
+
+    def flush(self):
+        """Block until every queued write has been committed."""
+        self._pending.join()
+
+    def close(self):
+        if self._closed:
+            return
+        with self._refresh_lock:
+            self._closed = True
+        self._refresher.shutdown(wait=True)
+        self._pending.put(None)
+        self._writer.join()
+        with self._conn_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
@@ -0,0 +1,285 @@
+import hashlib
+import json
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Pattern, Tuple
+from urllib.parse import urljoin, urlparse
+
+
+# Upper bound on the portfolio text sent upstream as context
+MAX_CONTEXT_CHARS = 20000
+
+
+class TextExtractor(HTMLParser):
+    """Collect the visible text of an HTML document, skipping scripts and styles."""
+
+    skip_tags = {'script', 'style', 'noscript'}
+
+    def __init__(self):
+        super().__init__()
+        self.text_parts = []
+        self.current_tag = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.skip_tags:
+            self.current_tag = tag
+
+    def handle_endtag(self, tag):
+        if tag == self.current_tag:
+            self.current_tag = None
+
+    def handle_data(self, data):
+        if self.current_tag is None:
+            stripped = data.strip()
+            if stripped:
+                self.text_parts.append(stripped)
+
+
+def extract_text(html: str) -> str:
+    parser = TextExtractor()
+    parser.feed(html)
+    return ' '.join(parser.text_parts)[:MAX_CONTEXT_CHARS]
+
+
+# Elements whose text only makes sense to someone clicking around the page
+BOILERPLATE_TAGS = {'head', 'script', 'style', 'noscript', 'template', 'nav', 'footer', 'button', 'svg'}
+# Elements that start a new line of compacted context
+BLOCK_TAGS = {
+    'p', 'div', 'ul', 'ol', 'li', 'dl', 'dt', 'dd', 'table', 'tr', 'br', 'pre', 'blockquote',
+    'figure', 'figcaption', 'form', 'label',
+}
+# Elements that start a new paragraph
+SECTION_TAGS = {'section', 'article', 'header', 'main', 'aside'}
+HEADING_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+# Void elements never get an end tag, so they can't open a skipped region
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+
+class CompactExtractor(HTMLParser):
+    """
+    Visible text as lines, leaving out navigation, buttons, in-page links,
+    the footer and icons. Headings become `#` lines and sections are separated
+    by a blank line, so the structure of the page survives.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+        self._fragments = []
+        self._heading = 0
+        self._skip_tag = None
+        self._skip_depth = 0
+
+    def _is_boilerplate(self, tag, attrs) -> bool:
+        if tag in BOILERPLATE_TAGS or attrs.get('aria-hidden') == 'true':
+            return True
+        # "View my work", "Contact" and other links that jump within the page
+        return tag == 'a' and (attrs.get('href') or '').startswith('#')
+
+    def _break(self, paragraph: bool = False):
+        if self._fragments:
+            line = ' '.join(self._fragments)
+            if self._heading:
+                line = '#' * self._heading + ' ' + line
+            self.lines.append(line)
+            self._fragments = []
+        self._heading = 0
+        if paragraph and self.lines and self.lines[-1]:
+            self.lines.append('')
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        if tag not in VOID_TAGS and self._is_boilerplate(tag, dict(attrs)):
+            self._skip_tag, self._skip_depth = tag, 1
+        elif tag in HEADING_TAGS:
+            self._break()
+            self._heading = int(tag[1])
+        elif tag in SECTION_TAGS:
+            self._break(paragraph=True)
+        elif tag in BLOCK_TAGS and not (tag == 'br' and self._heading):
+            self._break()
+
+    def handle_endtag(self, tag):
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if not self._skip_depth:
+                    self._skip_tag = None
+            return
+        if tag in SECTION_TAGS:
+            self._break(paragraph=True)
+        elif tag in BLOCK_TAGS or tag in HEADING_TAGS:
+            self._break()
+
+    def handle_data(self, data):
+        if self._skip_tag is not None:
+            return
+        text = ' '.join(data.split())
+        if not text:
+            return
+        if self._fragments and text[0] in '.,;:!?)':
+            self._fragments[-1] += text
+        else:
+            self._fragments.append(text)
+
+    def close(self):
+        super().close()
+        self._break()
+
+
+def compact_text(html: str) -> str:
+    """
+    The page text sent to the model: boilerplate dropped, whitespace collapsed,
+    one line per block. A line that repeats an earlier one is dropped, except
+    item headings (h3-h6), which label different items ("Data Engineer" at
+    each job).
+    """
+    parser = CompactExtractor()
+    parser.feed(html)
+    parser.close()
+    seen = set()
+    lines = []
+    for line in parser.lines:
+        key = line.lstrip('#').strip().lower()
+        if key and key in seen and not line.startswith('###'):
+            continue
+        seen.add(key)
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return '\n'.join(lines).strip()[:MAX_CONTEXT_CHARS]
+
+
+# Compacted context per raw context fingerprint; a reload of an unchanged page reuses it
+_COMPACTED = {}
+_COMPACTED_MAX = 4
+
+
+def compact_context(html: str, context_hash: str) -> str:
+    """compact_text(html), cached by the fingerprint of the page's extracted text."""
+    compacted = _COMPACTED.get(context_hash)
+    if compacted is None:
+        compacted = compact_text(html)
+        if len(_COMPACTED) >= _COMPACTED_MAX:
+            _COMPACTED.pop(next(iter(_COMPACTED)))
+        _COMPACTED[context_hash] = compacted
+    return compacted
+
+
+# Upper bound on preload hints per page; hinting everything defeats prioritisation
+MAX_PRELOADS = 8
+
+
+class AssetExtractor(HTMLParser):
+    """Collect the same-origin subresources a page loads: stylesheets, scripts, preloads and images."""
+
+    def __init__(self, base: str = '/'):
+        super().__init__()
+        self.base = base
+        self.assets = []
+
+    def _add(self, url, kind):
+        if not url or not kind:
+            return
+        parsed = urlparse(url)
+        if parsed.scheme or parsed.netloc or url.startswith('data:'):
+            return  # cross-origin preloads need CORS attributes; leave them to the page
+        url = urljoin(self.base, url)
+        if all(url != seen for seen, _ in self.assets):
+            self.assets.append((url, kind))
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        rel = (attrs.get('rel') or '').lower().split()
+        if tag == 'link' and 'stylesheet' in rel:
+            self._add(attrs.get('href'), 'style')
+        elif tag == 'link' and 'preload' in rel:
+            self._add(attrs.get('href'), attrs.get('as'))
+        elif tag == 'script':
+            self._add(attrs.get('src'), 'script')
+        elif tag == 'img':
+            self._add(attrs.get('src'), 'image')
+
+
+def extract_assets(html: str, base: str = '/') -> List[Tuple[str, str]]:
+    """(url, destination) pairs in document order, with relative URLs resolved against `base`."""
+    parser = AssetExtractor(base)
+    parser.feed(html)
+    return parser.assets[:MAX_PRELOADS]
+
+
+def preload_header(assets: List[Tuple[str, str]]) -> str:
+    """A `Link` header value preloading each asset."""
+    links = []
+    for url, kind in assets:
+        link = f"<{url}>; rel=preload; as={kind}"
+        if kind == 'font':
+            link += '; crossorigin'
+        links.append(link)
+    return ', '.join(links)
+
+
+def load_context(path: str = 'index.html') -> str:
+    """Read an HTML file and return its visible text. Raises OSError if unreadable."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return extract_text(f.read())
+
+
+def fingerprint(text: str) -> str:
+    """Short, stable identifier for a context string (changes whenever the text does)."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def normalize_question(question: str) -> str:
+    """
+    Canonical form used to key cached answers: lowercase, punctuation dropped
+    (apostrophes kept), whitespace collapsed. chatbot.js mirrors this exactly.
+    """
+    return ' '.join(re.sub(r"[^a-z0-9_\s']", ' ', question.lower()).split())
+
+
+def chat_etag(question: str, context_hash: str) -> str:
+    """
+    Validator for a history-free answer to `GET /api/chat?q=`. Weak, because
+    regenerating an answer may change its wording but not what it says.
+    """
+    digest = hashlib.sha256(f"{normalize_question(question)}\n{context_hash}".encode('utf-8')).hexdigest()
+    return f'W/"{digest[:24]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for GET)."""
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(',')]
+    return '*' in tags or any(t.removeprefix('W/') == etag.removeprefix('W/') for t in tags)
+
+
+def load_knowledge(path: str = 'chatbot-knowledge.json') -> Dict[str, dict]:
+    """Read the chatbot knowledge base. Raises OSError/ValueError if unreadable."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError('knowledge base must be a JSON object')
+    return data
+
+
+def compile_matchers(knowledge: Dict[str, dict]) -> Dict[str, Pattern]:
+    """
+    Compile one case-insensitive regex per knowledge category.
+
+    Categories with a "pattern" use it as-is; categories with "keywords" match
+    any keyword as a whole word. Categories with neither (e.g. "default") are skipped.
+    """
+    matchers = {}
+    for name, entry in knowledge.items():
+        if not isinstance(entry, dict):
+            continue
+        if entry.get('pattern'):
+            matchers[name] = re.compile(entry['pattern'], re.IGNORECASE)
+        elif entry.get('keywords'):
+            words = '|'.join(re.escape(k) for k in entry['keywords'])
+            matchers[name] = re.compile(rf'(?<!\w)(?:{words})(?!\w)', re.IGNORECASE)
+    return matchers
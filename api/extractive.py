@@ -0,0 +1,122 @@
+"""
+Offline answers for degraded mode: the passage of the portfolio that best matches the question.
+
+The context is cut into passages of at most `passage_words` words: sentences
+and lines are packed together until the next one would not fit, and a single
+run-on sentence (a list of bullet points, say) is cut into overlapping windows.
+In compacted context (see api/context.compact_text) heading markers are
+dropped and a passage only spans two sections when the first is just a title.
+
+Passages and questions are reduced to content words much like the similarity
+cache does, but question words ("where", "how") and generic ones ("work",
+"with") are dropped too: they appear in section titles such as "Where I've
+Worked" and "Let's Work Together" and would outrank the actual answer. A few
+question words are mapped to the label the page uses instead ("based" ->
+"location"). Passages are ranked with BM25 over an inverted index. Everything
+is built once per context, so answering takes well under a millisecond and
+needs no network.
+
+This is used only when Gemini cannot answer in time. The reply is a quote from
+the page, not a conversational answer, and a question sharing no words with
+the page gets no reply at all.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import List, Optional
+
+from api.similarity import terms
+
+# Dropped from passages and questions on top of similarity.STOPWORDS (stemmed forms)
+PASSAGE_STOPWORDS = frozenset(
+    "where when who whom whose why how with work let us ve ll re m d get".split()
+)
+# Question wording -> the word the page uses for that information (stemmed forms)
+QUESTION_SYNONYMS = {
+    'bas': 'location', 'locat': 'location', 'live': 'location', 'city': 'location',
+    'technology': 'skill', 'tech': 'skill', 'tool': 'skill', 'stack': 'skill',
+}
+
+# Sentence ends and line breaks in the context (bullet lists often have no full stops)
+SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+|\n')
+SECTION_BREAK_RE = re.compile(r'\n\s*\n')
+HEADING_RE = re.compile(r'^#+ ', re.MULTILINE)
+
+
+def passages(text: str, passage_words: int = 40) -> List[str]:
+    """Consecutive sentences of a section packed into passages of at most `passage_words` words."""
+    result, current = [], []
+    for section in SECTION_BREAK_RE.split(HEADING_RE.sub('', text)):
+        emitted = len(result)
+        for sentence in SENTENCE_END_RE.split(section):
+            words = sentence.split()
+            if len(words) > passage_words:
+                if current:
+                    result.append(' '.join(current))
+                    current = []
+                stride = max(1, passage_words // 2)
+                for start in range(0, len(words) - stride, stride):
+                    result.append(' '.join(words[start:start + passage_words]))
+                continue
+            if len(current) + len(words) > passage_words:
+                result.append(' '.join(current))
+                current = []
+            current.extend(words)
+        # A section that is only a title ("Projects / Featured Work") is kept with the next one
+        if current and (len(result) > emitted or len(current) >= passage_words // 4):
+            result.append(' '.join(current))
+            current = []
+    if current:
+        result.append(' '.join(current))
+    return result
+
+
+def content_terms(text: str) -> Counter:
+    """Content-word counts of a passage."""
+    return Counter({t: n for t, n in terms(text).items() if t not in PASSAGE_STOPWORDS})
+
+
+def question_terms(question: str) -> Counter:
+    """Content-word counts of a question, in the page's own vocabulary."""
+    result = Counter()
+    for term, count in content_terms(question).items():
+        result[QUESTION_SYNONYMS.get(term, term)] += count
+    return result
+
+
+class ExtractiveAnswerer:
+    def __init__(self, context_text: str, passage_words: int = 40, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.passages = passages(context_text, passage_words)
+        self._terms = [content_terms(p) for p in self.passages]
+        self._lengths = [sum(t.values()) for t in self._terms]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        self._postings = {}  # term -> passage indexes containing it
+        for i, passage_terms in enumerate(self._terms):
+            for term in passage_terms:
+                self._postings.setdefault(term, []).append(i)
+        count = len(self.passages)
+        self._idf = {
+            term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self._postings.items()
+        }
+
+    def rank(self, question: str, k: int = 3) -> List[tuple]:
+        """Up to k (score, passage) pairs, best first, for passages sharing a word with the question."""
+        scores = Counter()
+        for term in question_terms(question):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for i in self._postings[term]:
+                tf = self._terms[i][term]
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / self._avg_length)
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return [(score, self.passages[i]) for i, score in scores.most_common(k)]
+
+    def answer(self, question: str) -> Optional[str]:
+        """The best-matching passage, or None if no passage shares a content word with the question."""
+        ranked = self.rank(question, k=1)
+        return ranked[0][1] if ranked else None
@@ -0,0 +1,103 @@
+"""
+Prerendered answers for frequently asked questions.
+
+scripts/prerender_faq.py runs the questions in faq.json through Gemini at build
+time and writes faq-answers.json. The bundle records the context fingerprint it
+was generated from, so a bundle built for an older index.html is ignored rather
+than served.
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from api.context import normalize_question
+
+BUNDLE_VERSION = 1
+QUESTIONS_FILE = 'faq.json'
+BUNDLE_FILE = 'faq-answers.json'
+
+
+def load_questions(path: str = QUESTIONS_FILE) -> List[str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    questions = data.get('questions') if isinstance(data, dict) else None
+    if not isinstance(questions, list) or not questions or not all(isinstance(q, str) and q.strip() for q in questions):
+        raise ValueError(f"{path} must contain a non-empty 'questions' list of strings")
+    return questions
+
+
+def load_bundle(path: str = BUNDLE_FILE) -> Optional[dict]:
+    """Return the bundle at `path`, or None if it is missing, unreadable or from another format version."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            bundle = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(bundle, dict) or bundle.get('version') != BUNDLE_VERSION:
+        return None
+    return bundle
+
+
+def answers_for(bundle: Optional[dict], context_hash: str) -> Dict[str, str]:
+    """
+    Map of normalized question -> reply, only if the bundle matches the current context.
+
+    Raises ValueError if a matching bundle's answers aren't {key: {"reply": str}}.
+    """
+    if not bundle or bundle.get('context_hash') != context_hash:
+        return {}
+    answers = bundle.get('answers', {})
+    if not isinstance(answers, dict) or not all(
+            isinstance(entry, dict) and isinstance(entry.get('reply'), str) for entry in answers.values()):
+        raise ValueError("'answers' must map questions to objects with a string 'reply'")
+    return {key: entry['reply'] for key, entry in answers.items()}
+
+
+def is_current(bundle: Optional[dict], questions: List[str], context_hash: str) -> bool:
+    """True if the bundle already answers exactly these questions for this context."""
+    if not bundle or bundle.get('context_hash') != context_hash:
+        return False
+    return set(bundle.get('answers', {})) == {normalize_question(q) for q in questions}
+
+
+def prerender(
+    questions: List[str],
+    context_text: str,
+    context_hash: str,
+    generate: Callable[..., str],
+    concurrency: int = 4,
+) -> dict:
+    """
+    Answer every question concurrently and return a bundle.
+
+    Questions whose call fails are left out (and listed under "failed") so one
+    upstream error doesn't block publishing the rest.
+    """
+    unique = {}
+    for q in questions:
+        unique.setdefault(normalize_question(q), q.strip())
+
+    def answer(item):
+        key, question = item
+        try:
+            return key, question, generate(question, context_text=context_text), None
+        except Exception as e:
+            return key, question, None, str(e)
+
+    answers, failed = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for key, question, reply, error in pool.map(answer, unique.items()):
+            if error is None:
+                answers[key] = {'question': question, 'reply': reply}
+            else:
+                failed[key] = error
+
+    return {
+        'version': BUNDLE_VERSION,
+        'context_hash': context_hash,
+        'generated_at': int(time.time()),
+        'answers': answers,
+        'failed': failed,
+    }
@@ -1,21 +1,133 @@
 import os
 import json
-from typing import Optional, Dict, Any
+import functools
+import threading
+import time
+from typing import Callable, Optional, Dict, Any, NamedTuple
 
 import requests
 
+from api.keys import KeyPool, KeysCooling, parse_keys
+from api.priority import CANCEL_POLL_INTERVAL, INTERACTIVE, PriorityScheduler, SchedulerCancelled, SchedulerTimeout
+from api.quota import QuotaCancelled, QuotaExceeded, QuotaScheduler
+
+
+DEFAULT_MODEL = "gemini-2.5-flash"
+# Low-latency model for simple questions (see api/router.py); empty disables routing
+DEFAULT_FAST_MODEL = "gemini-2.5-flash-lite"
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", DEFAULT_MODEL)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", DEFAULT_BASE_URL)
+
+
+class ClientConfig(NamedTuple):
+    model: str
+    base_url: str
+    fast_model: str = DEFAULT_FAST_MODEL
+
+
+def load_config() -> ClientConfig:
+    """Read the client configuration from the current environment."""
+    return ClientConfig(
+        model=os.getenv("GEMINI_MODEL", DEFAULT_MODEL),
+        base_url=os.getenv("GEMINI_BASE_URL", DEFAULT_BASE_URL),
+        fast_model=os.getenv("GEMINI_FAST_MODEL", DEFAULT_FAST_MODEL),
+    )
+
+
+_config = load_config()
 
-GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
-GEMINI_BASE_URL = os.getenv(
-    "GEMINI_BASE_URL",
-    "https://generativelanguage.googleapis.com/v1beta",
-)
+
+def set_config(config: ClientConfig) -> None:
+    """
+    Swap in a new client configuration (e.g. on hot reload).
+
+    The swap is a single reference assignment, so calls already in flight
+    keep the model and URL they started with.
+    """
+    global _config, GEMINI_MODEL, GEMINI_BASE_URL
+    _config = config
+    GEMINI_MODEL, GEMINI_BASE_URL = config.model, config.base_url
+
+
+def get_config() -> ClientConfig:
+    return _config
 
 
 class GeminiError(RuntimeError):
     pass
 
 
+class RateLimited(GeminiError):
+    """The RPM/TPM budget had no room for this call within the allowed wait."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class KeysRateLimited(RateLimited):
+    """Every API key is cooling down after a 429; nothing was sent."""
+
+
+class DeadlineExceeded(GeminiError):
+    """The request's deadline passed before Gemini answered."""
+
+
+class UpstreamTimeout(DeadlineExceeded):
+    """The call reached Gemini, which did not answer before the deadline."""
+
+
+class GeminiCancelled(GeminiError):
+    """
+    The caller no longer wants the answer (e.g. the client disconnected).
+
+    If the HTTP call was already sent, it keeps running on its helper thread
+    until Gemini answers or its timeout passes; `defer()` runs a cleanup once it
+    has really ended, so the call keeps its upstream slot and key until then.
+    """
+
+    def __init__(self, message: str, call: "Optional[_BackgroundCall]" = None):
+        super().__init__(message)
+        self.call = call
+
+    def defer(self, cleanup: Callable[[], None]):
+        if self.call is not None:
+            self.call.after(cleanup)
+        else:
+            cleanup()
+
+
+# Shared by every call in this process; limits of 0 are unlimited
+QUOTA = QuotaScheduler(
+    rpm=int(os.getenv("GEMINI_RPM", "0")),
+    tpm=int(os.getenv("GEMINI_TPM", "0")),
+    max_wait=float(os.getenv("GEMINI_QUOTA_WAIT", "5")),
+)
+
+# Orders this process's upstream calls by urgency (see api/priority.py); a limit of 0 is unlimited
+SCHEDULER = PriorityScheduler(
+    limit=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    aging=float(os.getenv("GEMINI_PRIORITY_AGING", "5")),
+)
+
+# API keys calls are spread over (see api/keys.py); refreshed from the environment on every call
+KEYS = KeyPool(cooldown=float(os.getenv("GEMINI_KEY_COOLDOWN", "10")))
+
+
+def configured_keys() -> tuple:
+    """GEMINI_API_KEYS (comma-separated), or the single GEMINI_API_KEY when that is not set."""
+    return parse_keys(os.getenv("GEMINI_API_KEYS") or os.getenv("GEMINI_API_KEY", ""))
+
+
+class _ExplicitKey:
+    """A key passed to generate_response(api_key=...); it bypasses the pool."""
+
+    def __init__(self, value: str):
+        self.value = value
+
+
 def _build_system_prompt(context_text: str) -> str:
     context_intro = (
         "You are an assistant for Ramachandra Nalam's portfolio website. "
@@ -27,6 +139,29 @@ def _build_system_prompt(context_text: str) -> str:
     return f"{context_intro}\n\nContext:\n{context}\n\n"
 
 
+def turn_part(role: str, text: str) -> Dict[str, str]:
+    """One prior conversation turn as a prompt part."""
+    prefix = "User: " if role == 'user' else "Assistant: "
+    return {"text": f"{prefix}{text}"}
+
+
+def build_prefix_parts(context_text: str, history: Optional[list] = None) -> list:
+    """
+    Prompt parts that precede the current question: system prompt plus prior turns.
+
+    Sessions (api/sessions.py) build this once and append to it, instead of
+    rebuilding it from the whole history on every turn.
+    """
+    parts = [{"text": _build_system_prompt(context_text)}]
+    if history and isinstance(history, list):
+        for msg in history:
+            role = msg.get('role')
+            text = msg.get('text')
+            if role and text:
+                parts.append(turn_part(role, text))
+    return parts
+
+
 def _extract_text_from_response(data: Dict[str, Any]) -> str:
     # Expected: data['candidates'][0]['content']['parts'][0]['text']
     try:
@@ -45,18 +180,171 @@ def _extract_text_from_response(data: Dict[str, Any]) -> str:
         raise GeminiError(f"Failed to parse Gemini response: {e}")
 
 
+def _extract_usage(data: Any) -> Optional[Dict[str, int]]:
+    """Token counts from a response body, or None if it has no usageMetadata."""
+    usage = data.get("usageMetadata") if isinstance(data, dict) else None
+    if not isinstance(usage, dict) or not usage:
+        return None
+    prompt = usage.get("promptTokenCount") or 0
+    output = usage.get("candidatesTokenCount") or 0
+    return {"prompt_tokens": int(prompt), "output_tokens": int(output)}
+
+
+def _estimate_tokens(parts: list) -> int:
+    # Roughly 4 characters per token for English text
+    return sum(len(p["text"]) for p in parts) // 4 + 1
+
+
+def _redact(text: str, key: str) -> str:
+    # Keys never reach error messages or logs, even if a proxy or library echoes them
+    return KEYS.redact(text).replace(key, "<api key>")
+
+
+class _BackgroundCall:
+    """An HTTP call on a helper thread; cleanups registered with after() run once it has ended."""
+
+    def __init__(self, send: Callable[[], Any]):
+        self.resp = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._done = False
+        self._after = []
+        self.thread = threading.Thread(target=self._run, args=(send,), daemon=True)
+        self.thread.start()
+
+    def _run(self, send):
+        try:
+            self.resp = send()
+        except BaseException as e:
+            self.error = e
+        with self._lock:
+            self._done = True
+            after, self._after = self._after, []
+        for cleanup in after:
+            cleanup()
+
+    def after(self, cleanup: Callable[[], None]):
+        with self._lock:
+            if not self._done:
+                self._after.append(cleanup)
+                return
+        cleanup()
+
+
+def _post(url, payload, key, timeout, session, deadline, should_cancel):
+    def send():
+        return (session or requests).post(
+            url,
+            data=json.dumps(payload),
+            # In a header rather than the URL query, where it would end up in exception messages
+            headers={"Content-Type": "application/json", "x-goog-api-key": key},
+            timeout=timeout,
+        )
+
+    try:
+        if should_cancel is None:
+            return send()
+
+        # Run the call on a helper thread so the caller can give up as soon as
+        # should_cancel() says so; the abandoned call ends by its own timeout.
+        call = _BackgroundCall(send)
+        while call.thread.is_alive():
+            call.thread.join(CANCEL_POLL_INTERVAL)
+            if call.thread.is_alive() and should_cancel():
+                raise GeminiCancelled("Request cancelled by caller", call)
+        if call.error is not None:
+            raise call.error
+        return call.resp
+    except requests.RequestException as e:
+        if deadline is not None and time.monotonic() >= deadline:
+            raise UpstreamTimeout(_redact(f"Deadline exceeded waiting for Gemini: {e}", key))
+        raise GeminiError(_redact(f"Request to Gemini failed: {e}", key))
+
+
+def _retry_delay(resp) -> Optional[float]:
+    """Seconds a 429 response asks us to wait: its Retry-After header or RetryInfo retryDelay ("37s")."""
+    try:
+        return float((getattr(resp, "headers", None) or {}).get("Retry-After"))
+    except (TypeError, ValueError):
+        pass
+    try:
+        for detail in resp.json()["error"]["details"]:
+            if detail.get("@type", "").endswith("RetryInfo"):
+                return float(detail["retryDelay"].rstrip("s"))
+    except Exception:
+        pass
+    return None
+
+
+def _post_with_keys(url, payload, api_key, timeout, session, deadline, should_cancel):
+    """
+    _post() with the least-loaded pool key, trying the next one after a 429.
+
+    Returns the last response and the key it was sent with.
+    """
+    attempts = 1 if api_key else max(1, len(KEYS))
+    for attempt in range(attempts):
+        if api_key:
+            handle = _ExplicitKey(api_key)
+        else:
+            try:
+                handle = KEYS.acquire()
+            except KeysCooling as e:
+                raise KeysRateLimited(str(e), e.retry_after)
+        release = (lambda *args: None) if api_key else functools.partial(KEYS.release, handle)
+        try:
+            resp = _post(url, payload, handle.value, timeout, session, deadline, should_cancel)
+        except GeminiCancelled as e:
+            # The abandoned call is still in flight on this key
+            e.defer(release)
+            raise
+        except BaseException:
+            release()
+            raise
+        rate_limited = resp.status_code == 429
+        release(rate_limited, _retry_delay(resp) if rate_limited else None)
+        if not rate_limited or attempt == attempts - 1:
+            break
+        if deadline is not None and time.monotonic() >= deadline:
+            raise DeadlineExceeded("Deadline exceeded before retrying Gemini with another key")
+        print(f"🔑 Gemini {handle.name} rate limited; retrying with another key")
+    return resp, handle.value
+
+
 def generate_response(
     question: str,
     context_text: str,
     history: Optional[list] = None,
     api_key: Optional[str] = None,
     timeout: float = 15.0,
+    session: Optional[requests.Session] = None,
+    deadline: Optional[float] = None,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    prefix: Optional[list] = None,
+    model: Optional[str] = None,
+    priority: str = INTERACTIVE,
 ) -> str:
     """
     Call Gemini generateContent with a question, site context, and optional history.
 
+    Pass a requests.Session to reuse pooled connections across calls.
+    `deadline` is an absolute time.monotonic() value that caps `timeout`;
+    `should_cancel` is polled while queued for a slot or rate budget and while waiting
+    for Gemini, and aborts the wait when it returns True; a call already sent still
+    holds its slot and key until it ends.
+    `prefix` is a prebuilt build_prefix_parts() result; when given, `history` is not used.
+    `model` overrides the configured model for this call (e.g. the router's choice).
+    `priority` is the api/priority.py class the call waits for an upstream slot as.
+    Without `api_key`, the call uses the least-loaded key of the KEYS pool; a
+    key answered with 429 cools down and the call is retried with another one.
+
     Raises:
         ValueError: if inputs are invalid or api key missing.
+        RateLimited: if the RPM/TPM budget stays full for longer than allowed,
+            or KeysRateLimited if every pool key is cooling down after a 429 (nothing is sent).
+        DeadlineExceeded: if the deadline passes before a slot is free or a response arrives
+            (UpstreamTimeout when the call had been sent).
+        GeminiCancelled: if should_cancel() returned True.
         GeminiError: if the API call fails or response cannot be parsed.
     """
     if not isinstance(question, str) or not question.strip():
@@ -64,35 +352,32 @@ def generate_response(
     if not isinstance(context_text, str):
         raise ValueError("context_text must be a string")
 
-    key = api_key or os.getenv("GEMINI_API_KEY")
-    if not key or not isinstance(key, str):
+    config = get_config()
+    if api_key is not None and not isinstance(api_key, str):
         raise ValueError("Gemini API key not configured")
+    if not api_key:
+        KEYS.update(configured_keys())
+        if not len(KEYS):
+            raise ValueError("Gemini API key not configured")
+
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("Deadline exceeded before calling Gemini")
+        timeout = min(timeout, remaining)
 
-    system_prompt = _build_system_prompt(context_text)
     user_prompt = question.strip()
 
-    # Build the conversation parts
-    parts = [{"text": system_prompt}]
-    
-    # Add history if provided
-    if history and isinstance(history, list):
-        for msg in history:
-            role = msg.get('role')
-            text = msg.get('text')
-            if role and text:
-                # Map 'assistant' to 'model' for Gemini API if needed, 
-                # though 'model' is the standard role for the AI.
-                # Here we just include it in the text flow or structured parts.
-                # For simplicity in this stateless approach with "parts", 
-                # we can format it as a transcript or separate parts.
-                # Let's append to parts.
-                prefix = "User: " if role == 'user' else "Assistant: "
-                parts.append({"text": f"{prefix}{text}"})
+    # Build the conversation parts: system prompt, prior turns, then the question
+    if prefix is not None:
+        parts = list(prefix)
+    else:
+        parts = build_prefix_parts(context_text, history)
 
     # Add the current question
     parts.append({"text": f"Question: {user_prompt}"})
 
-    url = f"{GEMINI_BASE_URL}/models/{GEMINI_MODEL}:generateContent?key={key}"
+    url = f"{config.base_url}/models/{model or config.model}:generateContent"
     payload: Dict[str, Any] = {
         "contents": [
             {
@@ -109,31 +394,56 @@ def generate_response(
     }
 
     try:
-        resp = requests.post(
-            url,
-            data=json.dumps(payload),
-            headers={"Content-Type": "application/json"},
-            timeout=timeout,
-        )
-    except requests.RequestException as e:
-        raise GeminiError(f"Request to Gemini failed: {e}")
-
-    if not resp.ok:
-        # Try to include error detail from body
-        detail = ""
+        SCHEDULER.acquire(priority, deadline, should_cancel)
+    except SchedulerTimeout as e:
+        raise DeadlineExceeded(str(e))
+    except SchedulerCancelled as e:
+        raise GeminiCancelled(str(e))
+    try:
         try:
-            detail_json = resp.json()
-            detail = detail_json.get("error", {}).get("message") or json.dumps(detail_json)[:300]
-        except Exception:
-            detail = (resp.text or "").strip()[:300]
-        raise GeminiError(f"Gemini API error {resp.status_code}: {detail}")
+            ticket = QUOTA.acquire(_estimate_tokens(parts), deadline, should_cancel)
+        except QuotaExceeded as e:
+            raise RateLimited(str(e), e.retry_after)
+        except QuotaCancelled as e:
+            raise GeminiCancelled(str(e))
+        if deadline is not None:
+            timeout = min(timeout, max(0.001, deadline - time.monotonic()))
+
+        resp, key = _post_with_keys(url, payload, api_key, timeout, session, deadline, should_cancel)
+    except GeminiCancelled as e:
+        # An abandoned HTTP call keeps its slot until it ends, so the concurrency limit stays honest
+        e.defer(SCHEDULER.release)
+        raise
+    except BaseException:
+        SCHEDULER.release()
+        raise
+    SCHEDULER.release()
 
+    # The call reached Gemini, so it used budget even if it failed: record what it reported, else the estimate
+    data = None
     try:
-        data = resp.json()
-    except Exception as e:
-        raise GeminiError(f"Invalid JSON from Gemini: {e}")
+        if not resp.ok:
+            # Try to include error detail from body
+            detail = ""
+            try:
+                data = resp.json()
+                detail = data.get("error", {}).get("message") or json.dumps(data)[:300]
+            except Exception:
+                detail = (resp.text or "").strip()[:300]
+            raise GeminiError(_redact(f"Gemini API error {resp.status_code}: {detail}", key))
+
+        try:
+            data = resp.json()
+        except Exception as e:
+            raise GeminiError(f"Invalid JSON from Gemini: {e}")
 
-    text = _extract_text_from_response(data)
+        text = _extract_text_from_response(data)
+    finally:
+        usage = _extract_usage(data)
+        if usage is None:
+            QUOTA.record(ticket)
+        else:
+            QUOTA.record(ticket, usage["prompt_tokens"], usage["output_tokens"])
     # Basic sanitization: cap length to avoid flooding UI
     return text[:4000]
 
@@ -0,0 +1,127 @@
+"""
+Pool of Gemini API keys, so throughput isn't capped by one key's rate limits.
+
+Each call takes the usable key with the fewest calls in flight, then the
+fewest calls in the last minute, then the first in the pool. A key that gets
+a 429 cools down for as long as Gemini asked (Retry-After or RetryInfo), but
+never longer than `cooldown` seconds, and receives no calls until then; if
+every key is cooling, the caller learns how long until the first one is back.
+
+Key values never appear in metrics or messages: keys are named by position
+("key1", "key2", ...), and redact() replaces any key value found in a text
+that is about to be raised or logged.
+"""
+
+import re
+import threading
+import time
+from collections import deque
+from typing import Iterable, Optional, Tuple
+
+WINDOW = 60.0
+
+
+class KeysCooling(Exception):
+    """Every key in the pool is cooling down after a 429."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_keys(value: str) -> Tuple[str, ...]:
+    """Keys from a comma- or whitespace-separated list, duplicates dropped, order kept."""
+    return tuple(dict.fromkeys(k for k in re.split(r'[\s,]+', value or '') if k))
+
+
+class _Key:
+    __slots__ = ('name', 'value', 'in_flight', 'recent', 'calls', 'rate_limited', 'cooling_until')
+
+    def __init__(self, name: str, value: str):
+        self.name = name
+        self.value = value
+        self.in_flight = 0
+        self.recent = deque()  # start times of calls in the last WINDOW seconds
+        self.calls = 0
+        self.rate_limited = 0
+        self.cooling_until = 0.0
+
+
+class KeyPool:
+    def __init__(self, keys: Iterable[str] = (), cooldown: float = 10.0, clock=time.monotonic):
+        self.cooldown = cooldown
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._keys = []
+        self.update(keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, keys: Iterable[str]):
+        """Use this set of keys from now on; keys already in the pool keep their state."""
+        keys = tuple(keys)
+        with self._lock:
+            if keys == tuple(k.value for k in self._keys):
+                return
+            existing = {k.value: k for k in self._keys}
+            self._keys = [existing.get(value) or _Key('', value) for value in keys]
+            for i, key in enumerate(self._keys, 1):
+                key.name = f"key{i}"
+
+    def acquire(self) -> _Key:
+        """
+        The least-loaded usable key, counted as in flight until release().
+
+        Raises ValueError if the pool is empty and KeysCooling if every key is cooling down.
+        """
+        with self._lock:
+            if not self._keys:
+                raise ValueError("Gemini API key not configured")
+            now = self._clock()
+            usable = [k for k in self._keys if k.cooling_until <= now]
+            if not usable:
+                wait = min(k.cooling_until for k in self._keys) - now
+                raise KeysCooling(f"All {len(self._keys)} Gemini API keys are rate limited; retry in {wait:.1f}s",
+                                  wait)
+            for key in usable:
+                while key.recent and key.recent[0] <= now - WINDOW:
+                    key.recent.popleft()
+            key = min(usable, key=lambda k: (k.in_flight, len(k.recent)))
+            key.in_flight += 1
+            key.calls += 1
+            key.recent.append(now)
+            return key
+
+    def release(self, key: _Key, rate_limited: bool = False, retry_after: Optional[float] = None):
+        """
+        Return a key from acquire(). After a 429 (`rate_limited`), it rests for
+        `retry_after` seconds if Gemini said so, capped at `cooldown`.
+        """
+        with self._lock:
+            key.in_flight -= 1
+            if rate_limited:
+                key.rate_limited += 1
+                rest = self.cooldown if retry_after is None else min(max(0.0, retry_after), self.cooldown)
+                key.cooling_until = self._clock() + rest
+
+    def redact(self, text: str) -> str:
+        """`text` with every key value in the pool replaced by its name."""
+        with self._lock:
+            keys = list(self._keys)
+        for key in keys:
+            text = text.replace(key.value, f"<{key.name}>")
+        return text
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = self._clock()
+            return {
+                k.name: {
+                    "in_flight": k.in_flight,
+                    "calls": k.calls,
+                    "rate_limited": k.rate_limited,
+                    "cooling_for": max(0.0, k.cooling_until - now),
+                }
+                for k in self._keys
+            }
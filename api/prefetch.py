@@ -0,0 +1,158 @@
+"""
+Speculative prefetch of likely follow-up answers (opt-in).
+
+After a chat turn the question is placed in a chatbot-knowledge.json category
+(experience, projects, contact, ...). A transition table then predicts which
+categories the visitor is most likely to ask about next. Every pair of
+categories starts from the same seed weight and observed conversations add to
+it. Each category's `follow_up` question is answered in the background for the
+conversation as it now stands, so asking it next needs no upstream call.
+
+Speculative calls are capped at `budget` per minute per process and run on a
+small thread pool. Results wait in their own bounded store rather than the
+answer cache, so a guess nobody uses never evicts a real answer, and the hit
+rate (`hits / issued`) measures how good the guesses are.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Pattern
+
+from api.answer_cache import cache_key
+from api.context import normalize_question
+
+
+def classify(question: str, matchers: Dict[str, Pattern]) -> Optional[str]:
+    """First knowledge category (in file order) whose matcher finds the question."""
+    for category, matcher in matchers.items():
+        if matcher.search(question):
+            return category
+    return None
+
+
+def follow_up_questions(knowledge: Dict[str, dict], matchers: Dict[str, Pattern]) -> Dict[str, str]:
+    """Category -> the question to prefetch for it, for categories that define one."""
+    return {
+        category: entry['follow_up']
+        for category, entry in knowledge.items()
+        if category in matchers and isinstance(entry, dict) and isinstance(entry.get('follow_up'), str)
+    }
+
+
+class TransitionTable:
+    def __init__(self, seed_weight: float = 1.0):
+        self.seed_weight = seed_weight
+        self._lock = threading.Lock()
+        self._counts = {}  # category -> {next category: times observed}
+
+    def observe(self, previous: str, current: str):
+        with self._lock:
+            row = self._counts.setdefault(previous, {})
+            row[current] = row.get(current, 0) + 1
+
+    def predict(self, category: str, candidates: List[str], k: int) -> List[str]:
+        """The k likeliest categories to follow `category`; ties keep `candidates` order."""
+        with self._lock:
+            row = dict(self._counts.get(category, {}))
+        ranked = sorted((c for c in candidates if c != category), key=lambda c: -(self.seed_weight + row.get(c, 0)))
+        return ranked[:k]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {category: dict(row) for category, row in self._counts.items()}
+
+
+class Prefetcher:
+    def __init__(self, generate: Callable[[str, List[dict], str], str], budget: int = 10, top_k: int = 2,
+                 max_entries: int = 256, ttl: float = 900.0, workers: int = 1, table: TransitionTable = None,
+                 clock=time.monotonic, on_event: Optional[Callable[[str], None]] = None):
+        self.generate = generate
+        self.budget = budget
+        self.top_k = top_k
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.table = table or TransitionTable()
+        self.on_event = on_event
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._spent = deque()  # start times of speculative calls in the last minute
+        self._pending = set()
+        self._store = OrderedDict()  # key -> (reply, expires_at), oldest first
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+
+    def _event(self, name: str):
+        if self.on_event:
+            self.on_event(name)
+
+    def suggest(self, question: str, turns: List[dict], knowledge: Dict[str, dict],
+                matchers: Dict[str, Pattern]) -> List[str]:
+        """Learn from this turn and return the follow-up questions to prepare (turns = before it)."""
+        current = classify(question, matchers)
+        previous = next((classify(t['text'], matchers) for t in reversed(turns) if t['role'] == 'user'), None)
+        if previous and current:
+            self.table.observe(previous, current)
+        if current is None:
+            return []
+        questions = follow_up_questions(knowledge, matchers)
+        asked = {normalize_question(t['text']) for t in turns if t['role'] == 'user'}
+        asked.add(normalize_question(question))
+        fresh = [c for c in questions if normalize_question(questions[c]) not in asked]
+        return [questions[c] for c in self.table.predict(current, fresh, self.top_k)]
+
+    def _spend(self, now: float) -> bool:
+        while self._spent and self._spent[0] <= now - 60.0:
+            self._spent.popleft()
+        if len(self._spent) >= self.budget:
+            return False
+        self._spent.append(now)
+        return True
+
+    def prefetch(self, questions: List[str], turns: List[dict], context_text: str, context_hash: str):
+        """Answer `questions` in the background as the next turn after `turns`."""
+        for question in questions:
+            key = cache_key(question, context_hash, turns)
+            with self._lock:
+                if key in self._store or key in self._pending:
+                    continue
+                if not self._spend(self._clock()):
+                    self._event('budget_skipped')
+                    continue
+                self._pending.add(key)
+            self._event('issued')
+            self._executor.submit(self._run, key, question, list(turns), context_text)
+
+    def _run(self, key: str, question: str, turns: List[dict], context_text: str):
+        try:
+            reply = self.generate(question, turns, context_text)
+        except Exception:
+            self._event('failed')
+            return
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+        with self._lock:
+            self._store[key] = (reply, self._clock() + self.ttl)
+            self._store.move_to_end(key)
+            while len(self._store) > self.max_entries:
+                self._store.popitem(last=False)
+
+    def take(self, question: str, context_hash: str, turns: List[dict]) -> Optional[str]:
+        """The prefetched answer for this exact turn, if one is ready (each is used once)."""
+        key = cache_key(question, context_hash, turns)
+        with self._lock:
+            entry = self._store.pop(key, None)
+        if entry is None or entry[1] <= self._clock():
+            return None
+        self._event('hits')
+        return entry[0]
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until no speculative call is running (for tests and benchmarks)."""
+        deadline = self._clock() + timeout
+        while self._pending and self._clock() < deadline:
+            time.sleep(0.01)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
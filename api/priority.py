@@ -0,0 +1,133 @@
+"""
+Priority scheduling for upstream Gemini calls.
+
+Visitors waiting on a chat answer, cache refreshes, speculative prefetches and
+batch jobs (FAQ prerendering) share one concurrency limit per process. When a
+slot frees up it goes to the most urgent waiter, so background work never
+delays an interactive request that is queued behind it. To keep background
+work from starving under sustained load, a waiter's priority improves by one
+class for every `aging` seconds it has waited; among equals the earliest
+arrival goes first. A limit of 0 means "unlimited"; waits are still recorded.
+"""
+
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+INTERACTIVE = 'interactive'
+REFRESH = 'refresh'
+PREFETCH = 'prefetch'
+BATCH = 'batch'
+# Most urgent first
+PRIORITIES = (INTERACTIVE, REFRESH, PREFETCH, BATCH)
+
+
+# How often anything waiting with a should_cancel() probe checks it: a queued
+# waiter here or in api.quota, or a call abandoned mid-request in api.gemini_client
+CANCEL_POLL_INTERVAL = 0.05
+
+
+class SchedulerTimeout(Exception):
+    """The deadline passed before a slot became free."""
+
+
+class SchedulerCancelled(Exception):
+    """The waiter's should_cancel() returned True before a slot became free."""
+
+
+class _Waiter:
+    __slots__ = ('rank', 'since', 'seq')
+
+    def __init__(self, rank: int, since: float, seq: int):
+        self.rank = rank
+        self.since = since
+        self.seq = seq
+
+
+class PriorityScheduler:
+    def __init__(self, limit: int = 0, aging: float = 5.0, clock=time.monotonic,
+                 on_wait: Optional[Callable[[str, float], None]] = None):
+        self.limit = limit
+        self.aging = aging
+        self.on_wait = on_wait
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting = []
+        self._in_flight = 0
+        self._waits = {p: [0, 0.0, 0.0] for p in PRIORITIES}  # class -> [count, total seconds, max seconds]
+
+    def _urgency(self, waiter: _Waiter, now: float) -> tuple:
+        rank = waiter.rank
+        if self.aging > 0:
+            rank -= (now - waiter.since) / self.aging
+        return rank, waiter.seq
+
+    def _next(self, now: float) -> _Waiter:
+        return min(self._waiting, key=lambda w: self._urgency(w, now))
+
+    def acquire(self, priority: str, deadline: Optional[float] = None,
+                should_cancel: Optional[Callable[[], bool]] = None):
+        """
+        Wait for a slot as a `priority` class caller. Raises SchedulerTimeout if
+        none is granted before `deadline` (an absolute clock() value), and
+        SchedulerCancelled as soon as `should_cancel()` returns True.
+        """
+        rank = PRIORITIES.index(priority)
+        with self._cond:
+            now = self._clock()
+            waiter = _Waiter(rank, now, next(self._seq))
+            self._waiting.append(waiter)
+            try:
+                while (self.limit and self._in_flight >= self.limit) or self._next(now) is not waiter:
+                    if deadline is not None and now >= deadline:
+                        raise SchedulerTimeout(f"No upstream slot for {priority} call before the deadline")
+                    if should_cancel is not None and should_cancel():
+                        raise SchedulerCancelled(f"{priority} call cancelled while waiting for an upstream slot")
+                    timeout = None if deadline is None else deadline - now
+                    if should_cancel is not None:
+                        timeout = CANCEL_POLL_INTERVAL if timeout is None else min(timeout, CANCEL_POLL_INTERVAL)
+                    self._cond.wait(timeout)
+                    now = self._clock()
+            finally:
+                self._waiting.remove(waiter)
+                # Whoever is next now may be able to go (or must recheck after a timeout)
+                self._cond.notify_all()
+            self._in_flight += 1
+            waited = now - waiter.since
+            stats = self._waits[priority]
+            stats[0] += 1
+            stats[1] += waited
+            stats[2] = max(stats[2], waited)
+        if self.on_wait:
+            self.on_wait(priority, waited)
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: str, deadline: Optional[float] = None):
+        self.acquire(priority, deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            waiting = {p: 0 for p in PRIORITIES}
+            for waiter in self._waiting:
+                waiting[PRIORITIES[waiter.rank]] += 1
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "waiting": waiting,
+                "wait": {
+                    p: {"count": count, "avg": total / count if count else 0.0, "max": longest}
+                    for p, (count, total, longest) in self._waits.items()
+                },
+            }
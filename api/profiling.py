@@ -0,0 +1,168 @@
+"""
+On-demand CPU and memory profiling for a running server.
+
+RequestProfiler runs cProfile around the next N requests (or every request in
+a time window) and merges the results into one pstats report. MemoryTracker
+starts tracemalloc on demand and diffs snapshots to show where allocations
+grew. Neither costs anything until started: the server only checks
+`RequestProfiler.active` per request, and tracemalloc is off until asked for.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SORT_KEYS = ('cumulative', 'tottime', 'calls', 'ncalls')
+
+
+class RequestProfiler:
+    def __init__(self, clock=time.monotonic):
+        self.active = False
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._stats = None
+        self._remaining = None
+        self._until = None
+        self._in_flight = 0
+        self.profiled = 0
+        self.skipped = 0
+
+    def start(self, requests: Optional[int] = None, seconds: Optional[float] = None) -> bool:
+        """Arm the profiler for `requests` requests or `seconds` seconds. False if already running."""
+        with self._lock:
+            if self.active:
+                return False
+            self._stats = None
+            self._remaining = requests
+            self._until = self._clock() + seconds if seconds is not None else None
+            self.profiled = self.skipped = self._in_flight = 0
+            self._done.clear()
+            self.active = True
+            return True
+
+    def _claim(self) -> bool:
+        with self._lock:
+            if not self.active:
+                return False
+            if self._until is not None and self._clock() >= self._until:
+                return False
+            if self._remaining is not None:
+                if self._remaining <= 0:
+                    return False
+                self._remaining -= 1
+            self._in_flight += 1
+            return True
+
+    def profile(self, fn: Callable, *args):
+        """Call fn(*args), under cProfile if a profiling run still wants this request."""
+        if not self._claim():
+            return fn(*args)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows only one active profiler; overlapping requests go unprofiled
+            profiler = None
+        try:
+            return fn(*args)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            with self._lock:
+                if profiler is None:
+                    self.skipped += 1
+                elif self._stats is None:
+                    self._stats = pstats.Stats(profiler)
+                    self.profiled += 1
+                else:
+                    self._stats.add(profiler)
+                    self.profiled += 1
+                self._in_flight -= 1
+                if self._remaining == 0 and self._in_flight == 0:
+                    self._done.set()
+
+    def finish(self, timeout: float, sort: str = 'cumulative', limit: int = 40) -> str:
+        """Wait for the run to complete (or `timeout`), stop it and return the pstats report."""
+        wait = timeout
+        if self._until is not None:
+            wait = min(timeout, max(0.0, self._until - self._clock()))
+        self._done.wait(wait)
+        with self._lock:
+            self.active = False
+        # Requests already being profiled still add their numbers
+        deadline = self._clock() + 1.0
+        while self._in_flight and self._clock() < deadline:
+            time.sleep(0.01)
+
+        out = io.StringIO()
+        out.write(f"Profiled {self.profiled} request(s), skipped {self.skipped}\n")
+        if self._stats is not None:
+            self._stats.stream = out
+            self._stats.strip_dirs().sort_stats(sort if sort in SORT_KEYS else 'cumulative').print_stats(limit)
+        return out.getvalue()
+
+
+class MemoryTracker:
+    """Start tracemalloc on demand and report allocation growth between snapshots."""
+
+    def __init__(self, frames: int = 1):
+        self.frames = frames
+        self._lock = threading.Lock()
+        self._baseline = None
+        self._last = None
+
+    @staticmethod
+    def _filters(everything: bool) -> list:
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        if not everything:
+            filters.append(tracemalloc.Filter(True, os.path.join(ROOT_DIR, '*')))
+        return filters
+
+    def start(self) -> dict:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+            self._baseline = self._last = tracemalloc.take_snapshot()
+            return self._totals()
+
+    def diff(self, since: str = 'last', limit: int = 25, everything: bool = False) -> dict:
+        """
+        Top allocation changes (by source line) since the previous diff, or since
+        start() with since='start'. Only this repo's files unless `everything`.
+        """
+        with self._lock:
+            if self._baseline is None:
+                raise RuntimeError("memory tracking is not started")
+            current = tracemalloc.take_snapshot()
+            base = self._baseline if since == 'start' else self._last
+            self._last = current
+            filters = self._filters(everything)
+            stats = current.filter_traces(filters).compare_to(base.filter_traces(filters), 'lineno')
+            top = [
+                {
+                    "where": f"{os.path.relpath(s.traceback[0].filename, ROOT_DIR)}:{s.traceback[0].lineno}",
+                    "size_diff": s.size_diff,
+                    "size": s.size,
+                    "count_diff": s.count_diff,
+                }
+                for s in stats[:limit]
+            ]
+            return dict(self._totals(), since=since, top=top)
+
+    def stop(self) -> dict:
+        with self._lock:
+            totals = self._totals()
+            self._baseline = self._last = None
+            tracemalloc.stop()
+            return totals
+
+    def _totals(self) -> dict:
+        current, peak = tracemalloc.get_traced_memory()
+        return {"tracing": tracemalloc.is_tracing(), "traced_bytes": current, "peak_bytes": peak}
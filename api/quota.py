@@ -0,0 +1,152 @@
+"""
+Token accounting and RPM/TPM scheduling for upstream Gemini calls.
+
+Every call reserves a slot (and an estimate of its tokens) before it is sent,
+and the estimate is replaced by the real `usageMetadata` counts once the
+response arrives (a response without them, or an error, keeps the estimate). If sending now would push the last minute over the
+requests-per-minute or tokens-per-minute budget, the caller waits (up to
+`max_wait` seconds) for older calls to leave the window instead of getting a
+429 from Gemini. Limits of 0 mean "unlimited"; usage is still recorded.
+
+Per-day totals are kept in per-minute buckets over a rolling 24 hours.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from api.priority import CANCEL_POLL_INTERVAL
+
+WINDOW = 60.0
+DAY = 24 * 60 * 60
+
+
+class QuotaExceeded(Exception):
+    """No budget became free within the allowed wait."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QuotaCancelled(Exception):
+    """The waiter's should_cancel() returned True before budget became free."""
+
+
+class Ticket:
+    """A reserved call; pass it back to QuotaScheduler.record()."""
+
+    __slots__ = ('sent_at', 'tokens')
+
+    def __init__(self, sent_at: float, tokens: int):
+        self.sent_at = sent_at
+        self.tokens = tokens
+
+
+class QuotaScheduler:
+    def __init__(self, rpm: int = 0, tpm: int = 0, max_wait: float = 5.0,
+                 clock=time.monotonic, on_record: Optional[Callable[[dict], None]] = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_wait = max_wait
+        self.on_record = on_record
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._window = deque()  # Tickets sent in the last WINDOW seconds, oldest first
+        self._days = deque()  # [minute, requests, prompt_tokens, output_tokens]
+
+    def split(self, workers: int):
+        """Give this process its share of the budgets when `workers` processes each schedule calls."""
+        if workers > 1:
+            self.rpm = max(1, self.rpm // workers) if self.rpm else 0
+            self.tpm = max(1, self.tpm // workers) if self.tpm else 0
+
+    def _prune(self, now: float):
+        while self._window and self._window[0].sent_at <= now - WINDOW:
+            self._window.popleft()
+        while self._days and self._days[0][0] <= (now - DAY) // 60:
+            self._days.popleft()
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        """Seconds until a call with `tokens` fits both budgets (0 if it fits now)."""
+        wait_until = now
+        if self.rpm and len(self._window) >= self.rpm:
+            wait_until = max(wait_until, self._window[len(self._window) - self.rpm].sent_at + WINDOW)
+        if self.tpm:
+            used = sum(t.tokens for t in self._window)
+            # A single call larger than the budget only goes out on an empty window
+            allowed = max(0, self.tpm - tokens)
+            for ticket in self._window:
+                if used <= allowed:
+                    break
+                used -= ticket.tokens
+                wait_until = max(wait_until, ticket.sent_at + WINDOW)
+        return wait_until - now
+
+    def acquire(self, tokens: int, deadline: Optional[float] = None,
+                should_cancel: Optional[Callable[[], bool]] = None) -> Ticket:
+        """
+        Reserve a call with an estimated `tokens`, waiting for budget if needed.
+
+        Raises QuotaExceeded if no budget frees up within max_wait (or before
+        `deadline`, an absolute clock() value), and QuotaCancelled as soon as
+        `should_cancel()` returns True while waiting.
+        """
+        give_up_at = self._clock() + self.max_wait
+        if deadline is not None:
+            give_up_at = min(give_up_at, deadline)
+        with self._cond:
+            while True:
+                now = self._clock()
+                self._prune(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    ticket = Ticket(now, tokens)
+                    self._window.append(ticket)
+                    self._bucket(now)[1] += 1
+                    return ticket
+                if now + wait > give_up_at:
+                    raise QuotaExceeded(f"Gemini rate budget exhausted; retry in {wait:.1f}s", wait)
+                if should_cancel is not None:
+                    if should_cancel():
+                        raise QuotaCancelled("Call cancelled while waiting for rate budget")
+                    wait = min(wait, CANCEL_POLL_INTERVAL)
+                self._cond.wait(wait)
+
+    def _bucket(self, now: float) -> list:
+        minute = now // 60
+        if not self._days or self._days[-1][0] != minute:
+            self._days.append([minute, 0, 0, 0])
+        return self._days[-1]
+
+    def record(self, ticket: Ticket, prompt_tokens: Optional[int] = None, output_tokens: Optional[int] = None):
+        """
+        Replace the ticket's estimate with the tokens Gemini reported. Without
+        counts (no usageMetadata), the estimate stands and is recorded as prompt tokens.
+        """
+        if prompt_tokens is None and output_tokens is None:
+            prompt_tokens, output_tokens = ticket.tokens, 0
+        prompt_tokens, output_tokens = prompt_tokens or 0, output_tokens or 0
+        with self._cond:
+            ticket.tokens = prompt_tokens + output_tokens
+            bucket = self._bucket(self._clock())
+            bucket[2] += prompt_tokens
+            bucket[3] += output_tokens
+            # Fewer tokens than estimated may let a waiting call go
+            self._cond.notify_all()
+        if self.on_record:
+            self.on_record({"prompt_tokens": prompt_tokens, "output_tokens": output_tokens})
+
+    def usage(self) -> dict:
+        with self._cond:
+            self._prune(self._clock())
+            return {
+                "limits": {"rpm": self.rpm, "tpm": self.tpm},
+                "minute": {"requests": len(self._window), "tokens": sum(t.tokens for t in self._window)},
+                "day": {
+                    "requests": sum(b[1] for b in self._days),
+                    "prompt_tokens": sum(b[2] for b in self._days),
+                    "output_tokens": sum(b[3] for b in self._days),
+                },
+            }
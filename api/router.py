@@ -0,0 +1,119 @@
+"""
+Route each chat question to the fast or the full Gemini model.
+
+Questions are classified locally (no extra API call) by length, wording and
+conversation depth: short factual questions go to the low-latency model,
+open-ended ones and long conversations go to the full model. Each model's
+recent latency and error rate are tracked over a rolling time window, and a
+model that is erroring or too slow loses its traffic to the other one until its
+bad samples age out of the window.
+"""
+
+import re
+import threading
+import time
+from collections import deque
+from typing import List, Optional
+
+SIMPLE = 'simple'
+COMPLEX = 'complex'
+
+# Questions longer than this (in words) always go to the full model
+SIMPLE_MAX_WORDS = 12
+# Conversations deeper than this (prior turns) need the full model to follow along
+SIMPLE_MAX_TURNS = 4
+# Wording that asks for explanation or reasoning rather than a lookup
+COMPLEX_HINTS = re.compile(
+    r"\b(why|explain|compare|comparison|difference|describe|elaborate|walk me through|"
+    r"trade-?offs?|pros and cons|design|architecture|approach|opinion|recommend|versus|vs)\b",
+    re.IGNORECASE,
+)
+
+
+def classify(question: str, history: Optional[List[dict]] = None) -> str:
+    """Cheap local classification of a question as SIMPLE or COMPLEX."""
+    if len(question.split()) > SIMPLE_MAX_WORDS:
+        return COMPLEX
+    if len(history or []) > SIMPLE_MAX_TURNS:
+        return COMPLEX
+    if COMPLEX_HINTS.search(question):
+        return COMPLEX
+    return SIMPLE
+
+
+class ModelStats:
+    """Latency and outcome of a model's recent calls, limited to the last `window` seconds."""
+
+    def __init__(self, window: float, max_samples: int, clock):
+        self.window = window
+        self._clock = clock
+        self._samples = deque(maxlen=max_samples)  # (timestamp, seconds, ok)
+
+    def record(self, seconds: float, ok: bool):
+        self._samples.append((self._clock(), seconds, ok))
+
+    def _recent(self):
+        cutoff = self._clock() - self.window
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        return self._samples
+
+    def snapshot(self) -> dict:
+        samples = self._recent()
+        count = len(samples)
+        if not count:
+            return {"count": 0, "error_rate": 0.0, "avg_latency": 0.0}
+        errors = sum(1 for _, _, ok in samples if not ok)
+        return {
+            "count": count,
+            "error_rate": errors / count,
+            "avg_latency": sum(seconds for _, seconds, _ in samples) / count,
+        }
+
+
+class ModelRouter:
+    def __init__(self, window: float = 60.0, max_samples: int = 100, min_samples: int = 5,
+                 max_error_rate: float = 0.5, max_latency: float = 8.0, clock=time.monotonic):
+        self.window = window
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.max_latency = max_latency
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _model_stats(self, model: str) -> ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats(self.window, self.max_samples, self._clock)
+        return stats
+
+    def record(self, model: str, seconds: float, ok: bool):
+        with self._lock:
+            self._model_stats(model).record(seconds, ok)
+
+    def _is_degraded(self, stats: dict) -> bool:
+        if stats["count"] < self.min_samples:
+            return False
+        return stats["error_rate"] >= self.max_error_rate or stats["avg_latency"] >= self.max_latency
+
+    def degraded(self, model: str) -> bool:
+        """True if the model's recent calls fail or are slow often enough to avoid it."""
+        with self._lock:
+            return self._is_degraded(self._model_stats(model).snapshot())
+
+    def choose(self, question: str, history, config) -> str:
+        """Pick a model name for this question given a gemini_client.ClientConfig."""
+        fast, full = config.fast_model, config.model
+        if not fast or fast == full:
+            return full
+        preferred, other = (fast, full) if classify(question, history) == SIMPLE else (full, fast)
+        if self.degraded(preferred) and not self.degraded(other):
+            return other
+        return preferred
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snapshots = {model: stats.snapshot() for model, stats in self._stats.items()}
+        return {model: dict(stats, degraded=self._is_degraded(stats)) for model, stats in snapshots.items()}
@@ -0,0 +1,154 @@
+"""
+Serverless entry point for /api/chat (AWS Lambda / Netlify-style `handler(event, context)`).
+
+Kept cheap to import: only `json`/`os` load at module level. The Gemini client
+(and `requests`) are imported on first invocation, and the portfolio context is
+read from the build artifact written by scripts/build_assets.py rather than
+parsed out of index.html. Everything expensive is kept in module globals so a
+warm container reuses it: the context, a pooled `requests.Session`, and a small
+answer cache for history-free questions.
+"""
+
+import json
+import math
+import os
+from collections import OrderedDict
+
+# Written by scripts/build_assets.py next to the other build outputs
+CONTEXT_ARTIFACT = os.getenv(
+    "PORTFOLIO_CONTEXT_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dist", "context.json"),
+)
+# Used only when the artifact is missing (e.g. running from a source checkout)
+FALLBACK_HTML = os.getenv(
+    "PORTFOLIO_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "index.html"),
+)
+ANSWER_CACHE_SIZE = 128
+# How long browsers and the CDN may reuse a `GET /api/chat?q=` answer before revalidating
+CHAT_CACHE_MAX_AGE = int(os.getenv("CHAT_CACHE_MAX_AGE", "300"))
+
+_context = None  # (text, fingerprint)
+_client = None
+_session = None
+_answers = OrderedDict()
+
+
+def _response(status: int, body: dict, headers: dict = None) -> dict:
+    return {
+        "statusCode": status,
+        "headers": dict({"Content-Type": "application/json; charset=utf-8"}, **(headers or {})),
+        "body": json.dumps(body),
+    }
+
+
+def _load_context():
+    global _context
+    if _context is None:
+        try:
+            with open(CONTEXT_ARTIFACT, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # The compacted prompt text when the build wrote one; the fingerprint is always the page's
+            _context = (data.get("prompt", data["context"]), data["fingerprint"])
+        except (OSError, ValueError, KeyError):
+            from api.context import compact_text, extract_text, fingerprint
+            try:
+                with open(FALLBACK_HTML, "r", encoding="utf-8") as f:
+                    html = f.read()
+            except OSError:
+                html = ""
+            _context = (compact_text(html), fingerprint(extract_text(html)))
+    return _context
+
+
+def _get_client():
+    global _client, _session
+    if _client is None:
+        from api import gemini_client
+        _client = gemini_client
+        _session = gemini_client.requests.Session()
+    return _client
+
+
+def _cache_key(question: str, context_hash: str) -> tuple:
+    from api.context import normalize_question
+    return (normalize_question(question), context_hash)
+
+
+def _parse_body(event: dict):
+    body = event.get("body") or ""
+    if event.get("isBase64Encoded"):
+        import base64
+        body = base64.b64decode(body).decode("utf-8", errors="replace")
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def _handle_get(event: dict) -> dict:
+    """`GET /api/chat?q=...`: a history-free answer the CDN and browsers may cache."""
+    from api.context import chat_etag, etag_matches, normalize_question
+    question = ((event.get("queryStringParameters") or {}).get("q") or "").strip()
+    if not normalize_question(question):
+        return _response(400, {"error": "'q' must be a non-empty question"})
+
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    etag = chat_etag(question, _load_context()[1])
+    cache_headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={CHAT_CACHE_MAX_AGE}",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(headers.get("if-none-match", ""), etag):
+        return {"statusCode": 304, "headers": cache_headers, "body": ""}
+
+    response = _answer(question, None)
+    if response["statusCode"] == 200:
+        response["headers"].update(cache_headers)
+    return response
+
+
+def handler(event: dict, context=None) -> dict:
+    method = (event.get("httpMethod") or "POST").upper()
+    if method == "GET":
+        return _handle_get(event)
+    if method != "POST":
+        return _response(405, {"error": "Method not allowed"})
+
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    if headers.get("content-type", "").split(";")[0].strip() != "application/json":
+        return _response(415, {"error": "Content-Type must be application/json"})
+
+    data = _parse_body(event)
+    question = data.get("question") if isinstance(data, dict) else None
+    history = data.get("history") if isinstance(data, dict) else None
+    if not isinstance(question, str) or not question.strip():
+        return _response(400, {"error": "'question' must be a non-empty string"})
+    return _answer(question, history)
+
+
+def _answer(question: str, history) -> dict:
+    context_text, context_hash = _load_context()
+    key = None if history else _cache_key(question, context_hash)
+    if key in _answers:
+        _answers.move_to_end(key)
+        return _response(200, {"reply": _answers[key]})
+
+    client = _get_client()
+    try:
+        reply = client.generate_response(
+            question.strip(), context_text=context_text, history=history, session=_session
+        )
+    except ValueError as e:
+        return _response(500, {"error": str(e)})
+    except client.RateLimited as e:
+        return _response(503, {"error": str(e)}, {"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+    except client.GeminiError as e:
+        return _response(502, {"error": str(e)})
+
+    if key is not None:
+        _answers[key] = reply
+        if len(_answers) > ANSWER_CACHE_SIZE:
+            _answers.popitem(last=False)
+    return _response(200, {"reply": reply})
@@ -0,0 +1,113 @@
+"""
+Server-side chat sessions, so clients send only the new question on each turn.
+
+A session keeps the conversation turns plus the prompt prefix built from them
+(system prompt and prior turns). Each answered turn is appended to that prefix
+instead of rebuilding it from the whole history. The prefix is rebuilt only
+when the portfolio context changes (hot reload) or old turns are trimmed.
+
+The store is in-memory and per process: bounded by `max_sessions`
+(least recently used first) and sessions expire after `idle_ttl` seconds
+without a request.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+
+def clean_history(history) -> List[dict]:
+    """Keep only well-formed {"role", "text"} turns from client-supplied history."""
+    if not isinstance(history, list):
+        return []
+    return [
+        {'role': msg['role'], 'text': msg['text']}
+        for msg in history
+        if isinstance(msg, dict) and isinstance(msg.get('role'), str) and isinstance(msg.get('text'), str)
+        and msg['role'] and msg['text']
+    ]
+
+
+class Session:
+    def __init__(self, session_id: str, turns: List[dict], now: float, max_turns: int):
+        self.id = session_id
+        self.turns = turns
+        self.last_used = now
+        self.max_turns = max_turns
+        self._lock = threading.Lock()
+        self._context = None
+        self._parts = None
+
+    def prompt_prefix(self, context_text: str) -> list:
+        """Prompt parts for the next question, built once per context and then extended."""
+        from api.gemini_client import build_prefix_parts
+        with self._lock:
+            if self._parts is None or (self._context is not context_text and self._context != context_text):
+                self._parts = build_prefix_parts(context_text, self.turns)
+                self._context = context_text
+            return list(self._parts)
+
+    def record(self, question: str, reply: str):
+        """Append an answered turn to the history and the cached prefix."""
+        from api.gemini_client import turn_part
+        with self._lock:
+            new_turns = [{'role': 'user', 'text': question}, {'role': 'assistant', 'text': reply}]
+            self.turns = self.turns + new_turns
+            if len(self.turns) > 2 * self.max_turns:
+                # Dropping the oldest turns changes the start of the prefix; rebuild it lazily
+                self.turns = self.turns[-2 * self.max_turns:]
+                self._parts = None
+            elif self._parts is not None:
+                self._parts.extend(turn_part(t['role'], t['text']) for t in new_turns)
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = 1000, idle_ttl: float = 1800.0, max_turns: int = 20,
+                 clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_turns = max_turns
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # id -> Session, least recently used first
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self, history=None) -> Session:
+        """Start a session, optionally seeded with client-supplied history."""
+        now = self._clock()
+        session = Session(secrets.token_urlsafe(16), clean_history(history)[-2 * self.max_turns:], now,
+                          self.max_turns)
+        with self._lock:
+            self._expire(now)
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id) -> Optional[Session]:
+        """Return the live session with this id, or None if unknown or expired."""
+        if not isinstance(session_id, str):
+            return None
+        now = self._clock()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if now - session.last_used > self.idle_ttl:
+                del self._sessions[session_id]
+                return None
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def _expire(self, now: float):
+        # Least recently used sessions sit at the front, so stop at the first live one
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
@@ -0,0 +1,150 @@
+"""
+Near-duplicate question cache: answer rephrasings of questions already answered.
+
+Questions are reduced to content words (stopwords dropped, plurals and simple
+suffixes stripped) and compared by TF-IDF cosine similarity against the
+answered questions for the current context fingerprint. An inverted index
+limits scoring to entries sharing at least one word, so a lookup touches a
+handful of entries rather than the whole (bounded) cache.
+
+The match is purely lexical: "skills?" finds "what are his skills", but a
+paraphrase with no words in common ("which technologies does he know") misses.
+A sample of hits is kept with both questions and their score so false hits can
+be reviewed and the threshold tuned.
+"""
+
+import math
+import random
+import threading
+from collections import Counter, OrderedDict, deque
+from typing import List, Optional, Tuple
+
+from api.context import normalize_question
+
+# Words that don't change what is being asked. Question words that do
+# (where/when/why/how/who) and negations are deliberately kept.
+STOPWORDS = frozenset(
+    "a an the is are was were be been do does did what which whats tell me about his he him "
+    "ram ramachandra nalam's ram's s of to in on for and or can could would you please i "
+    "know there any some has have had".split()
+)
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 5 and word.endswith('ing'):
+        return word[:-3]
+    if len(word) > 4 and word.endswith('ed'):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def terms(question: str) -> Counter:
+    """Content-word counts used to compare questions."""
+    words = normalize_question(question).replace("'", ' ').split()
+    return Counter(_stem(w) for w in words if w not in STOPWORDS)
+
+
+class SimilarityCache:
+    def __init__(self, threshold: float = 0.85, max_entries: int = 512, sample_rate: float = 0.05,
+                 max_samples: int = 50, rng=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.sample_rate = sample_rate
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._context_hash = None
+        self._entries = OrderedDict()  # normalized question -> (terms, question, reply)
+        self._postings = {}  # term -> set of entry keys
+        # IDF weights and entry norms depend on the whole index; memoized until the next change
+        self._idf_memo = {}
+        self._norms = {}
+        self._samples = deque(maxlen=max_samples)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _reset_for(self, context_hash: str):
+        if context_hash != self._context_hash:
+            self._context_hash = context_hash
+            self._entries.clear()
+            self._postings.clear()
+            self._changed()
+
+    def _changed(self):
+        self._idf_memo.clear()
+        self._norms.clear()
+
+    def _idf(self, term: str) -> float:
+        idf = self._idf_memo.get(term)
+        if idf is None:
+            df = len(self._postings.get(term, ()))
+            idf = self._idf_memo[term] = math.log((len(self._entries) + 1) / (df + 1)) + 1.0
+        return idf
+
+    def _norm(self, key: str) -> float:
+        norm = self._norms.get(key)
+        if norm is None:
+            counts = self._entries[key][0]
+            norm = self._norms[key] = math.sqrt(sum((c * self._idf(t)) ** 2 for t, c in counts.items()))
+        return norm
+
+    def lookup(self, question: str, context_hash: str) -> Optional[Tuple[str, str, float]]:
+        """(reply, matched question, similarity) for the best match above threshold, else None."""
+        query = terms(question)
+        if not query:
+            return None
+        with self._lock:
+            self._reset_for(context_hash)
+            # Accumulate dot products over the postings of the query's terms only
+            weights = {t: c * self._idf(t) for t, c in query.items()}
+            q_norm = math.sqrt(sum(w * w for w in weights.values()))
+            dots = {}
+            for term, weight in weights.items():
+                idf = self._idf(term)
+                for key in self._postings.get(term, ()):
+                    dots[key] = dots.get(key, 0.0) + weight * self._entries[key][0][term] * idf
+            best, best_score = None, 0.0
+            for key, dot in dots.items():
+                score = dot / (q_norm * self._norm(key))
+                if score > best_score:
+                    best, best_score = key, score
+            if best_score < self.threshold:
+                return None
+            self._entries.move_to_end(best)
+            _, matched, reply = self._entries[best]
+            if self._rng.random() < self.sample_rate:
+                self._samples.append({"question": question, "matched": matched, "similarity": round(best_score, 3)})
+            return reply, matched, best_score
+
+    def add(self, question: str, reply: str, context_hash: str):
+        counts = terms(question)
+        if not counts:
+            return
+        key = normalize_question(question)
+        with self._lock:
+            self._reset_for(context_hash)
+            if key in self._entries:
+                self._unindex(key)
+            self._entries[key] = (counts, question, reply)
+            for term in counts:
+                self._postings.setdefault(term, set()).add(key)
+            self._changed()
+            while len(self._entries) > self.max_entries:
+                self._unindex(next(iter(self._entries)))
+
+    def _unindex(self, key: str):
+        counts, _, _ = self._entries.pop(key)
+        for term in counts:
+            keys = self._postings[term]
+            keys.discard(key)
+            if not keys:
+                del self._postings[term]
+
+    def samples(self) -> List[dict]:
+        """Recent sampled hits (question, matched question, similarity) for false-hit review."""
+        with self._lock:
+            return list(self._samples)
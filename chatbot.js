@@ -8,8 +8,19 @@ function ChatbotFactory() {
     dom: {},
     conversationHistory: [],
     hasGreeted: false,
+    pendingRequest: null,
+    sessionId: null,
   };
 
+  // Ask the server to give up on a reply after this long (it may use less)
+  const REQUEST_TIMEOUT_MS = 15000;
+
+  // Shown before a reply the server quoted from the page because the AI service was unavailable
+  const FALLBACK_NOTE = "The AI assistant is unavailable right now, so here is the closest match from the portfolio:";
+
+  // Prerendered answers (see scripts/prerender_faq.py), fetched once on demand
+  let faqAnswersPromise = null;
+
   // Suggested questions for quick interaction
   const SUGGESTED_QUESTIONS = [
     "What's Ram's experience at Meta?",
@@ -107,6 +118,21 @@ function ChatbotFactory() {
     if (indicator) indicator.remove();
   }
 
+  // Must match api.context.normalize_question
+  function normalizeQuestion(q) {
+    return q.toLowerCase().replace(/[^a-z0-9_\s']/g, ' ').split(/\s+/).filter(Boolean).join(' ');
+  }
+
+  function loadFaqAnswers() {
+    if (!faqAnswersPromise) {
+      faqAnswersPromise = fetch('/faq-answers.json')
+        .then(res => (res && res.ok ? res.json() : null))
+        .then(bundle => (bundle && bundle.answers) || {})
+        .catch(() => ({}));
+    }
+    return faqAnswersPromise;
+  }
+
   function renderSuggestions() {
     const container = el('div', { class: 'suggestions-container' });
     const label = el('div', { class: 'suggestions-label', text: 'Quick questions:' });
@@ -128,11 +154,52 @@ function ChatbotFactory() {
     return container;
   }
 
+  function postChat(msg, withHistory, controller) {
+    const body = { question: msg };
+    if (state.sessionId) body.session_id = state.sessionId;
+    if (withHistory) body.history = state.conversationHistory.slice(0, -1);
+    return fetch('/api/chat', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-Request-Timeout-Ms': String(REQUEST_TIMEOUT_MS)
+      },
+      body: JSON.stringify(body),
+      signal: controller ? controller.signal : undefined
+    });
+  }
+
+  // Follow-up questions the server suggested (and may already be answering)
+  function renderFollowUps(questions) {
+    const pills = el('div', { class: 'suggestion-pills follow-up-pills' });
+    questions.forEach(q => {
+      const pill = el('button', { class: 'suggestion-pill', text: q });
+      pill.addEventListener('click', () => sendMessage(q));
+      pills.appendChild(pill);
+    });
+    state.dom.messages.appendChild(pills);
+    state.dom.messages.scrollTop = state.dom.messages.scrollHeight;
+  }
+
+  function clearFollowUps() {
+    state.dom.messages.querySelectorAll('.follow-up-pills').forEach(node => node.remove());
+  }
+
+  // History-free questions go out as a GET so the browser and CDN can cache the answer.
+  // The question is sent as typed: Gemini needs "C++" and ".NET", the server normalizes for its caches.
+  function getChat(msg, controller) {
+    return fetch('/api/chat?q=' + encodeURIComponent(msg), {
+      headers: { 'X-Request-Timeout-Ms': String(REQUEST_TIMEOUT_MS) },
+      signal: controller ? controller.signal : undefined
+    });
+  }
+
   async function sendMessage(message) {
     if (state.sending) return;
     const msg = (message || '').trim();
     if (!msg) return;
 
+    clearFollowUps();
     appendMessage('user', msg);
     state.sending = true;
     state.dom.input.value = '';
@@ -148,15 +215,34 @@ function ChatbotFactory() {
     // Add user message to history
     state.conversationHistory.push({ role: 'user', text: msg });
 
+    // Closing the widget aborts the request so the server can stop waiting on it
+    const controller = typeof AbortController === 'function' ? new AbortController() : null;
+    state.pendingRequest = controller;
+
     try {
-      const response = await fetch('/api/chat', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          question: msg,
-          history: state.conversationHistory.slice(0, -1)
-        })
-      });
+      // First questions (no history) may already have a prerendered answer
+      if (state.conversationHistory.length === 1) {
+        const answers = await loadFaqAnswers();
+        const prerendered = answers[normalizeQuestion(msg)];
+        if (prerendered && prerendered.reply) {
+          hideTypingIndicator();
+          appendMessage('assistant', prerendered.reply);
+          state.conversationHistory.push({ role: 'assistant', text: prerendered.reply });
+          return;
+        }
+      }
+
+      // A first question is a cacheable GET; after that, with a server-side
+      // session only the new question is sent
+      const firstQuestion = !state.sessionId && state.conversationHistory.length === 1 && normalizeQuestion(msg);
+      let response = firstQuestion
+        ? await getChat(msg, controller)
+        : await postChat(msg, !state.sessionId, controller);
+      if (response.status === 410) {
+        // Session expired on the server; start a new one from our copy of the history
+        state.sessionId = null;
+        response = await postChat(msg, true, controller);
+      }
 
       hideTypingIndicator();
 
@@ -166,16 +252,30 @@ function ChatbotFactory() {
       }
 
       const data = await response.json();
+      if (data.session_id) state.sessionId = data.session_id;
       const replyText = data.reply || "I didn't get a response.";
 
-      appendMessage('assistant', replyText);
-      state.conversationHistory.push({ role: 'assistant', text: replyText });
+      if (data.fallback) {
+        // A quote from the page, not an answer: keep the exchange out of the history sent to the model
+        appendMessage('assistant', `${FALLBACK_NOTE} "${replyText}"`);
+        state.conversationHistory.pop();
+      } else {
+        appendMessage('assistant', replyText);
+        state.conversationHistory.push({ role: 'assistant', text: replyText });
+      }
+      if (Array.isArray(data.suggestions) && data.suggestions.length) renderFollowUps(data.suggestions);
 
     } catch (e) {
       hideTypingIndicator();
-      console.error(e);
-      appendMessage('assistant', "Sorry, I'm having trouble connecting. Please make sure the backend server is running on port 5000.");
+      if (e && e.name === 'AbortError') {
+        // The visitor closed the chat; drop the unanswered question
+        state.conversationHistory.pop();
+      } else {
+        console.error(e);
+        appendMessage('assistant', "Sorry, I'm having trouble connecting. Please make sure the backend server is running on port 5000.");
+      }
     } finally {
+      state.pendingRequest = null;
       state.sending = false;
       state.dom.input.disabled = false;
       state.dom.sendBtn.disabled = false;
@@ -189,6 +289,10 @@ function ChatbotFactory() {
     state.dom.panel.classList.toggle('open', state.open);
     state.dom.toggle.classList.toggle('active', state.open);
 
+    if (!state.open && state.pendingRequest) {
+      state.pendingRequest.abort();
+    }
+
     if (state.open && !state.hasGreeted) {
       state.hasGreeted = true;
       setTimeout(() => {
@@ -751,6 +855,7 @@ function ChatbotFactory() {
     appendMessage,
     toggleChatbot,
     init,
+    normalizeQuestion,
     _getState: () => state
   };
 }
@@ -1,47 +1,180 @@
+import argparse
+import json
 import os
 
-def count_stats(root_dir):
-    stats = {}
-    total_lines = 0
-    total_chars = 0
-    
-    skip_dirs = {'.git', '.venv', 'node_modules', '__pycache__', '.netlify', 'attached_assets'}
-    extensions = {'.py', '.js', '.html', '.css', '.md', '.json'}
+INDEX_FILE = '.count_stats_index.json'
+INDEX_VERSION = 1
 
-    print(f"{'Extension':<12} | {'Files':<6} | {'Lines':<8} | {'Chars':<10}")
-    print("-" * 45)
+skip_dirs = {'.git', '.venv', 'node_modules', '__pycache__', '.netlify', 'attached_assets'}
+extensions = {'.py', '.js', '.html', '.css', '.md', '.json'}
 
+
+def iter_files(root_dir):
     for root, dirs, files in os.walk(root_dir):
         # Modify dirs in-place to skip unwanted directories
         dirs[:] = [d for d in dirs if d not in skip_dirs and not d.startswith('.')]
-        
+
         for file in files:
-            ext = os.path.splitext(file)[1]
-            if ext in extensions:
-                file_path = os.path.join(root, file)
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        lines = len(content.splitlines())
-                        chars = len(content)
-                        
-                        if ext not in stats:
-                            stats[ext] = {'files': 0, 'lines': 0, 'chars': 0}
-                        
-                        stats[ext]['files'] += 1
-                        stats[ext]['lines'] += lines
-                        stats[ext]['chars'] += chars
-                        
-                        total_lines += lines
-                        total_chars += chars
-                except Exception as e:
-                    print(f"Error reading {file_path}: {e}")
+            if os.path.splitext(file)[1] in extensions:
+                yield os.path.join(root, file)
+
+
+def read_counts(file_path):
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        content = f.read()
+    return len(content.splitlines()), len(content)
+
+
+def load_index(index_path):
+    """Load a previously written index, or an empty one if missing/incompatible."""
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+            # When the index was written, by the same clock as the files' mtimes
+            written_ns = os.fstat(f.fileno()).st_mtime_ns
+        if data.get('version') == INDEX_VERSION and isinstance(data.get('entries'), dict):
+            data['written_ns'] = written_ns
+            return data
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {'version': INDEX_VERSION, 'written_ns': 0, 'entries': {}}
+
+
+def save_index(index_path, index):
+    # The write time is the file's own mtime (see load_index), not stored in it
+    data = {'version': INDEX_VERSION, 'entries': index['entries']}
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'), sort_keys=True)
+    os.replace(tmp_path, index_path)
+
+
+def update_index(root_dir, index, exclude=()):
+    """
+    Refresh index entries in place, re-reading only files whose size or mtime changed.
+
+    Like git's index, an entry whose mtime is not older than the index file's own mtime
+    is treated as "racily clean" and re-read, since a same-tick edit would be invisible.
+    Returns the number of files that had to be read.
+    """
+    exclude = {os.path.abspath(p) for p in exclude}
+    old_entries = index['entries']
+    written_ns = index.get('written_ns', 0)
+    entries = {}
+    reads = 0
+
+    for file_path in iter_files(root_dir):
+        if os.path.abspath(file_path) in exclude:
+            continue
+        rel = os.path.relpath(file_path, root_dir)
+        try:
+            st = os.stat(file_path)
+        except OSError as e:
+            print(f"Error reading {file_path}: {e}")
+            continue
+
+        entry = old_entries.get(rel)
+        if (
+            entry is not None
+            and entry['size'] == st.st_size
+            and entry['mtime_ns'] == st.st_mtime_ns
+            and st.st_mtime_ns < written_ns
+        ):
+            entries[rel] = entry
+            continue
+
+        try:
+            lines, chars = read_counts(file_path)
+        except Exception as e:
+            print(f"Error reading {file_path}: {e}")
+            continue
+        reads += 1
+        entries[rel] = {
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'lines': lines,
+            'chars': chars,
+        }
+
+    index['entries'] = entries
+    return reads
+
+
+def aggregate(entries):
+    stats = {}
+    for rel, entry in entries.items():
+        ext = os.path.splitext(rel)[1]
+        if ext not in stats:
+            stats[ext] = {'files': 0, 'lines': 0, 'chars': 0}
+        stats[ext]['files'] += 1
+        stats[ext]['lines'] += entry['lines']
+        stats[ext]['chars'] += entry['chars']
+    return stats
+
+
+def collect_stats(root_dir, incremental=False, index_path=None):
+    """Return (stats, files_read). With incremental=True the on-disk index is reused and updated."""
+    if not incremental:
+        index = {'entries': {}, 'written_ns': 0}
+        reads = update_index(root_dir, index)
+        return aggregate(index['entries']), reads
+
+    index_path = index_path or os.path.join(root_dir, INDEX_FILE)
+    index = load_index(index_path)
+    reads = update_index(root_dir, index, exclude=(index_path, index_path + '.tmp'))
+    try:
+        save_index(index_path, index)
+    except OSError as e:
+        print(f"Warning: could not write index {index_path}: {e}")
+    return aggregate(index['entries']), reads
+
+
+def print_table(stats):
+    print(f"{'Extension':<12} | {'Files':<6} | {'Lines':<8} | {'Chars':<10}")
+    print("-" * 45)
 
     for ext, data in sorted(stats.items(), key=lambda x: x[1]['lines'], reverse=True):
         print(f"{ext:<12} | {data['files']:<6} | {data['lines']:<8} | {data['chars']:<10}")
-    
+
+    total_files = sum(d['files'] for d in stats.values())
+    total_lines = sum(d['lines'] for d in stats.values())
+    total_chars = sum(d['chars'] for d in stats.values())
     print("-" * 45)
-    print(f"{'TOTAL':<12} | {sum(d['files'] for d in stats.values()):<6} | {total_lines:<8} | {total_chars:<10}")
+    print(f"{'TOTAL':<12} | {total_files:<6} | {total_lines:<8} | {total_chars:<10}")
+
+
+def count_stats(root_dir, incremental=False, as_json=False, index_path=None):
+    stats, reads = collect_stats(root_dir, incremental=incremental, index_path=index_path)
+    if as_json:
+        print(json.dumps({
+            'extensions': stats,
+            'total': {
+                'files': sum(d['files'] for d in stats.values()),
+                'lines': sum(d['lines'] for d in stats.values()),
+                'chars': sum(d['chars'] for d in stats.values()),
+            },
+            'files_read': reads,
+        }, indent=2, sort_keys=True))
+    else:
+        print_table(stats)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Count files, lines and characters per extension.')
+    parser.add_argument('root', nargs='?', default='.', help='directory to scan (default: .)')
+    parser.add_argument('--incremental', action='store_true',
+                        help=f'reuse and update an on-disk index ({INDEX_FILE}) so unchanged files are only stat()ed')
+    parser.add_argument('--index', dest='index_path', help='path of the index file (implies --incremental)')
+    parser.add_argument('--json', dest='as_json', action='store_true', help='emit machine-readable JSON')
+    args = parser.parse_args(argv)
+    count_stats(
+        args.root,
+        incremental=args.incremental or bool(args.index_path),
+        as_json=args.as_json,
+        index_path=args.index_path,
+    )
+
 
 if __name__ == "__main__":
-    count_stats('.')
+    main()
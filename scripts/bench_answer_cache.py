@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Lookup latency of the SQLite answer cache (api/answer_cache.py) under concurrent readers.
+
+A temporary database is filled with answers, then several reader processes
+look up random keys while one writer process keeps inserting, as worker
+processes would in production. The in-memory warm set is disabled in the
+readers so every lookup goes to SQLite.
+
+Usage:
+    python3 scripts/bench_answer_cache.py [--entries 5000] [--processes 1,2,4,8] [--lookups 2000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from api.answer_cache import AnswerCache, cache_key  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(label, values):
+    print(f"{label:<28} | p50 {statistics.median(values) * 1e6:8.1f} µs"
+          f" | p95 {percentile(values, 95) * 1e6:8.1f} µs | max {max(values) * 1e6:8.1f} µs")
+
+
+def reader(path, keys, lookups, seed, start, results):
+    cache = AnswerCache(path, warm_entries=0)
+    rng = random.Random(seed)
+    start.wait()
+    timings = []
+    for _ in range(lookups):
+        key = rng.choice(keys)
+        t0 = time.perf_counter()
+        assert cache.get(key) is not None
+        timings.append(time.perf_counter() - t0)
+    cache.close()
+    results.put(timings)
+
+
+def writer(path, stop):
+    cache = AnswerCache(path, warm_entries=0, max_entries=10 ** 9)
+    i = 0
+    while not stop.is_set():
+        cache.put(cache_key(f"new question {i}", "bench"), "reply")
+        i += 1
+        if i % 64 == 0:
+            cache.flush()
+    cache.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--entries", type=int, default=5000)
+    parser.add_argument("--processes", default="1,2,4,8", help="comma-separated reader process counts")
+    parser.add_argument("--lookups", type=int, default=2000, help="lookups per reader process")
+    args = parser.parse_args(argv)
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench-answers-")
+    path = os.path.join(tmp_dir, "answers.db")
+    keys = [cache_key(f"question {i}", "bench") for i in range(args.entries)]
+    cache = AnswerCache(path, max_entries=10 ** 9)
+    for key in keys:
+        cache.put(key, "A cached answer of typical length. " * 10)
+    cache.close()
+
+    ctx = multiprocessing.get_context("spawn" if sys.platform == "darwin" else "fork")
+    print(f"Entries: {args.entries}, lookups per reader: {args.lookups}, one concurrent writer")
+    for count in (int(n) for n in args.processes.split(",")):
+        start, stop, results = ctx.Event(), ctx.Event(), ctx.Queue()
+        procs = [ctx.Process(target=reader, args=(path, keys, args.lookups, seed, start, results))
+                 for seed in range(count)]
+        write_proc = ctx.Process(target=writer, args=(path, stop))
+        for p in procs + [write_proc]:
+            p.start()
+        start.set()
+        timings = [t for _ in procs for t in results.get()]
+        stop.set()
+        for p in procs + [write_proc]:
+            p.join()
+        summarize(f"{count} reader process(es)", timings)
+
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
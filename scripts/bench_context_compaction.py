@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Compare the full extracted page text with the compacted context sent to Gemini.
+
+Always prints the size of both (characters and estimated prompt tokens).
+With --live, also asks Gemini the same questions with each context in
+alternating order, and reports latency and the prompt tokens Gemini counted,
+so the effect of compaction on upstream latency can be measured. This makes
+real, billed API calls and needs GEMINI_API_KEY.
+
+Usage:
+    python3 scripts/bench_context_compaction.py [--html index.html]
+    GEMINI_API_KEY=... python3 scripts/bench_context_compaction.py --live --rounds 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from api import faq, gemini_client  # noqa: E402
+from api.context import compact_text, extract_text  # noqa: E402
+
+
+def sizes(text: str) -> dict:
+    parts = gemini_client.build_prefix_parts(text)
+    return {"chars": len(text), "estimated_tokens": gemini_client._estimate_tokens(parts)}
+
+
+def run_live(contexts: dict, questions: list, rounds: int) -> dict:
+    """Per variant: latency percentiles in milliseconds and mean prompt tokens reported by Gemini."""
+    usage = []
+    gemini_client.QUOTA.on_record = usage.append
+    results = {name: {"ms": [], "prompt_tokens": [], "errors": 0} for name in contexts}
+    for i in range(rounds):
+        # Alternate which variant goes first so neither benefits from warm connections
+        order = list(contexts) if i % 2 == 0 else list(reversed(contexts))
+        for question in questions:
+            for name in order:
+                started = time.perf_counter()
+                try:
+                    gemini_client.generate_response(question, contexts[name])
+                except gemini_client.GeminiError:
+                    results[name]["errors"] += 1
+                    continue
+                results[name]["ms"].append((time.perf_counter() - started) * 1000)
+                results[name]["prompt_tokens"].append(usage[-1]["prompt_tokens"])
+    report = {}
+    for name, r in results.items():
+        ms = sorted(r["ms"])
+        report[name] = {
+            "calls": len(ms),
+            "errors": r["errors"],
+            "p50_ms": statistics.median(ms) if ms else None,
+            "p95_ms": ms[min(len(ms) - 1, int(0.95 * len(ms)))] if ms else None,
+            "prompt_tokens": statistics.mean(r["prompt_tokens"]) if r["prompt_tokens"] else None,
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--html", default=os.path.join(ROOT_DIR, "index.html"))
+    parser.add_argument("--questions", default=os.path.join(ROOT_DIR, faq.QUESTIONS_FILE))
+    parser.add_argument("--live", action="store_true", help="call Gemini with both contexts (billed)")
+    parser.add_argument("--rounds", type=int, default=5, help="passes over the questions with --live")
+    args = parser.parse_args(argv)
+
+    with open(args.html, "r", encoding="utf-8") as f:
+        html = f.read()
+    contexts = {"full": extract_text(html), "compact": compact_text(html)}
+    report = {"size": {name: sizes(text) for name, text in contexts.items()}}
+    saved = report["size"]["full"]["chars"] - report["size"]["compact"]["chars"]
+    report["size"]["saved_chars"] = saved
+
+    if args.live:
+        report["live"] = run_live(contexts, faq.load_questions(args.questions), args.rounds)
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Cold- and warm-start benchmark for the serverless /api/chat handler (api/serverless.py).
+
+Gemini is replaced by a local stub server, so the numbers measure only our own
+import, context loading and request handling cost.
+
+Cold start: a fresh interpreter per run imports the handler and serves one request.
+Warm start: repeated invocations in one process (new questions, then cache hits).
+
+Usage:
+    python3 scripts/bench_serverless.py [--cold-runs 10] [--warm-runs 200]
+"""
+
+import argparse
+import http.server
+import importlib.util
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+STUB_REPLY = {"candidates": [{"content": {"parts": [{"text": "Stub answer."}]}}]}
+
+COLD_SNIPPET = r"""
+import json, time
+t0 = time.perf_counter()
+from api import serverless
+t1 = time.perf_counter()
+resp = serverless.handler({
+    "httpMethod": "POST",
+    "headers": {"Content-Type": "application/json"},
+    "body": json.dumps({"question": "Where is he based?"}),
+})
+t2 = time.perf_counter()
+assert resp["statusCode"] == 200, resp
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "first_call_ms": (t2 - t1) * 1000}))
+"""
+
+
+class StubGeminiHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; avoid Nagle/delayed-ACK stalls on keep-alive
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        body = json.dumps(STUB_REPLY).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(label, values):
+    print(f"{label:<28} | p50 {statistics.median(values):8.2f} ms | p95 {percentile(values, 95):8.2f} ms"
+          f" | max {max(values):8.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cold-runs", type=int, default=10)
+    parser.add_argument("--warm-runs", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    stub = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubGeminiHandler)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    out_dir = tempfile.mkdtemp(prefix="bench-dist-")
+    spec = importlib.util.spec_from_file_location("build_assets", os.path.join(ROOT_DIR, "scripts", "build_assets.py"))
+    build_assets = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(build_assets)
+    build_assets.build(ROOT_DIR, out_dir)
+
+    env = dict(
+        os.environ,
+        GEMINI_API_KEY="bench-key",
+        GEMINI_BASE_URL=f"http://127.0.0.1:{stub.server_address[1]}",
+        PORTFOLIO_CONTEXT_PATH=os.path.join(out_dir, build_assets.CONTEXT_ARTIFACT),
+    )
+
+    process_ms, import_ms, first_call_ms = [], [], []
+    for _ in range(args.cold_runs):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", COLD_SNIPPET], env=env, cwd=ROOT_DIR,
+                             capture_output=True, text=True, check=True)
+        process_ms.append((time.perf_counter() - start) * 1000)
+        timings = json.loads(out.stdout.strip().splitlines()[-1])
+        import_ms.append(timings["import_ms"])
+        first_call_ms.append(timings["first_call_ms"])
+
+    os.environ.update(env)
+    from api import serverless
+
+    def invoke(question):
+        start = time.perf_counter()
+        resp = serverless.handler({
+            "httpMethod": "POST",
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"question": question}),
+        })
+        assert resp["statusCode"] == 200, resp
+        return (time.perf_counter() - start) * 1000
+
+    invoke("warm-up")
+    warm_miss = [invoke(f"question {i}") for i in range(args.warm_runs)]
+    warm_hit = [invoke("question 0") for _ in range(args.warm_runs)]
+
+    print(f"Cold runs: {args.cold_runs}, warm runs: {args.warm_runs} (stub upstream)")
+    summarize("cold: process total", process_ms)
+    summarize("cold: handler import", import_ms)
+    summarize("cold: first invocation", first_call_ms)
+    summarize("warm: upstream call", warm_miss)
+    summarize("warm: answer cache hit", warm_hit)
+
+    stub.shutdown()
+    shutil.rmtree(out_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
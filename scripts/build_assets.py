@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Build a deployable copy of the portfolio with minified, content-hashed CSS/JS.
+
+Hashed filenames make the long-lived `Cache-Control` headers in netlify.toml
+safe: any content change produces a new URL. index.html is rewritten to point
+at the hashed files and sw.js gets a regenerated precache list and cache version.
+
+Usage:
+    python3 scripts/build_assets.py [--src .] [--out dist]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from api import faq  # noqa: E402
+from api.context import compact_text, extract_assets, extract_text, fingerprint, preload_header  # noqa: E402
+
+# Assets that get minified and content-hashed
+HASHED_ASSETS = ['styles.css', 'main.js', 'chatbot.js']
+
+# Files copied verbatim into the build output (if present); faq-answers.json only when current
+COPIED_FILES = [
+    'chatbot-knowledge.json',
+    'manifest.json',
+    'favicon.svg',
+    'profile-image.jpg',
+    'robots.txt',
+    'sitemap.xml',
+    'CNAME',
+]
+
+HASH_LENGTH = 10
+ASSET_MANIFEST = 'asset-manifest.json'
+# Precomputed chatbot context, loaded by api/serverless.py instead of parsing HTML at runtime
+CONTEXT_ARTIFACT = 'context.json'
+# Netlify per-path headers; carries the page's Link preloads (server.py computes its own)
+NETLIFY_HEADERS = '_headers'
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(name: str, digest: str) -> str:
+    base, ext = os.path.splitext(name)
+    return f"{base}.{digest}{ext}"
+
+
+def minify_css(css: str) -> str:
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,])\s*', r'\1', css)
+    css = css.replace(';}', '}')
+    return css.strip()
+
+
+def minify_js(js: str) -> str:
+    """
+    Conservative line-based JS minifier.
+
+    Drops whole-line comments, indentation and blank lines but keeps line breaks
+    so automatic semicolon insertion behaves exactly as in the source. Lines
+    inside multi-line template literals are left untouched.
+    """
+    out = []
+    in_template = False
+    in_comment = False
+    for line in js.splitlines():
+        if in_template:
+            out.append(line)
+        else:
+            stripped = line.strip()
+            if in_comment:
+                if '*/' in stripped:
+                    in_comment = False
+                continue
+            if stripped.startswith('/*'):
+                in_comment = '*/' not in stripped[2:]
+                continue
+            if not stripped or stripped.startswith('//'):
+                continue
+            out.append(stripped)
+        # Toggle template state on every unescaped backtick in the line
+        if len(re.findall(r'(?<!\\)`', line)) % 2:
+            in_template = not in_template
+    return '\n'.join(out) + '\n'
+
+
+def rewrite_html(html: str, mapping: dict) -> str:
+    """Point src/href attributes that reference a logical asset at its hashed name."""
+    def repl(match):
+        attr, quote, prefix, name = match.groups()
+        return f"{attr}={quote}{prefix}{mapping[name]}{quote}"
+
+    names = '|'.join(re.escape(n) for n in mapping)
+    pattern = re.compile(r'\b(href|src)=(["\'])(/?)(' + names + r')\2')
+    return pattern.sub(repl, html)
+
+
+def rewrite_service_worker(sw: str, precache: list, version: str) -> str:
+    assets = ',\n'.join(f"  '{url}'" for url in precache)
+    sw = re.sub(
+        r'const STATIC_ASSETS = \[.*?\];',
+        lambda _: f"const STATIC_ASSETS = [\n{assets}\n];",
+        sw,
+        count=1,
+        flags=re.S,
+    )
+    sw = re.sub(r"(const CACHE_NAME = ')[^']*(')", rf"\g<1>portfolio-{version}\g<2>", sw, count=1)
+    sw = re.sub(r"(const STATIC_CACHE = ')[^']*(')", rf"\g<1>static-{version}\g<2>", sw, count=1)
+    return sw
+
+
+def build(src_dir: str = ROOT_DIR, out_dir: str = None) -> dict:
+    """Build into out_dir and return the logical-name -> hashed-name manifest."""
+    out_dir = out_dir or os.path.join(src_dir, 'dist')
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    mapping = {}
+    for name in HASHED_ASSETS:
+        with open(os.path.join(src_dir, name), 'r', encoding='utf-8') as f:
+            source = f.read()
+        minified = minify_css(source) if name.endswith('.css') else minify_js(source)
+        data = minified.encode('utf-8')
+        mapping[name] = hashed_name(name, content_hash(data))
+        with open(os.path.join(out_dir, mapping[name]), 'wb') as f:
+            f.write(data)
+
+    for name in COPIED_FILES:
+        path = os.path.join(src_dir, name)
+        if os.path.exists(path):
+            shutil.copy2(path, os.path.join(out_dir, name))
+
+    with open(os.path.join(src_dir, 'index.html'), 'r', encoding='utf-8') as f:
+        source_html = f.read()
+    html = rewrite_html(source_html, mapping)
+    with open(os.path.join(out_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write(html)
+
+    # Cache version changes whenever any precached content changes
+    version = content_hash(
+        html.encode('utf-8') + ''.join(sorted(mapping.values())).encode('utf-8')
+    )
+    precache = ['/', '/index.html'] + [f"/{mapping[n]}" for n in HASHED_ASSETS]
+    if os.path.exists(os.path.join(src_dir, 'chatbot-knowledge.json')):
+        precache.append('/chatbot-knowledge.json')
+    with open(os.path.join(src_dir, 'sw.js'), 'r', encoding='utf-8') as f:
+        sw = rewrite_service_worker(f.read(), precache, version)
+    with open(os.path.join(out_dir, 'sw.js'), 'w', encoding='utf-8') as f:
+        f.write(sw)
+
+    link = preload_header(extract_assets(html))
+    if link:
+        with open(os.path.join(out_dir, NETLIFY_HEADERS), 'w', encoding='utf-8') as f:
+            for page in ('/', '/index.html'):
+                f.write(f"{page}\n  Link: {link}\n")
+
+    context_text = extract_text(source_html)
+    context_hash = fingerprint(context_text)
+    with open(os.path.join(out_dir, CONTEXT_ARTIFACT), 'w', encoding='utf-8') as f:
+        json.dump({'context': context_text, 'fingerprint': context_hash,
+                   'prompt': compact_text(source_html)}, f)
+
+    # A bundle prerendered for an older index.html would have the chatbot serve outdated answers
+    bundle_path = os.path.join(src_dir, faq.BUNDLE_FILE)
+    try:
+        answers = faq.answers_for(faq.load_bundle(bundle_path), context_hash)
+    except ValueError as e:
+        print(f"⚠️ {faq.BUNDLE_FILE} is malformed ({e}); left out")
+        answers = None
+    if answers:
+        shutil.copy2(bundle_path, os.path.join(out_dir, faq.BUNDLE_FILE))
+    elif answers is not None and os.path.exists(bundle_path):
+        print(f"⚠️ {faq.BUNDLE_FILE} does not match index.html; left out (run scripts/prerender_faq.py)")
+
+    with open(os.path.join(out_dir, ASSET_MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'assets': mapping}, f, indent=2, sort_keys=True)
+
+    return mapping
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build minified, content-hashed portfolio assets.')
+    parser.add_argument('--src', default=ROOT_DIR, help='source directory (default: repo root)')
+    parser.add_argument('--out', default=None, help='output directory (default: <src>/dist)')
+    args = parser.parse_args(argv)
+
+    mapping = build(args.src, args.out)
+    for name, hashed in mapping.items():
+        print(f"📦 {name} -> {hashed}")
+    print(f"✅ Build written to {args.out or os.path.join(args.src, 'dist')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -42,9 +42,13 @@ done
 
 echo "✅ All required files present."
 
+# Build minified, content-hashed assets into dist/
+echo "📦 Building assets..."
+python3 scripts/build_assets.py
+
 # Deploy to Netlify
 echo "🌐 Deploying to Netlify..."
-netlify deploy --prod --dir=. --message="Automated deployment $(date)"
+netlify deploy --prod --dir=dist --message="Automated deployment $(date)"
 
 # Check deployment status
 if [ $? -eq 0 ]; then
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Prerender answers to the questions in faq.json into faq-answers.json.
+
+The bundle is keyed by normalized question and stamped with the fingerprint of
+the context extracted from index.html. It is only regenerated when that
+fingerprint (or the question list) changes, so rerunning this is cheap.
+
+Usage:
+    GEMINI_API_KEY=... python3 scripts/prerender_faq.py [--concurrency 4] [--force]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from api import faq  # noqa: E402
+from api.context import compact_text, extract_text, fingerprint  # noqa: E402
+
+# Read settings from .env like the server does, so both agree on CONTEXT_COMPACTION
+try:
+    from dotenv import load_dotenv  # type: ignore
+    load_dotenv(os.path.join(ROOT_DIR, '.env'))
+except Exception:
+    pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prerender FAQ answers for the chatbot.')
+    parser.add_argument('--questions', default=os.path.join(ROOT_DIR, faq.QUESTIONS_FILE))
+    parser.add_argument('--html', default=os.path.join(ROOT_DIR, 'index.html'))
+    parser.add_argument('--out', default=os.path.join(ROOT_DIR, faq.BUNDLE_FILE))
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--force', action='store_true', help='regenerate even if the bundle is current')
+    args = parser.parse_args(argv)
+
+    questions = faq.load_questions(args.questions)
+    with open(args.html, 'r', encoding='utf-8') as f:
+        html = f.read()
+    context_text = extract_text(html)
+    context_hash = fingerprint(context_text)
+
+    if not args.force and faq.is_current(faq.load_bundle(args.out), questions, context_hash):
+        print(f"✅ {args.out} is up to date (context {context_hash})")
+        return 0
+
+    from api.gemini_client import generate_response
+    from api.priority import BATCH
+
+    def generate(question, **kwargs):
+        return generate_response(question, priority=BATCH, **kwargs)
+
+    # Answered from the same context the server sends (see CONTEXT_COMPACTION in server.py)
+    prompt_text = compact_text(html) if os.getenv("CONTEXT_COMPACTION", "1") == "1" else context_text
+    bundle = faq.prerender(questions, prompt_text, context_hash, generate, args.concurrency)
+
+    tmp_path = args.out + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(bundle, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, args.out)
+
+    print(f"📦 Wrote {len(bundle['answers'])} answers to {args.out} (context {context_hash})")
+    for key, error in bundle['failed'].items():
+        print(f"⚠️  Failed: {key}: {error}")
+    return 1 if bundle['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Replay a server access log against server.py at its original pace, or faster.
+
+Reads the access log server.py writes to stderr (the http.server format,
+`127.0.0.1 - - [19/Oct/2026 03:55:17] "GET / HTTP/1.1" 200 -`) or JSON lines
+with `ts` (epoch seconds or ISO 8601), `method` and `path`. The original
+inter-arrival times are kept, divided by --speed. The classic log only has
+one-second resolution, so requests logged in the same second are spread
+evenly across it.
+
+POST bodies are not logged, so each replayed `POST /api/chat` asks a question
+drawn from faq.json (repeats included, as with real visitors).
+`GET /api/chat?q=` requests replay as logged.
+
+With --start-server a local server.py is started against a stub Gemini that
+answers after --stub-latency seconds, so no real API calls are made. To use
+an already-running server, point its GEMINI_BASE_URL at a stub yourself and
+pass --url.
+
+Latency is measured from each request's scheduled send time, so a client-side
+backlog shows up as latency instead of silently lowering the offered load.
+
+Usage:
+    python3 scripts/replay_access_log.py server.log --start-server --speed 10 [--stub-latency 0.8]
+    python3 scripts/replay_access_log.py server.log --url http://127.0.0.1:5000 --speed 100
+"""
+
+import argparse
+import http.server
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+
+import requests
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from api import faq  # noqa: E402
+
+# BaseHTTPRequestHandler.log_message: host - - [date] "request line" status size
+CLASSIC_LOG_RE = re.compile(
+    r'^\S+ \S+ \S+ \[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<path>\S+)[^"]*" (?P<status>\d{3}|-)'
+)
+CLASSIC_TIME_FORMAT = '%d/%b/%Y %H:%M:%S'
+
+STUB_REPLY = {"candidates": [{"content": {"parts": [{"text": "Stub answer."}]}}]}
+
+LoggedRequest = namedtuple('LoggedRequest', 'at method path')
+Result = namedtuple('Result', 'route seconds status')
+
+
+def _parse_json_line(line: str):
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(entry, dict):
+        return None
+    ts = entry.get('ts', entry.get('time', entry.get('timestamp')))
+    method, path = entry.get('method'), entry.get('path', entry.get('url'))
+    if not isinstance(method, str) or not isinstance(path, str):
+        return None
+    if isinstance(ts, str):
+        try:
+            ts = datetime.fromisoformat(ts.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            return None
+    if not isinstance(ts, (int, float)):
+        return None
+    return LoggedRequest(float(ts), method.upper(), path), True
+
+
+def _parse_classic_line(line: str):
+    match = CLASSIC_LOG_RE.match(line)
+    if not match:
+        return None
+    try:
+        at = datetime.strptime(match.group('time'), CLASSIC_TIME_FORMAT).timestamp()
+    except ValueError:
+        return None
+    return LoggedRequest(at, match.group('method'), match.group('path')), False
+
+
+def parse_log(lines) -> list:
+    """
+    Logged requests in arrival order. Lines in neither format (startup
+    messages, tracebacks) are skipped.
+    """
+    parsed = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        entry = _parse_json_line(line) if line.startswith('{') else _parse_classic_line(line)
+        if entry is not None:
+            parsed.append(entry)
+
+    # Spread second-resolution entries evenly over their second
+    per_second = defaultdict(list)
+    for i, (request, precise) in enumerate(parsed):
+        if not precise:
+            per_second[request.at].append(i)
+    for indexes in per_second.values():
+        for n, i in enumerate(indexes):
+            request = parsed[i][0]
+            parsed[i] = (request._replace(at=request.at + n / len(indexes)), False)
+    return sorted((request for request, _ in parsed), key=lambda r: r.at)
+
+
+def schedule(requests_in_order: list, speed: float) -> list:
+    """(offset in seconds, method, path) for each request, with gaps divided by `speed`."""
+    if not requests_in_order:
+        return []
+    first = requests_in_order[0].at
+    return [((r.at - first) / speed, r.method, r.path) for r in requests_in_order]
+
+
+def route_of(method: str, path: str) -> str:
+    path = urlparse(path).path
+    if path == '/api/chat':
+        return f"{method} /api/chat"
+    if path.startswith('/api/'):
+        return 'api'
+    if path in ('/', '/index.html') or path.startswith('/classic'):
+        return 'page'
+    return 'static'
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def replay(stream: list, base_url: str, questions: list, concurrency: int = 64, timeout: float = 30.0,
+           rng=None) -> list:
+    """Send the scheduled requests to base_url and return one Result per request."""
+    rng = rng or random.Random()
+    local = threading.local()
+    results = []
+    lock = threading.Lock()
+
+    def send(due, method, path, body):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        try:
+            status = session.request(method, base_url + path, json=body, timeout=timeout).status_code
+        except requests.RequestException:
+            status = None
+        with lock:
+            results.append(Result(route_of(method, path), time.perf_counter() - due, status))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for offset, method, path in stream:
+            due = start + offset
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            # Questions are drawn here, in order, so a --seed gives the same replay every time
+            body = None
+            if method == 'POST' and urlparse(path).path == '/api/chat':
+                body = {'question': rng.choice(questions)}
+            pool.submit(send, due, method, path, body)
+    return results
+
+
+def summarize(results: list) -> dict:
+    """Per-route count, errors (5xx or no response), 4xx and latency percentiles in milliseconds."""
+    by_route = defaultdict(list)
+    for result in results:
+        by_route[result.route].append(result)
+    report = {}
+    for route, items in sorted(by_route.items()):
+        ms = [r.seconds * 1000 for r in items]
+        report[route] = {
+            "count": len(items),
+            "errors": sum(1 for r in items if r.status is None or r.status >= 500),
+            "client_errors": sum(1 for r in items if r.status is not None and 400 <= r.status < 500),
+            "p50": statistics.median(ms),
+            "p95": percentile(ms, 95),
+            "p99": percentile(ms, 99),
+            "max": max(ms),
+        }
+    return report
+
+
+def print_report(report: dict, duration: float):
+    print(f"Replayed {sum(r['count'] for r in report.values())} requests in {duration:.1f} s")
+    for route, r in report.items():
+        print(f"{route:<18} | {r['count']:6d} req | {r['errors']:4d} err | {r['client_errors']:4d} 4xx"
+              f" | p50 {r['p50']:8.1f} ms | p95 {r['p95']:8.1f} ms | p99 {r['p99']:8.1f} ms"
+              f" | max {r['max']:8.1f} ms")
+
+
+class StubGeminiHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        time.sleep(self.latency)
+        body = json.dumps(STUB_REPLY).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(stub_latency: float, startup_timeout: float = 15.0):
+    """Start a stub Gemini and a server.py that talks to it. Returns (base_url, stop)."""
+    handler = type("StubHandler", (StubGeminiHandler,), {"latency": stub_latency})
+    stub = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    port = _free_port()
+    env = dict(
+        os.environ,
+        HOST="127.0.0.1",
+        PORT=str(port),
+        GEMINI_API_KEY="replay-key",
+        GEMINI_BASE_URL=f"http://127.0.0.1:{stub.server_address[1]}",
+    )
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT_DIR, "server.py")], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+
+    def stop():
+        proc.terminate()
+        proc.wait(timeout=10)
+        stub.shutdown()
+
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(base_url + "/api/metrics", timeout=1)
+            return base_url, stop
+        except requests.RequestException:
+            time.sleep(0.1)
+    stop()
+    raise RuntimeError(f"server.py did not start within {startup_timeout:.0f} s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("log", help="access log file ('-' for stdin)")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier, e.g. 1, 10, 100")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="server to replay against")
+    parser.add_argument("--start-server", action="store_true", help="start server.py with a stub Gemini")
+    parser.add_argument("--stub-latency", type=float, default=0.5, help="seconds the stub Gemini takes to answer")
+    parser.add_argument("--questions", default=os.path.join(ROOT_DIR, faq.QUESTIONS_FILE),
+                        help="questions for replayed POST /api/chat requests")
+    parser.add_argument("--concurrency", type=int, default=64, help="maximum requests in flight")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.log == "-":
+        logged = parse_log(sys.stdin)
+    else:
+        with open(args.log, "r", encoding="utf-8", errors="replace") as f:
+            logged = parse_log(f)
+    if not logged:
+        print("❌ No requests found in the log")
+        return 1
+    stream = schedule(logged, args.speed)
+    questions = faq.load_questions(args.questions)
+
+    base_url, stop = start_server(args.stub_latency) if args.start_server else (args.url.rstrip("/"), None)
+    try:
+        started = time.perf_counter()
+        results = replay(stream, base_url, questions, args.concurrency, rng=random.Random(args.seed))
+        duration = time.perf_counter() - started
+    finally:
+        if stop:
+            stop()
+
+    report = summarize(results)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Log span {stream[-1][0] * args.speed:.1f} s at {args.speed:g}x against {base_url}")
+        print_report(report, duration)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
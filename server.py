@@ -6,54 +6,660 @@ Serves static files with proper MIME types and handles routing for both interfac
 
 import http.server
 import socketserver
+import glob
+import hmac
 import os
+import queue
+import re
+import select
+import selectors
+import shutil
+import signal
+import socket
 import sys
+import tempfile
+import threading
 import time
-from urllib.parse import urlparse
+from urllib.parse import parse_qs, urlparse
 import json
+import math
 from threading import Thread
 
+from api import faq
+from api.answer_cache import AnswerCache, cache_key
+from api.context import (
+    chat_etag, compact_context, compile_matchers, etag_matches, extract_assets, extract_text, fingerprint,
+    load_knowledge, normalize_question, preload_header,
+)
+from api.extractive import ExtractiveAnswerer
+from api.prefetch import Prefetcher
+from api.priority import PREFETCH as PREFETCH_PRIORITY, REFRESH as REFRESH_PRIORITY
+from api.profiling import MemoryTracker, RequestProfiler
+from api.router import ModelRouter
+from api.sessions import SessionStore
+from api.similarity import SimilarityCache
+
 # Local Gemini client
 try:
-    from api.gemini_client import generate_response, GeminiError
+    from api import gemini_client
+    from api.gemini_client import (
+        generate_response, GeminiError, GeminiCancelled, DeadlineExceeded, RateLimited, KeysRateLimited,
+        UpstreamTimeout,
+    )
 except Exception:
+    gemini_client = None
     generate_response = None
-    GeminiError = RuntimeError
+    GeminiError = GeminiCancelled = DeadlineExceeded = RateLimited = KeysRateLimited = UpstreamTimeout = RuntimeError
+
+# Keys set by the real environment win over .env, also on hot reload
+_PROCESS_ENV_KEYS = set(os.environ)
 
 # Load environment variables from a .env file if present
 try:
-    from dotenv import load_dotenv  # type: ignore
+    from dotenv import load_dotenv, dotenv_values  # type: ignore
     load_dotenv()
 except Exception:
-    pass
+    dotenv_values = None
+
+class Metrics:
+    """Thread-safe counters and timings for one server process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timings = {}
+        self._gauges = {}
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            t = self._timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            t["count"] += 1
+            t["total"] += seconds
+            t["max"] = max(t["max"], seconds)
+
+    def set_gauge(self, name: str, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "timings": {k: dict(v) for k, v in self._timings.items()},
+                "gauges": dict(self._gauges),
+            }
+
+
+def merge_snapshots(snapshots) -> dict:
+    """Aggregate Metrics.snapshot() dicts from several workers (sums, except max)."""
+    merged = {"counters": {}, "timings": {}, "gauges": {}}
+    for snap in snapshots:
+        for kind in ("counters", "gauges"):
+            for name, value in snap.get(kind, {}).items():
+                merged[kind][name] = merged[kind].get(name, 0) + value
+        for name, t in snap.get("timings", {}).items():
+            m = merged["timings"].setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            m["count"] += t["count"]
+            m["total"] += t["total"]
+            m["max"] = max(m["max"], t["max"])
+    return merged
+
+
+METRICS = Metrics()
+
+# Set in pre-fork worker processes (see PreforkSupervisor)
+WORKER_ID = 0
+METRICS_DIR = None
+METRICS_EXPORT_INTERVAL = 2.0
+
+
+def write_metrics_snapshot(directory: str, name: str, retired: dict = None):
+    """Export this process's metrics, plus `retired` (counts of workers that have exited) if given."""
+    path = os.path.join(directory, f"worker-{name}.json")
+    snap = METRICS.snapshot()
+    if retired:
+        snap = merge_snapshots([snap, retired])
+    snap["pid"] = os.getpid()
+    try:
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(snap, f)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"Warning: Failed to export metrics: {e}")
+
+
+def export_worker_metrics():
+    """Write this worker's snapshot where sibling workers can aggregate it."""
+    if METRICS_DIR:
+        write_metrics_snapshot(METRICS_DIR, str(WORKER_ID))
+
+
+def collect_metrics() -> dict:
+    """Live metrics for this process merged with the last export of every sibling worker."""
+    per_worker = {str(WORKER_ID): dict(METRICS.snapshot(), pid=os.getpid())}
+    if METRICS_DIR:
+        for path in glob.glob(os.path.join(METRICS_DIR, "worker-*.json")):
+            worker = os.path.basename(path)[len("worker-"):-len(".json")]
+            if worker in per_worker:
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    per_worker[worker] = json.load(f)
+            except (OSError, ValueError):
+                continue
+    aggregate = merge_snapshots(per_worker.values())
+    metrics = {
+        "workers": len([w for w in per_worker if w != "supervisor"]),
+        "aggregate": aggregate,
+        "shed_rate": shed_rates(aggregate["counters"]),
+        "per_worker": per_worker,
+    }
+    state = STATE.current
+    metrics["context"] = {
+        "chars": len(state.context_text),
+        "prompt_chars": len(state.prompt_text),
+        "saved_chars": len(state.context_text) - len(state.prompt_text),
+    }
+    if gemini_client is not None:
+        # Rolling RPM/TPM window and daily totals of the worker answering this request
+        metrics["quota"] = gemini_client.QUOTA.usage()
+        # Upstream slots in use and queued callers per priority class, same worker
+        metrics["upstream_queue"] = gemini_client.SCHEDULER.snapshot()
+        # Calls, in-flight calls and 429 cooldowns per API key (named key1, key2, ...; never the value)
+        metrics["keys"] = gemini_client.KEYS.snapshot()
+    # Recent latency, error rate and degraded flag per model (a degraded model triggers fallbacks)
+    metrics["router"] = ROUTER.snapshot()
+    if PREFETCH is not None:
+        issued = aggregate["counters"].get("prefetch.issued", 0)
+        metrics["prefetch"] = {
+            "hit_rate": aggregate["counters"].get("prefetch.hits", 0) / issued if issued else 0.0,
+            "transitions": PREFETCH.table.snapshot(),
+        }
+    if SIMILAR is not None:
+        hits = aggregate["counters"].get("chat.similar_hits", 0)
+        lookups = hits + aggregate["counters"].get("chat.similar_misses", 0)
+        metrics["similarity"] = {
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(SIMILAR),
+            # Sampled hits of the worker answering this request, to spot false hits
+            "samples": SIMILAR.samples(),
+        }
+    return metrics
+
+
+def record_token_usage(usage: dict):
+    METRICS.incr("tokens.calls")
+    METRICS.incr("tokens.prompt", usage["prompt_tokens"])
+    METRICS.incr("tokens.output", usage["output_tokens"])
+
+
+def record_upstream_wait(priority: str, seconds: float):
+    METRICS.observe(f"upstream_wait.{priority}", seconds)
+
+
+if gemini_client is not None:
+    gemini_client.QUOTA.on_record = record_token_usage
+    gemini_client.SCHEDULER.on_wait = record_upstream_wait
+
+
+def shed_rates(counters: dict) -> dict:
+    """Fraction of connections per pool refused by load shedding or a full queue."""
+    rates = {}
+    for name in ('static', 'chat'):
+        refused = counters.get(f"pool.{name}.rejected", 0) + counters.get(f"load.{name}.shed", 0)
+        total = refused + counters.get(f"pool.{name}.accepted", 0)
+        rates[name] = refused / total if total else 0.0
+    return rates
+
+
+class PortfolioState:
+    """Immutable snapshot of everything derived from the site files and config."""
+
+    def __init__(self, context_text='', knowledge=None, matchers=None, client_config=None, mtimes=None,
+                 faq_bundle=None, prompt_text=None):
+        self.context_text = context_text
+        self.context_hash = fingerprint(context_text)
+        # What the model is given; context_text (and its hash) still identify the page
+        self.prompt_text = context_text if prompt_text is None else prompt_text
+        # Prerendered answers, only if they were generated from this exact context
+        self.faq_answers = faq.answers_for(faq_bundle, self.context_hash)
+        # Local passage search for when Gemini can't answer (see api/extractive.py)
+        self.extractive = ExtractiveAnswerer(self.prompt_text)
+        self.knowledge = knowledge or {}
+        self.matchers = matchers or {}
+        self.client_config = client_config
+        self.mtimes = mtimes or {}
+        self.loaded_at = time.time()
+
+
+# Send the model a compacted page (boilerplate and repeats removed, structure kept)
+CONTEXT_COMPACTION = os.getenv("CONTEXT_COMPACTION", "1") == "1"
+
+
+# Files whose changes trigger a reload when polling is enabled
+WATCHED_FILES = ('index.html', 'chatbot-knowledge.json', faq.BUNDLE_FILE, '.env')
+
+
+def _file_mtimes(paths=WATCHED_FILES) -> dict:
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = None
+    return mtimes
+
+
+def _refresh_dotenv():
+    if dotenv_values is None:
+        return
+    try:
+        values = dotenv_values()
+    except Exception as e:
+        print(f"Warning: Failed to read .env: {e}")
+        return
+    for key, value in values.items():
+        if key not in _PROCESS_ENV_KEYS and value is not None:
+            os.environ[key] = value
+
+
+def build_state() -> PortfolioState:
+    """Load and derive all per-site state from disk. Never raises; failures fall back to empty."""
+    mtimes = _file_mtimes()
+    try:
+        with open('index.html', 'r', encoding='utf-8') as f:
+            html = f.read()
+        context_text = extract_text(html)
+        prompt_text = compact_context(html, fingerprint(context_text)) if CONTEXT_COMPACTION else context_text
+    except Exception as e:
+        # Fallback to empty context on error
+        print(f"Warning: Failed to load portfolio context: {e}")
+        context_text = prompt_text = ''
+    try:
+        knowledge = load_knowledge('chatbot-knowledge.json')
+        matchers = compile_matchers(knowledge)
+    except Exception as e:
+        print(f"Warning: Failed to load knowledge base: {e}")
+        knowledge, matchers = {}, {}
+    faq_bundle = faq.load_bundle(faq.BUNDLE_FILE)
+    try:
+        faq.answers_for(faq_bundle, fingerprint(context_text))
+    except ValueError as e:
+        print(f"Warning: Ignoring malformed {faq.BUNDLE_FILE}: {e}")
+        faq_bundle = None
+    _refresh_dotenv()
+    client_config = gemini_client.load_config() if gemini_client else None
+    return PortfolioState(context_text, knowledge, matchers, client_config, mtimes, faq_bundle, prompt_text)
+
+
+class StateManager:
+    """
+    Holds the current PortfolioState and rebuilds it on demand.
+
+    Reloads run in a background thread and publish the new snapshot with a single
+    reference swap: requests that already grabbed the old snapshot finish with it.
+    """
+
+    def __init__(self, loader=build_state):
+        self._loader = loader
+        self._state = None
+        self._lock = threading.Lock()
+        self._reloading = threading.Lock()
+        self._watcher = None
+
+    @property
+    def current(self) -> PortfolioState:
+        state = self._state
+        if state is None:
+            with self._lock:
+                if self._state is None:
+                    self._publish(self._loader())
+                state = self._state
+        return state
+
+    def _publish(self, state):
+        self._state = state
+        if gemini_client and state.client_config:
+            gemini_client.set_config(state.client_config)
+
+    def reload(self, reason='manual', wait=False):
+        """Rebuild state in the background; overlapping reload requests are coalesced."""
+        if not self._reloading.acquire(blocking=False):
+            return None
+        t = Thread(target=self._do_reload, args=(reason,), daemon=True)
+        t.start()
+        if wait:
+            t.join()
+        return t
+
+    def _do_reload(self, reason):
+        try:
+            start = time.perf_counter()
+            state = self._loader()
+            old = self._state
+            self._publish(state)
+            METRICS.incr("reload.ok")
+            changed = old is None or old.context_hash != state.context_hash
+            print(f"🔄 Reloaded state ({reason}) in {(time.perf_counter() - start) * 1000:.1f} ms"
+                  f"{' - context changed' if changed else ''}")
+        except Exception as e:
+            METRICS.incr("reload.failed")
+            print(f"❌ Reload failed ({reason}), keeping previous state: {e}")
+        finally:
+            self._reloading.release()
+
+    def start_watcher(self, interval: float):
+        """Poll WATCHED_FILES every `interval` seconds and reload when any of them changes."""
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def poll():
+            while True:
+                time.sleep(interval)
+                if _file_mtimes() != self.current.mtimes:
+                    self.reload('file change', wait=True)
+
+        self._watcher = Thread(target=poll, daemon=True)
+        self._watcher.start()
+
+
+STATE = StateManager()
+
+
+def install_reload_handlers():
+    """Reload on SIGHUP and, when RELOAD_POLL_INTERVAL > 0, on watched file changes."""
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: STATE.reload('SIGHUP'))
+    STATE.start_watcher(float(os.getenv("RELOAD_POLL_INTERVAL", "0")))
+
+
+def background_answer(question: str, turns: list, context_text: str, priority: str = PREFETCH_PRIORITY) -> str:
+    """An answer generated off the request path (prefetch, cache refresh) exactly as a request would be."""
+    return generate_response(question, context_text=context_text, history=turns,
+                             deadline=time.monotonic() + CHAT_DEADLINE, priority=priority)
+
+
+# Optional on-disk answer cache shared by all workers (disabled unless a path is set)
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "")
+ANSWER_CACHE = None
+
+
+def open_answer_cache():
+    """Open ANSWER_CACHE in this process. Called per worker, after fork."""
+    global ANSWER_CACHE
+    if not ANSWER_CACHE_PATH:
+        return None
+    try:
+        ANSWER_CACHE = AnswerCache(
+            ANSWER_CACHE_PATH,
+            ttl=float(os.getenv("ANSWER_CACHE_TTL", "86400")),
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX", "5000")),
+            soft_ttl=float(os.getenv("ANSWER_CACHE_SOFT_TTL", "0")),
+            on_event=lambda name: METRICS.incr(f"chat.cache_{name}"),
+        )
+    except Exception as e:
+        print(f"⚠️  Answer cache disabled: {e}")
+        ANSWER_CACHE = None
+    return ANSWER_CACHE
+
+
+# Per-process conversation sessions (see api/sessions.py)
+SESSIONS = SessionStore(
+    max_sessions=int(os.getenv("SESSION_MAX", "1000")),
+    idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "1800")),
+)
+
+
+# Per-process near-duplicate question cache (see api/similarity.py); SIMILARITY_MAX=0 disables it
+SIMILARITY_MAX = int(os.getenv("SIMILARITY_MAX", "512"))
+SIMILAR = SimilarityCache(
+    threshold=float(os.getenv("SIMILARITY_THRESHOLD", "0.85")),
+    max_entries=SIMILARITY_MAX,
+    sample_rate=float(os.getenv("SIMILARITY_SAMPLE_RATE", "0.05")),
+) if SIMILARITY_MAX > 0 else None
+
+
+# Opt-in speculative answers to likely follow-up questions (see api/prefetch.py)
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "0") == "1"
+PREFETCH = Prefetcher(
+    background_answer,
+    budget=int(os.getenv("PREFETCH_BUDGET", "10")),
+    top_k=int(os.getenv("PREFETCH_TOP_K", "2")),
+    on_event=lambda name: METRICS.incr(f"prefetch.{name}"),
+) if SPECULATIVE_PREFETCH else None
+
+
+# Fast/full model selection with per-model health (see api/router.py)
+ROUTER = ModelRouter()
+
+
+# How long browsers and CDNs may reuse a `GET /api/chat?q=` answer before revalidating
+CHAT_CACHE_MAX_AGE = int(os.getenv("CHAT_CACHE_MAX_AGE", "300"))
+
+
+# Server-side budget for a chat request; clients may only tighten it
+CHAT_DEADLINE = float(os.getenv("CHAT_DEADLINE", "15"))
+
+# Answer from the page itself when Gemini is failing, unhealthy or slower than
+# UPSTREAM_LATENCY_BUDGET seconds (see api/extractive.py)
+EXTRACTIVE_FALLBACK = os.getenv("EXTRACTIVE_FALLBACK", "1") == "1"
+UPSTREAM_LATENCY_BUDGET = float(os.getenv("UPSTREAM_LATENCY_BUDGET", "10"))
+DEADLINE_HEADER = 'X-Request-Timeout-Ms'
+
+
+# /api/debug/* endpoints are only served when a token is configured
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+DEBUG_HEADER = 'X-Debug-Token'
+PROFILER = RequestProfiler()
+MEMORY = MemoryTracker()
+
+
+class PreloadHints:
+    """`Link` preload header for an HTML page, rebuilt only when the file's mtime changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache = {}  # path -> (mtime_ns, header)
+
+    def header(self, path: str, base: str) -> str:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return ''
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                header = preload_header(extract_assets(f.read(), base))
+        except (OSError, UnicodeDecodeError):
+            return ''
+        with self._lock:
+            self._cache[path] = (mtime, header)
+        return header
+
+
+PRELOAD_HINTS = PreloadHints()
+# Also send the hints as a 103 Early Hints response before the page (HTTP/1.1 clients only)
+EARLY_HINTS = os.getenv("EARLY_HINTS", "0") == "1"
+
+
+# Content-hashed build outputs (see scripts/build_assets.py), e.g. styles.0123456789.css
+HASHED_ASSET_RE = re.compile(r'\.[0-9a-f]{10}\.(?:css|js)$')
+
 
 class PortfolioHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    def handle_one_request(self):
+        self._status_code = None
+        self._link_header = None
+        self._cache_control = None
+        self._fallback = False
+        self._client_deadline = False
+        # parse_request() only sets it once the request line is valid; don't report the previous request's path
+        self.path = ''
+        start = time.perf_counter()
+        super().handle_one_request()
+        if self._status_code is not None:
+            route = 'chat' if urlparse(self.path).path == '/api/chat' else 'static'
+            elapsed = time.perf_counter() - start
+            METRICS.incr(f"requests.{route}.{self._status_code // 100}xx")
+            METRICS.observe(f"latency.{route}", elapsed)
+            if route == 'chat':
+                LOAD_SHEDDER.observe(elapsed)
+
+    def send_response(self, code, message=None):
+        self._status_code = code
+        super().send_response(code, message)
+
     def end_headers(self):
-        # Add cache control headers to prevent caching issues in Replit
-        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-        self.send_header('Pragma', 'no-cache')
-        self.send_header('Expires', '0')
+        status = getattr(self, '_status_code', None) or 200
+        if status in (200, 304) and getattr(self, '_cache_control', None):
+            self.send_header('Cache-Control', self._cache_control)
+        elif status in (200, 304) and HASHED_ASSET_RE.search(urlparse(self.path).path):
+            # Hashed filenames change with their content, so they never go stale
+            self.send_header('Cache-Control', 'public, max-age=31536000, immutable')
+        else:
+            # Add cache control headers to prevent caching issues in Replit
+            self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
+            self.send_header('Pragma', 'no-cache')
+            self.send_header('Expires', '0')
+        if status == 200 and getattr(self, '_link_header', None):
+            self.send_header('Link', self._link_header)
         super().end_headers()
 
     def do_GET(self):
+        if self.path.startswith('/api/debug/'):
+            return self._handle_debug()
+        if PROFILER.active:
+            return PROFILER.profile(self._handle_get)
+        return self._handle_get()
+
+    def _handle_get(self):
         # Parse the requested path
         parsed_path = urlparse(self.path)
         path = parsed_path.path
         
+        if path == '/api/metrics':
+            return self._send_json(200, collect_metrics())
+        if path == '/api/chat':
+            return self._handle_chat_get(parsed_path.query)
+        if path == '/' + faq.BUNDLE_FILE and not STATE.current.faq_answers:
+            # The bundle on disk was built for another index.html; the chatbot must not serve it
+            return self._send_json(404, {"error": "No prerendered answers for the current page"})
+
         # Handle root path - serve index.html (modern portfolio)
         if path == '/' or path == '':
             self.path = '/index.html'
         # Handle classic interface routing
         elif path == '/classic' or path == '/classic/':
             self.path = '/classic/index.html'
-        
+        else:
+            return super().do_GET()
+
+        # Pages: let the browser fetch their CSS/JS without waiting to parse the HTML
+        page = self.path.lstrip('/')
+        self._link_header = PRELOAD_HINTS.header(page, base=self.path.rsplit('/', 1)[0] + '/')
+        if self._link_header and EARLY_HINTS and self.request_version == 'HTTP/1.1':
+            self._send_early_hints(self._link_header)
+
         # Call the parent handler
         return super().do_GET()
 
-    def _send_json(self, status: int, body: dict):
+    def _handle_chat_get(self, query: str):
+        """Cacheable answer to a history-free question: `GET /api/chat?q=...`."""
+        start = time.monotonic()
+        if generate_response is None:
+            return self._send_json(500, {"error": "Server not ready: missing dependencies"})
+        question = (parse_qs(query).get('q') or [''])[-1].strip()
+        if not normalize_question(question):
+            return self._send_json(400, {"error": "'q' must be a non-empty question"})
+
+        # The validator depends only on the normalized question and the context,
+        # so a revalidation is answered without generating anything
+        etag = chat_etag(question, STATE.current.context_hash)
+        headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+        self._cache_control = f"public, max-age={CHAT_CACHE_MAX_AGE}"
+        if etag_matches(self.headers.get('If-None-Match', ''), etag):
+            METRICS.incr("chat.not_modified")
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return None
+
+        reply = self._answer(question, [], self._request_deadline(start))
+        if reply is not None and self._fallback:
+            # A stand-in for the real answer must not be cached anywhere
+            self._cache_control = None
+            return self._send_json(200, {"reply": reply, "fallback": True})
+        if reply is not None:
+            body = {"reply": reply}
+            turns = [{'role': 'user', 'text': question}, {'role': 'assistant', 'text': reply}]
+            suggestions = self._speculate(question, [], turns)
+            if suggestions:
+                body["suggestions"] = suggestions
+            self._send_json(200, body, headers)
+        return None
+
+    def _send_early_hints(self, link_header: str):
+        self.wfile.write(f"HTTP/1.1 103 Early Hints\r\nLink: {link_header}\r\n\r\n".encode('latin-1', 'replace'))
+        self.wfile.flush()
+
+    def _handle_debug(self):
+        parsed = urlparse(self.path)
+        if not DEBUG_TOKEN:
+            return self._send_json(404, {"error": "Not found"})
+        token = self.headers.get(DEBUG_HEADER, '')
+        if not hmac.compare_digest(token.encode('utf-8'), DEBUG_TOKEN.encode('utf-8')):
+            return self._send_json(403, {"error": "Forbidden"})
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        try:
+            limit = int(params.get('limit', '40'))
+            if parsed.path == '/api/debug/profile':
+                return self._debug_profile(params, limit)
+            if parsed.path == '/api/debug/memory':
+                return self._debug_memory(params, limit)
+        except ValueError as e:
+            return self._send_json(400, {"error": str(e)})
+        return self._send_json(404, {"error": "Not found"})
+
+    def _debug_profile(self, params: dict, limit: int):
+        """Profile the next `requests` requests or a `seconds` window, then return pstats text."""
+        seconds = float(params['seconds']) if 'seconds' in params else None
+        count = int(params['requests']) if 'requests' in params else (None if seconds else 10)
+        timeout = min(float(params.get('timeout', '30')), 300.0)
+        if not PROFILER.start(requests=count, seconds=seconds):
+            return self._send_json(409, {"error": "A profiling run is already in progress"})
+        report = PROFILER.finish(timeout, sort=params.get('sort', 'cumulative'), limit=limit).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(report)))
+        self.end_headers()
+        self.wfile.write(report)
+
+    def _debug_memory(self, params: dict, limit: int):
+        """action=start|diff|stop; diff reports growth since the last diff (or since=start)."""
+        action = params.get('action', 'diff')
+        if action == 'start':
+            return self._send_json(200, MEMORY.start())
+        if action == 'stop':
+            return self._send_json(200, MEMORY.stop())
+        try:
+            report = MEMORY.diff(since=params.get('since', 'last'), limit=limit, everything='all' in params)
+        except RuntimeError as e:
+            return self._send_json(409, {"error": str(e)})
+        return self._send_json(200, report)
+
+    def _send_json(self, status: int, body: dict, headers=None):
         payload = json.dumps(body).encode('utf-8')
         self.send_response(status)
         self.send_header('Content-Type', 'application/json; charset=utf-8')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.send_header('Content-Length', str(len(payload)))
         self.end_headers()
         self.wfile.write(payload)
@@ -69,44 +675,37 @@ class PortfolioHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             return None
 
     def _load_portfolio_context(self) -> str:
-        # Read index.html as context for the assistant using proper HTML parsing
-        try:
-            from html.parser import HTMLParser
-
-            class TextExtractor(HTMLParser):
-                def __init__(self):
-                    super().__init__()
-                    self.text_parts = []
-                    self.skip_tags = {'script', 'style', 'noscript'}
-                    self.current_tag = None
-
-                def handle_starttag(self, tag, attrs):
-                    if tag in self.skip_tags:
-                        self.current_tag = tag
-
-                def handle_endtag(self, tag):
-                    if tag == self.current_tag:
-                        self.current_tag = None
-
-                def handle_data(self, data):
-                    if self.current_tag is None:
-                        stripped = data.strip()
-                        if stripped:
-                            self.text_parts.append(stripped)
-
-            with open('index.html', 'r', encoding='utf-8') as f:
-                content = f.read()
-
-            parser = TextExtractor()
-            parser.feed(content)
-            text = ' '.join(parser.text_parts)
-            return text[:20000]
-        except Exception as e:
-            # Fallback to empty context on error
-            print(f"Warning: Failed to load portfolio context: {e}")
-            return ''
+        # Extracted and compacted once per reload (see StateManager), not per request
+        return STATE.current.prompt_text
+
+    def _request_deadline(self, start: float) -> float:
+        """Absolute monotonic deadline: the server default, tightened by the client header."""
+        budget = CHAT_DEADLINE
+        try:
+            requested = float(self.headers.get(DEADLINE_HEADER, '')) / 1000.0
+            if 0 < requested < budget:
+                budget = requested
+                self._client_deadline = True
+        except ValueError:
+            pass
+        return start + budget
+
+    def _client_disconnected(self) -> bool:
+        """True once the client has closed its end of the connection."""
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            # Readable with no data means EOF; pipelined bytes mean it's still there
+            return bool(readable) and self.connection.recv(1, socket.MSG_PEEK) == b''
+        except (OSError, ValueError):
+            return True
 
     def do_POST(self):
+        if PROFILER.active:
+            return PROFILER.profile(self._handle_post)
+        return self._handle_post()
+
+    def _handle_post(self):
+        start = time.monotonic()
         parsed_path = urlparse(self.path)
         path = parsed_path.path
         if path != '/api/chat':
@@ -125,46 +724,663 @@ class PortfolioHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         if not isinstance(question, str) or not question.strip():
             return self._send_json(400, {"error": "'question' must be a non-empty string"})
 
+        deadline = self._request_deadline(start)
+        question = question.strip()
+
+        # Clients with a session send only the new question; full history is
+        # needed only to start one (or to recover after it expired)
+        session = None
+        session_id = data.get('session_id')
+        if session_id:
+            session = SESSIONS.get(session_id)
+            if session is None and not history:
+                METRICS.incr("chat.session_expired")
+                return self._send_json(410, {"error": "Session expired; resend the conversation history"})
+        if session is None:
+            session = SESSIONS.create(history)
+        reply = self._answer(question, session.turns, deadline, session)
+        if reply is not None:
+            self._send_reply(session, question, reply)
+        return None
+
+    def _answer(self, question: str, turns: list, deadline: float, session=None):
+        """The reply to `question`, or None after an error response has been sent."""
+        # Prerendered answers need no upstream call (only valid without history)
+        if not turns:
+            reply = STATE.current.faq_answers.get(normalize_question(question))
+            if reply is not None:
+                METRICS.incr("chat.faq_hits")
+                return reply
+
         # Load context from portfolio
         context_text = self._load_portfolio_context()
 
+        if PREFETCH is not None:
+            reply = PREFETCH.take(question, STATE.current.context_hash, turns)
+            if reply is not None:
+                return reply
+
+        key = None
+        if ANSWER_CACHE is not None:
+            key = cache_key(question, STATE.current.context_hash, turns)
+            hit = ANSWER_CACHE.lookup(key)
+            if hit is not None:
+                reply, stale = hit
+                METRICS.incr("chat.cache_hits")
+                if stale:
+                    # Serve it now; one background call replaces it for later visitors
+                    METRICS.incr("chat.cache_stale")
+                    history = list(turns)
+                    ANSWER_CACHE.refresh(key, lambda: background_answer(question, history, context_text,
+                                                                        REFRESH_PRIORITY))
+                return reply
+            METRICS.incr("chat.cache_misses")
+
+        # Rephrasings of an answered question reuse its answer (only valid without history)
+        if SIMILAR is not None and not turns:
+            looked_up = time.monotonic()
+            match = SIMILAR.lookup(question, STATE.current.context_hash)
+            METRICS.observe("chat.similar_lookup", time.monotonic() - looked_up)
+            if match is not None:
+                METRICS.incr("chat.similar_hits")
+                return match[0]
+            METRICS.incr("chat.similar_misses")
+
+        model = None
         try:
-            reply = generate_response(question.strip(), context_text=context_text, history=history)
+            if time.monotonic() >= deadline:
+                raise DeadlineExceeded("Deadline exceeded before calling Gemini")
+            model = ROUTER.choose(question, turns, gemini_client.get_config())
+            if EXTRACTIVE_FALLBACK and ROUTER.degraded(model):
+                # Circuit open: no healthy model, so don't make the visitor wait for one
+                reply = self._fallback_answer(question, "circuit_open")
+                if reply is not None:
+                    return reply
+            METRICS.incr(f"chat.route.{model}")
+            called_at = time.monotonic()
+            upstream_deadline = deadline
+            if EXTRACTIVE_FALLBACK and UPSTREAM_LATENCY_BUDGET > 0:
+                upstream_deadline = min(deadline, called_at + UPSTREAM_LATENCY_BUDGET)
+            reply = generate_response(
+                question,
+                context_text=context_text,
+                history=turns,
+                deadline=upstream_deadline,
+                should_cancel=self._client_disconnected,
+                prefix=session.prompt_prefix(context_text) if session is not None else None,
+                model=model,
+            )
         except ValueError as e:
             # Likely configuration issue like missing API key
             return self._send_json(500, {"error": str(e)})
+        except RateLimited as e:
+            # Our own RPM/TPM budget is full, or every API key is cooling down; nothing was sent upstream
+            METRICS.incr("chat.rate_limited")
+            if isinstance(e, KeysRateLimited) and EXTRACTIVE_FALLBACK:
+                reply = self._fallback_answer(question, "rate_limited")
+                if reply is not None:
+                    return reply
+            return self._send_json(503, {"error": str(e)}, {"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+        except DeadlineExceeded as e:
+            METRICS.incr("chat.deadline_exceeded")
+            # Only a call Gemini failed to answer within the server's own budget says the model is
+            # unhealthy; not a deadline the client shortened, nor time spent queueing locally
+            # (only an UpstreamTimeout comes from the call, so `called_at` and `upstream_deadline` are set)
+            if isinstance(e, UpstreamTimeout) and (not self._client_deadline or upstream_deadline < deadline):
+                self._record_upstream(model, called_at, ok=False)
+            reply = self._fallback_answer(question, "deadline") if EXTRACTIVE_FALLBACK else None
+            if reply is not None:
+                return reply
+            return self._send_json(504, {"error": str(e)})
+        except GeminiCancelled:
+            # Nobody is listening any more; drop the connection without a reply
+            METRICS.incr("chat.cancelled")
+            self.close_connection = True
+            return None
         except GeminiError as e:
             print(f"❌ Gemini API Error: {e}")
+            self._record_upstream(model, called_at, ok=False)
+            reply = self._fallback_answer(question, "upstream_error") if EXTRACTIVE_FALLBACK else None
+            if reply is not None:
+                return reply
             return self._send_json(502, {"error": str(e)})
         except Exception as e:
             return self._send_json(500, {"error": f"Unexpected error: {e}"})
 
-        return self._send_json(200, {"reply": reply})
+        self._record_upstream(model, called_at, ok=True)
+
+        if key is not None:
+            ANSWER_CACHE.put(key, reply)
+        if SIMILAR is not None and not turns:
+            SIMILAR.add(question, reply, STATE.current.context_hash)
+        return reply
+
+    def _fallback_answer(self, question: str, reason: str):
+        """The best-matching passage of the page, marking this reply as a fallback; None if nothing matches."""
+        started = time.monotonic()
+        reply = STATE.current.extractive.answer(question)
+        METRICS.observe("chat.fallback_lookup", time.monotonic() - started)
+        if reply is None:
+            METRICS.incr("chat.fallback_misses")
+            return None
+        METRICS.incr(f"chat.fallback.{reason}")
+        self._fallback = True
+        return reply
+
+    def _record_upstream(self, model: str, called_at: float, ok: bool):
+        elapsed = time.monotonic() - called_at
+        ROUTER.record(model, elapsed, ok)
+        METRICS.observe(f"upstream.{model}", elapsed)
+        if not ok:
+            METRICS.incr(f"upstream.{model}.errors")
+
+    def _send_reply(self, session, question: str, reply: str):
+        if self._fallback:
+            # A quote from the page is not something the model said; keep it out of the conversation
+            return self._send_json(200, {"reply": reply, "session_id": session.id, "fallback": True})
+        turns_before = session.turns
+        session.record(question, reply)
+        body = {"reply": reply, "session_id": session.id}
+        suggestions = self._speculate(question, turns_before, session.turns)
+        if suggestions:
+            body["suggestions"] = suggestions
+        return self._send_json(200, body)
+
+    def _speculate(self, question: str, turns_before: list, turns_after: list) -> list:
+        """Start answering the likely next questions; returns them for the client to offer."""
+        if PREFETCH is None:
+            return []
+        state = STATE.current
+        suggestions = PREFETCH.suggest(question, turns_before, state.knowledge, state.matchers)
+        PREFETCH.prefetch(suggestions, turns_after, state.prompt_text, state.context_hash)
+        return suggestions
 
 class ReuseAddrTCPServer(socketserver.TCPServer):
     """TCP Server that allows address reuse"""
     allow_reuse_address = True
+    reuse_port = False
     
     def server_bind(self):
         # Enable SO_REUSEADDR
         self.socket.setsockopt(socketserver.socket.SOL_SOCKET, socketserver.socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            # Let several worker processes bind the same port; the kernel balances accepts
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.socket.bind(self.server_address)
 
+
+class WorkerPool:
+    """
+    Fixed set of threads fed by a bounded queue.
+
+    submit() never blocks: when the queue is full it returns False so the caller
+    can reject the work. Time spent waiting in the queue is recorded per pool.
+    """
+
+    def __init__(self, name: str, threads: int, max_queue: int):
+        self.name = name
+        self.threads = threads
+        self.queue = queue.Queue(maxsize=max_queue)
+        self._active = 0
+        self._lock = threading.Lock()
+        self._threads = [
+            Thread(target=self._work, name=f"{name}-worker-{i}", daemon=True)
+            for i in range(threads)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, fn, *args) -> bool:
+        try:
+            self.queue.put_nowait((time.perf_counter(), fn, args))
+        except queue.Full:
+            METRICS.incr(f"pool.{self.name}.rejected")
+            return False
+        METRICS.incr(f"pool.{self.name}.accepted")
+        METRICS.set_gauge(f"pool.{self.name}.queued", self.queue.qsize())
+        return True
+
+    def busy(self) -> int:
+        """Connections queued or being handled right now."""
+        with self._lock:
+            return self._active + self.queue.qsize()
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            enqueued_at, fn, args = item
+            METRICS.observe(f"queue_wait.{self.name}", time.perf_counter() - enqueued_at)
+            METRICS.set_gauge(f"pool.{self.name}.queued", self.queue.qsize())
+            with self._lock:
+                self._active += 1
+                METRICS.set_gauge(f"pool.{self.name}.active", self._active)
+            try:
+                fn(*args)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    METRICS.set_gauge(f"pool.{self.name}.active", self._active)
+
+    def shutdown(self):
+        for _ in self._threads:
+            self.queue.put(None)
+        for t in self._threads:
+            t.join(timeout=5)
+
+
+class LoadShedder:
+    """
+    Admission control for a pool based on the expected queueing delay.
+
+    A new request's wait is estimated from the connections already queued or
+    running and a moving average of recent request latency. Work that would
+    wait longer than `budget` seconds is refused up front, with a Retry-After
+    for when the backlog should be back within budget.
+    """
+
+    def __init__(self, budget: float, alpha: float = 0.2, initial_latency: float = 1.0):
+        self.budget = budget
+        self.alpha = alpha
+        self.latency = initial_latency
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.latency += self.alpha * (seconds - self.latency)
+
+    def estimated_wait(self, pool: WorkerPool) -> float:
+        ahead = pool.busy() - pool.threads + 1
+        if ahead <= 0:
+            return 0.0
+        return ahead / pool.threads * self.latency
+
+    def check(self, pool: WorkerPool) -> int:
+        """0 to admit the request, otherwise the Retry-After (seconds) to shed it with."""
+        wait = self.estimated_wait(pool)
+        if wait <= self.budget:
+            return 0
+        METRICS.incr(f"load.{pool.name}.shed")
+        return max(1, math.ceil(wait - self.budget))
+
+
+# Longest a chat request may expect to queue before it is shed
+LOAD_SHEDDER = LoadShedder(float(os.getenv("CHAT_WAIT_BUDGET", "5")))
+
+
+def default_pools() -> dict:
+    return {
+        'static': WorkerPool('static', int(os.getenv("STATIC_THREADS", "8")), int(os.getenv("STATIC_QUEUE", "64"))),
+        'chat': WorkerPool('chat', int(os.getenv("CHAT_THREADS", "4")), int(os.getenv("CHAT_QUEUE", "16"))),
+    }
+
+
+class BulkheadTCPServer(ReuseAddrTCPServer):
+    """
+    Threaded server that isolates /api/chat from static traffic.
+
+    Each accepted connection is classified by peeking at its request line and
+    handed to the matching WorkerPool, so a burst of slow chat requests can only
+    exhaust the chat pool while page loads keep flowing through the static one.
+    Connections arriving when their pool's queue is full get an immediate 503.
+
+    The accept loop never waits for a request line: new connections are parked
+    on a selector and a router thread dispatches each one as soon as it sends
+    something, so idle connections (e.g. browser preconnects) delay nobody.
+    """
+
+    # How long a connection may stay silent before it is closed unrouted
+    classify_timeout = 30.0
+
+    def __init__(self, server_address, RequestHandlerClass, bind_and_activate=True, pools=None):
+        self.pools = pools or default_pools()
+        self._incoming = queue.SimpleQueue()
+        self._parked = {}  # socket -> (client_address, monotonic time to give up)
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        super().__init__(server_address, RequestHandlerClass, bind_and_activate)
+        self._router = Thread(target=self._route_loop, name="connection-router", daemon=True)
+        self._router.start()
+
+    def classify(self, request) -> str:
+        # Only called once the socket is readable, so the peek returns at once
+        try:
+            request.setblocking(False)
+            head = request.recv(128, socket.MSG_PEEK)
+        except OSError:
+            head = b''
+        finally:
+            request.settimeout(None)
+        parts = head.split(b' ', 2)
+        target = parts[1] if len(parts) > 1 else b''
+        if target.startswith(b'/api/chat') and target[9:10] in (b'', b'?', b'/'):
+            return 'chat'
+        return 'static'
+
+    def process_request(self, request, client_address):
+        self._incoming.put((request, client_address))
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass  # a wakeup is already pending (or the server is closing)
+
+    def _route_loop(self):
+        try:
+            while True:
+                give_up = min((at for _, at in self._parked.values()), default=None)
+                timeout = None if give_up is None else max(0.0, give_up - time.monotonic())
+                for key, _ in self._selector.select(timeout):
+                    if key.fileobj is self._wake_r:
+                        try:
+                            self._wake_r.recv(4096)
+                        except OSError:
+                            pass
+                        continue
+                    self._selector.unregister(key.fileobj)
+                    client_address, _ = self._parked.pop(key.fileobj)
+                    self._dispatch(key.fileobj, client_address)
+                while True:
+                    try:
+                        request, client_address = self._incoming.get_nowait()
+                    except queue.Empty:
+                        break
+                    if request is None:
+                        return
+                    self._parked[request] = (client_address, time.monotonic() + self.classify_timeout)
+                    self._selector.register(request, selectors.EVENT_READ)
+                now = time.monotonic()
+                for request, (_, at) in list(self._parked.items()):
+                    if at <= now:
+                        # Never sent a request line; don't let it hold a pool thread
+                        self._selector.unregister(request)
+                        del self._parked[request]
+                        METRICS.incr("connections.idle_closed")
+                        self.shutdown_request(request)
+        finally:
+            for request in list(self._parked):
+                self.shutdown_request(request)
+            self._parked.clear()
+
+    def _dispatch(self, request, client_address):
+        try:
+            kind = self.classify(request)
+            pool = self.pools[kind]
+            retry_after = LOAD_SHEDDER.check(pool) if kind == 'chat' else 0
+            if retry_after or not pool.submit(self._process_in_pool, request, client_address):
+                self._reject(request, retry_after or 1)
+                self.shutdown_request(request)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+
+    def _process_in_pool(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def _reject(self, request, retry_after=1):
+        body = b'{"error": "Server busy, please retry"}'
+        try:
+            request.sendall(
+                b"HTTP/1.0 503 Service Unavailable\r\n"
+                b"Content-Type: application/json; charset=utf-8\r\n"
+                b"Retry-After: " + str(retry_after).encode() + b"\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+            )
+            # Drain what the client already sent so close() doesn't turn into a reset
+            request.setblocking(False)
+            request.recv(65536)
+        except OSError:
+            pass
+
+    def server_close(self):
+        super().server_close()
+        self._incoming.put((None, None))
+        self._wake()
+        self._router.join(timeout=1)
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+        for pool in self.pools.values():
+            pool.shutdown()
+
+
+class ReusePortTCPServer(BulkheadTCPServer):
+    """TCP Server for pre-fork workers sharing one port through SO_REUSEPORT"""
+    reuse_port = True
+
+
+def can_prefork() -> bool:
+    return hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')
+
+
+class PreforkSupervisor:
+    """
+    Run N worker processes that each bind HOST:PORT with SO_REUSEPORT.
+
+    The supervisor restarts workers that exit unexpectedly, and on SIGTERM/SIGINT
+    asks every worker to finish its current request and stop. Each worker exports
+    its Metrics snapshot to a shared directory so /api/metrics can aggregate them.
+    """
+
+    restart_delay = 1.0
+    shutdown_timeout = 10.0
+
+    def __init__(self, host, port, workers, handler_cls=None):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.handler_cls = handler_cls or PortfolioHTTPRequestHandler
+        self.children = {}  # pid -> (slot, started_at)
+        self.stopping = False
+        self.metrics_dir = None
+        self._reservation = None
+        self._retired = {}  # counters and timings of workers that have exited
+
+    def start(self):
+        # Bind (but never listen on) a SO_REUSEPORT socket: it fails fast with
+        # EADDRINUSE like a normal bind, and keeps the port reserved for our workers.
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        try:
+            sock.bind((self.host, self.port))
+        except OSError:
+            sock.close()
+            raise
+        self._reservation = sock
+        self.metrics_dir = tempfile.mkdtemp(prefix='portfolio-metrics-')
+        for slot in range(self.workers):
+            self._spawn(slot)
+
+    def _spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker(slot)
+            except BaseException as e:
+                print(f"❌ Worker {slot} failed: {e}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        self.children[pid] = (slot, time.monotonic())
+
+    def _run_worker(self, slot):
+        global WORKER_ID, METRICS_DIR, METRICS
+        WORKER_ID = slot
+        METRICS_DIR = self.metrics_dir
+        METRICS = Metrics()
+        self._reservation.close()
+
+        httpd = ReusePortTCPServer((self.host, self.port), self.handler_cls)
+        stopped = threading.Event()
+
+        def request_stop(signum, frame):
+            # shutdown() blocks until serve_forever returns, so it can't run in this frame
+            Thread(target=httpd.shutdown, daemon=True).start()
+
+        def exporter():
+            while not stopped.wait(METRICS_EXPORT_INTERVAL):
+                export_worker_metrics()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        install_reload_handlers()
+        open_answer_cache()
+        if gemini_client is not None:
+            # RPM/TPM limits are for the whole server, so each worker schedules its share
+            gemini_client.QUOTA.split(self.workers)
+        Thread(target=exporter, daemon=True).start()
+        try:
+            httpd.serve_forever()
+        finally:
+            stopped.set()
+            httpd.server_close()
+            if ANSWER_CACHE is not None:
+                ANSWER_CACHE.close()
+            if PREFETCH is not None:
+                PREFETCH.close()
+            export_worker_metrics()
+
+    def _request_stop(self, signum, frame):
+        self.stopping = True
+
+    def _forward_signal(self, signum, frame):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def serve_forever(self, poll_interval=0.2):
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        if hasattr(signal, 'SIGHUP'):
+            # Each worker rebuilds its own state; the supervisor just relays SIGHUP
+            signal.signal(signal.SIGHUP, self._forward_signal)
+        try:
+            while not self.stopping:
+                self._reap_and_restart()
+                time.sleep(poll_interval)
+        finally:
+            self.shutdown()
+
+    def _reap_and_restart(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot, started_at = self.children.pop(pid, (None, 0.0))
+            if slot is None or self.stopping:
+                continue
+            print(f"⚠️  Worker {slot} (pid {pid}) exited with status {status}, restarting")
+            METRICS.incr("workers.restarts")
+            self._retire_metrics(slot)
+            write_metrics_snapshot(self.metrics_dir, "supervisor", self._retired)
+            if time.monotonic() - started_at < self.restart_delay:
+                # Avoid a hot crash loop when a worker dies right after starting
+                time.sleep(self.restart_delay)
+            self._spawn(slot)
+
+    def _retire_metrics(self, slot):
+        """
+        Keep a dead worker's last exported counters and timings, which its
+        replacement would otherwise overwrite, so aggregates never go backwards.
+        """
+        path = os.path.join(self.metrics_dir, f"worker-{slot}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+            os.remove(path)
+        except (OSError, ValueError):
+            return
+        # A dead worker has nothing queued or in progress
+        snap.pop("gauges", None)
+        self._retired = merge_snapshots([self._retired, snap])
+
+    def shutdown(self):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.shutdown_timeout
+        while self.children and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.children.pop(pid, None)
+            else:
+                time.sleep(0.05)
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self.children.clear()
+        if self._reservation is not None:
+            self._reservation.close()
+            self._reservation = None
+        if self.metrics_dir:
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+            self.metrics_dir = None
+
 def main():
     # Use PORT from environment when available (e.g., Replit assigns this)
     PORT = int(os.getenv("PORT", "5000"))
     HOST = os.getenv("HOST", "0.0.0.0")
     
-    # Change to the directory containing the portfolio files
-    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    # Change to the directory containing the portfolio files.
+    # STATIC_DIR (e.g. "dist") serves the output of scripts/build_assets.py instead.
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(os.path.join(base_dir, os.getenv("STATIC_DIR", "")))
     
+    # WORKERS > 1 runs that many pre-forked processes sharing the port
+    WORKERS = int(os.getenv("WORKERS", "1"))
+    if WORKERS > 1 and not can_prefork():
+        print("⚠️  SO_REUSEPORT/fork not available on this platform, running a single worker")
+        WORKERS = 1
+
     print(f"🚀 Starting portfolio server on http://{HOST}:{PORT}")
+
+    # Build context/knowledge state up front so the first request doesn't pay for it
+    STATE.current
     
     max_retries = 5
     for attempt in range(max_retries):
         try:
+            if WORKERS > 1:
+                supervisor = PreforkSupervisor(HOST, PORT, WORKERS)
+                supervisor.start()
+                print(f"✅ Portfolio server running at http://{HOST}:{PORT} with {WORKERS} workers")
+                print("Press Ctrl+C to stop the server")
+                supervisor.serve_forever()
+                print("\n👋 Server stopped")
+                sys.exit(0)
+
             # Create server with address reuse
-            with ReuseAddrTCPServer((HOST, PORT), PortfolioHTTPRequestHandler) as httpd:
+            with BulkheadTCPServer((HOST, PORT), PortfolioHTTPRequestHandler) as httpd:
+                install_reload_handlers()
+                open_answer_cache()
                 print(f"✅ Portfolio server running at http://{HOST}:{PORT}")
                 print(f"📖 Modern portfolio interface: http://{HOST}:{PORT}/")
                 print(f"🎨 Classic interface: http://{HOST}:{PORT}/classic/")
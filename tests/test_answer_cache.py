@@ -0,0 +1,199 @@
+import multiprocessing
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from api.answer_cache import AnswerCache, cache_key
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / 'answers.db')
+
+
+def test_cache_key_covers_question_context_and_history():
+    base = cache_key('Where is he based?', 'ctx1')
+    assert cache_key('  where is he BASED ', 'ctx1') == base
+    assert cache_key('Where is he based?', 'ctx1', []) == base
+    assert cache_key('Where is he based?', 'ctx2') != base
+    assert cache_key('Where is he based?', 'ctx1', [{'role': 'user', 'text': 'hi'}]) != base
+
+
+def test_put_is_written_in_background_and_survives_reopen(db):
+    cache = AnswerCache(db)
+    cache.put('k1', 'Seattle')
+    assert cache.get('k1') == 'Seattle'  # served from memory before the write lands
+    cache.flush()
+    cache.close()
+    cache.put('k2', 'ignored after close')
+
+    reopened = AnswerCache(db, warm_entries=0)
+    assert reopened.get('k1') == 'Seattle'
+    assert reopened.get('k2') is None
+    reopened.close()
+    reopened.close()
+
+
+def test_database_uses_wal(db):
+    AnswerCache(db).close()
+    with sqlite3.connect(db) as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+
+def test_warm_loads_newest_entries(db):
+    clock = Clock()
+    cache = AnswerCache(db, clock=clock)
+    for i in range(5):
+        clock.now += 1
+        cache.put(f'k{i}', f'answer {i}')
+    cache.close()
+
+    warm = AnswerCache(db, warm_entries=2, clock=clock)
+    assert list(warm._memory) == ['k3', 'k4']
+    warm.close()
+
+
+def test_ttl_expiry_and_size_trim(db):
+    clock = Clock()
+    cache = AnswerCache(db, ttl=10, max_entries=3, warm_entries=0, clock=clock)
+    cache.put('old', 'stale')
+    cache.flush()
+    clock.now += 11
+    assert cache.get('old') is None
+    for i in range(4):
+        clock.now += 1
+        cache.put(f'k{i}', str(i))
+        cache.flush()
+    with sqlite3.connect(db) as conn:
+        keys = {row[0] for row in conn.execute('SELECT key FROM answers')}
+    assert keys == {'k1', 'k2', 'k3'}
+    cache.close()
+
+
+def test_memory_entries_expire_too(db):
+    clock = Clock()
+    cache = AnswerCache(db, ttl=10, warm_entries=1, clock=clock)
+    cache.put('a', '1')
+    cache.put('b', '2')  # evicts 'a' from memory
+    cache.flush()
+    assert list(cache._memory) == ['b']
+    assert cache.get('a') == '1'  # read back from SQLite
+    clock.now += 11
+    assert cache.get('a') is None
+    cache.close()
+
+
+def test_soft_ttl_marks_entries_stale_until_hard_expiry(db):
+    clock = Clock()
+    cache = AnswerCache(db, ttl=10, soft_ttl=4, warm_entries=1, clock=clock)
+    cache.put('a', '1')
+    cache.put('b', '2')  # 'a' is now only in SQLite
+    cache.flush()
+    assert cache.lookup('a') == ('1', False)
+    clock.now += 5
+    assert cache.lookup('b') == ('2', True)
+    cache._memory.clear()
+    assert cache.lookup('a') == ('1', True)
+    clock.now += 6
+    assert cache.lookup('a') is None
+    # A soft TTL at or beyond the hard one means entries are never stale
+    never_stale = AnswerCache(db, ttl=10, soft_ttl=10)
+    assert never_stale.soft_ttl == 10
+    never_stale.close()
+    cache.close()
+
+
+def test_refresh_runs_once_per_key_in_background(db):
+    events = []
+    cache = AnswerCache(db, ttl=10, soft_ttl=5, on_event=events.append)
+    cache.put('k', 'old')
+    release = threading.Event()
+    calls = []
+
+    def produce():
+        calls.append(1)
+        release.wait(5)
+        return 'new'
+
+    assert cache.refresh('k', produce) is True
+    assert cache.refresh('k', produce) is False  # already refreshing
+    assert cache.get('k') == 'old'
+    release.set()
+    while cache._refreshing:
+        time.sleep(0.01)
+    assert cache.get('k') == 'new'
+    assert calls == [1]
+
+    def broken():
+        raise RuntimeError('upstream down')
+
+    assert cache.refresh('k', broken) is True
+    while cache._refreshing:
+        time.sleep(0.01)
+    assert cache.get('k') == 'new'
+    assert events == ['refreshes', 'refresh_failed']
+    cache.close()
+    assert cache.refresh('k', produce) is False
+
+
+def test_batches_writes(db, monkeypatch):
+    cache = AnswerCache(db, batch_size=50)
+    release = threading.Event()
+    batches = []
+    original = cache._write
+
+    def slow_write(rows):
+        batches.append(len(rows))
+        release.wait(5)
+        original(rows)
+
+    monkeypatch.setattr(cache, '_write', slow_write)
+    cache.put('first', 'v')
+    while not batches:
+        time.sleep(0.01)
+    for i in range(20):  # queued while the first write is still in progress
+        cache.put(f'k{i}', 'v')
+    release.set()
+    cache.flush()
+    assert batches == [1, 20]
+    cache.close()
+
+
+def test_errors_are_reported_not_raised(db, capsys):
+    cache = AnswerCache(db, warm_entries=0)
+    cache._connection().execute('DROP TABLE answers')
+    assert cache.get('k') is None
+    cache.put('k', 'v')
+    cache.flush()
+    out = capsys.readouterr().out
+    assert 'read failed' in out and 'write failed' in out
+    cache.close()
+
+
+def _read_in_other_process(path, key, result):
+    cache = AnswerCache(path, warm_entries=0)
+    result.put(cache.get(key))
+    cache.close()
+
+
+def test_shared_between_processes(db):
+    cache = AnswerCache(db)
+    cache.put(cache_key('Skills?', 'ctx'), 'Python')
+    cache.flush()
+    result = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_read_in_other_process, args=(db, cache_key('skills', 'ctx'), result))
+    proc.start()
+    assert result.get(timeout=10) == 'Python'
+    proc.join(timeout=10)
+    cache.close()
+
@@ -0,0 +1,117 @@
+import importlib.util
+import json
+import os
+import re
+
+import pytest
+
+_spec = importlib.util.spec_from_file_location(
+    'build_assets',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scripts', 'build_assets.py'),
+)
+ba = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(ba)
+
+
+@pytest.fixture
+def site(tmp_path):
+    src = tmp_path / 'src'
+    src.mkdir()
+    (src / 'styles.css').write_text('/* header */\nbody {\n  color: red;\n}\n', encoding='utf-8')
+    (src / 'main.js').write_text('// comment\nconst a = 1;\n\n  console.log(a);\n', encoding='utf-8')
+    (src / 'chatbot.js').write_text(
+        '/* block\n   comment */\nconst t = `\n  keep  me\n`;\n', encoding='utf-8'
+    )
+    (src / 'chatbot-knowledge.json').write_text('{}', encoding='utf-8')
+    (src / 'index.html').write_text(
+        '<link rel="preload" href="styles.css" as="style">'
+        '<link rel="stylesheet" href="/styles.css">'
+        '<script src="main.js"></script><script src="chatbot.js"></script>'
+        '<a href="main.json">x</a>',
+        encoding='utf-8',
+    )
+    (src / 'sw.js').write_text(
+        "const CACHE_NAME = 'portfolio-v1';\n"
+        "const STATIC_CACHE = 'static-v1';\n"
+        "const STATIC_ASSETS = [\n  '/',\n  '/styles.css'\n];\n",
+        encoding='utf-8',
+    )
+    return src, tmp_path / 'out'
+
+
+def test_minify_css():
+    assert ba.minify_css('/* c */ a , b {\n  color : red ;\n}') == 'a,b{color : red}'
+
+
+def test_minify_js_keeps_template_literals():
+    out = ba.minify_js('  // x\n  let s = `\n    a\n  `;\n  /* y */\n  f();\n')
+    assert out == 'let s = `\n    a\n  `;\nf();\n'
+
+
+def test_build_hashes_and_rewrites(site):
+    src, out = site
+    mapping = ba.build(str(src), str(out))
+
+    for name, hashed in mapping.items():
+        assert re.fullmatch(re.escape(os.path.splitext(name)[0]) + r'\.[0-9a-f]{10}' + re.escape(os.path.splitext(name)[1]), hashed)
+        assert (out / hashed).exists()
+
+    html = (out / 'index.html').read_text(encoding='utf-8')
+    assert f'href="{mapping["styles.css"]}"' in html
+    assert f'href="/{mapping["styles.css"]}"' in html
+    assert f'src="{mapping["chatbot.js"]}"' in html
+    assert 'href="main.json"' in html
+
+    sw = (out / 'sw.js').read_text(encoding='utf-8')
+    manifest = json.loads((out / ba.ASSET_MANIFEST).read_text(encoding='utf-8'))
+    assert f"'/{mapping['main.js']}'" in sw
+    assert "'/chatbot-knowledge.json'" in sw
+    assert f"static-{manifest['version']}" in sw
+    assert 'static-v1' not in sw
+    assert manifest['assets'] == mapping
+
+    headers = (out / ba.NETLIFY_HEADERS).read_text(encoding='utf-8')
+    assert headers.startswith('/\n  Link: </' + mapping['styles.css'] + '>; rel=preload; as=style, ')
+    assert f"</{mapping['chatbot.js']}>; rel=preload; as=script" in headers
+    assert '/index.html\n  Link: ' in headers
+
+
+def test_hash_changes_only_with_content(site):
+    src, out = site
+    first = ba.build(str(src), str(out))
+    assert ba.build(str(src), str(out)) == first
+
+    (src / 'main.js').write_text('const a = 2;\n', encoding='utf-8')
+    second = ba.build(str(src), str(out))
+    assert second['main.js'] != first['main.js']
+    assert second['styles.css'] == first['styles.css']
+    assert not (out / first['main.js']).exists()
+
+
+def test_build_writes_context_artifact(site):
+    src, out = site
+    ba.build(str(src), str(out))
+    data = json.loads((out / ba.CONTEXT_ARTIFACT).read_text(encoding='utf-8'))
+    assert data['context'] == 'x'
+    assert len(data['fingerprint']) == 16
+    assert data['prompt'] == 'x'
+
+
+def test_build_copies_faq_bundle_only_for_current_page(site, capsys):
+    src, out = site
+    bundle = {'version': 1, 'context_hash': 'stale', 'answers': {'hi': {'question': 'Hi?', 'reply': 'Hello.'}}}
+    (src / 'faq-answers.json').write_text(json.dumps(bundle), encoding='utf-8')
+    ba.build(str(src), str(out))
+    assert not (out / 'faq-answers.json').exists()
+    assert 'does not match index.html' in capsys.readouterr().out
+
+    bundle['context_hash'] = ba.fingerprint('x')
+    (src / 'faq-answers.json').write_text(json.dumps(bundle), encoding='utf-8')
+    ba.build(str(src), str(out))
+    assert json.loads((out / 'faq-answers.json').read_text(encoding='utf-8')) == bundle
+
+    (out / 'faq-answers.json').unlink()
+    (src / 'faq-answers.json').write_text(json.dumps(dict(bundle, answers=['hi'])), encoding='utf-8')
+    ba.build(str(src), str(out))
+    assert not (out / 'faq-answers.json').exists()
+    assert 'is malformed' in capsys.readouterr().out
@@ -0,0 +1,143 @@
+import json
+
+import pytest
+
+from api import context as ctx
+
+
+def test_extract_text_skips_scripts_and_styles():
+    html = (
+        '<html><head><style>.a{}</style><title>Ram</title></head>'
+        '<body><h1> Data Engineer </h1><script>var x = 1;</script>'
+        '<noscript>enable js</noscript><p>Seattle</p></body></html>'
+    )
+    assert ctx.extract_text(html) == 'Ram Data Engineer Seattle'
+
+
+def test_extract_text_is_capped():
+    html = '<p>' + 'x' * (ctx.MAX_CONTEXT_CHARS + 10) + '</p>'
+    assert len(ctx.extract_text(html)) == ctx.MAX_CONTEXT_CHARS
+
+
+def test_compact_text_drops_boilerplate_and_keeps_structure():
+    html = (
+        '<html><head><title>Ram | Data Engineer</title></head><body>'
+        '<header><nav><a href="#about">About</a><a href="#work">Work</a></nav></header>'
+        '<div class="mobile-nav"><a href="#about">About</a></div>'
+        '<section id="about"><div class="section-label">About</div><h1>Ram <br>Nalam</h1>'
+        '<p>Builds   data\n   pipelines in <strong>Seattle</strong>.</p>'
+        '<a href="#work" class="btn">View my work</a><button>Menu</button>'
+        '<svg><text>icon</text></svg><span aria-hidden="true"><span>deco</span>ration</span></section>'
+        '<section id="work"><div class="section-label">About</div>'
+        '<article><h3>Data Engineer</h3><p>Meta</p></article>'
+        '<article><h3>Data Engineer</h3><p>Amazon</p></article></section>'
+        '<section><h2>Contact</h2><a href="mailto:ram@example.com">ram@example.com</a>'
+        '<img src="me.png" alt="Ram"></section>'
+        '<footer><p>Built by Ram</p></footer></body></html>'
+    )
+    assert ctx.compact_text(html) == (
+        "About\n"
+        "# Ram Nalam\n"
+        "Builds data pipelines in Seattle.\n"
+        "\n"
+        "### Data Engineer\n"
+        "Meta\n"
+        "\n"
+        "### Data Engineer\n"
+        "Amazon\n"
+        "\n"
+        "## Contact\n"
+        "ram@example.com"
+    )
+
+
+def test_compact_context_is_cached_per_fingerprint(monkeypatch):
+    monkeypatch.setattr(ctx, '_COMPACTED', {})
+    assert ctx.compact_context('<p>One</p>', 'h1') == 'One'
+    assert ctx.compact_context('<p>Changed</p>', 'h1') == 'One'  # same fingerprint, same page
+    for i in range(ctx._COMPACTED_MAX):
+        ctx.compact_context(f'<p>{i}</p>', f'other{i}')
+    assert 'h1' not in ctx._COMPACTED
+    assert len(ctx._COMPACTED) == ctx._COMPACTED_MAX
+
+
+def test_load_context(tmp_path):
+    path = tmp_path / 'index.html'
+    path.write_text('<p>Hello</p>', encoding='utf-8')
+    assert ctx.load_context(str(path)) == 'Hello'
+    with pytest.raises(OSError):
+        ctx.load_context(str(tmp_path / 'missing.html'))
+
+
+def test_fingerprint_tracks_content():
+    assert ctx.fingerprint('a') == ctx.fingerprint('a')
+    assert ctx.fingerprint('a') != ctx.fingerprint('b')
+    assert len(ctx.fingerprint('a')) == 16
+
+
+def test_load_knowledge_and_compile_matchers(tmp_path):
+    path = tmp_path / 'kb.json'
+    path.write_text(json.dumps({
+        'greeting': {'pattern': '^(hi|hello)', 'response': 'Hi!'},
+        'skills': {'keywords': ['python', 'c++'], 'response': 'Lots'},
+        'default': {'response': 'Ask me anything'},
+        'version': 2,
+    }), encoding='utf-8')
+    knowledge = ctx.load_knowledge(str(path))
+    matchers = ctx.compile_matchers(knowledge)
+
+    assert set(matchers) == {'greeting', 'skills'}
+    assert matchers['greeting'].search('Hello there')
+    assert matchers['skills'].search('Does he know PYTHON?')
+    assert matchers['skills'].search('and C++ too')
+    assert not matchers['skills'].search('pythonic')
+
+
+def test_load_knowledge_rejects_non_object(tmp_path):
+    path = tmp_path / 'kb.json'
+    path.write_text('[]', encoding='utf-8')
+    with pytest.raises(ValueError):
+        ctx.load_knowledge(str(path))
+
+
+def test_normalize_question():
+    assert ctx.normalize_question("  What's Ram's experience at META? ") == "what's ram's experience at meta"
+    assert ctx.normalize_question('skills?!') == 'skills'
+    assert ctx.normalize_question('Tell me\tabout   his projects.') == 'tell me about his projects'
+
+
+def test_chat_etag_and_matching():
+    etag = ctx.chat_etag('Where is he based?', 'abc')
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert ctx.chat_etag('  where IS he based ', 'abc') == etag
+    assert ctx.chat_etag('Where is he based?', 'def') != etag
+    assert ctx.chat_etag('Where did he study?', 'abc') != etag
+
+    assert ctx.etag_matches(etag, etag)
+    assert ctx.etag_matches('"other", ' + etag[2:], etag)
+    assert ctx.etag_matches('*', etag)
+    assert not ctx.etag_matches('"other"', etag)
+    assert not ctx.etag_matches('', etag)
+
+
+def test_extract_assets_and_preload_header():
+    html = (
+        '<link rel="stylesheet" href="styles.css"><link rel="preload" href="/styles.css" as="style">'
+        '<link rel="preload" href="fonts/dm.woff2" as="font"><link rel="preload" href="x.js">'
+        '<link rel="stylesheet" href="https://fonts.googleapis.com/css">'
+        '<script src="main.js"></script><script>inline()</script>'
+        '<img src="profile-image.jpg"><img src="data:image/png;base64,AAAA"><link rel="icon" href="favicon.svg">'
+    )
+    assets = ctx.extract_assets(html, base='/classic/')
+    assert assets == [
+        ('/classic/styles.css', 'style'),
+        ('/styles.css', 'style'),
+        ('/classic/fonts/dm.woff2', 'font'),
+        ('/classic/main.js', 'script'),
+        ('/classic/profile-image.jpg', 'image'),
+    ]
+    assert ctx.preload_header(assets[2:4]) == (
+        '</classic/fonts/dm.woff2>; rel=preload; as=font; crossorigin, </classic/main.js>; rel=preload; as=script'
+    )
+    many = ''.join(f'<script src="s{i}.js"></script>' for i in range(20))
+    assert len(ctx.extract_assets(many)) == ctx.MAX_PRELOADS
@@ -0,0 +1,80 @@
+import json
+import os
+
+import count_stats as cs
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding='utf-8')
+
+
+def test_full_scan_counts_and_skips(tmp_path):
+    _write(tmp_path / 'a.py', 'x = 1\ny = 2\n')
+    _write(tmp_path / 'b.md', 'hello')
+    _write(tmp_path / 'notes.txt', 'ignored')
+    _write(tmp_path / 'node_modules' / 'c.js', 'ignored()')
+
+    stats, reads = cs.collect_stats(str(tmp_path))
+    assert reads == 2
+    assert stats['.py'] == {'files': 1, 'lines': 2, 'chars': 12}
+    assert stats['.md'] == {'files': 1, 'lines': 1, 'chars': 5}
+    assert '.js' not in stats
+
+
+def test_incremental_rereads_only_changed(tmp_path):
+    _write(tmp_path / 'a.py', 'a\n')
+    _write(tmp_path / 'b.js', 'b\nb\n')
+    index_path = str(tmp_path / 'idx.json')
+
+    stats, reads = cs.collect_stats(str(tmp_path), incremental=True, index_path=index_path)
+    assert reads == 2
+    assert os.path.exists(index_path)
+
+    stats, reads = cs.collect_stats(str(tmp_path), incremental=True, index_path=index_path)
+    assert reads == 0
+    assert stats['.js']['lines'] == 2
+
+    _write(tmp_path / 'b.js', 'b\nb\nb\n')
+    (tmp_path / 'a.py').unlink()
+    stats, reads = cs.collect_stats(str(tmp_path), incremental=True, index_path=index_path)
+    assert reads == 1
+    assert stats['.js']['lines'] == 3
+    assert '.py' not in stats
+
+
+def test_racily_clean_entries_are_judged_by_the_index_mtime(tmp_path):
+    _write(tmp_path / 'a.py', 'a\n')
+    index_path = str(tmp_path / 'idx.json')
+    cs.collect_stats(str(tmp_path), incremental=True, index_path=index_path)
+    written_ns = os.stat(index_path).st_mtime_ns
+
+    # Same tick as the index write: an edit that kept the size could be invisible
+    os.utime(tmp_path / 'a.py', ns=(written_ns, written_ns))
+    index = cs.load_index(index_path)
+    assert index['written_ns'] == written_ns
+    assert cs.update_index(str(tmp_path), index, exclude=(index_path,)) == 1
+
+    # Older than the index write, however long ago that was
+    os.utime(tmp_path / 'a.py', ns=(written_ns - 1, written_ns - 1))
+    cs.collect_stats(str(tmp_path), incremental=True, index_path=index_path)
+    os.utime(index_path, ns=(written_ns, written_ns))
+    assert cs.update_index(str(tmp_path), cs.load_index(index_path), exclude=(index_path,)) == 0
+
+
+def test_corrupt_index_is_rebuilt(tmp_path):
+    _write(tmp_path / 'a.css', 'body{}')
+    index_path = tmp_path / 'idx.json'
+    index_path.write_text('{not json', encoding='utf-8')
+
+    stats, reads = cs.collect_stats(str(tmp_path), incremental=True, index_path=str(index_path))
+    assert reads == 1
+    assert json.loads(index_path.read_text())['version'] == cs.INDEX_VERSION
+
+
+def test_json_output(tmp_path, capsys):
+    _write(tmp_path / 'a.html', '<p>\n</p>\n')
+    cs.main([str(tmp_path), '--json', '--index', str(tmp_path / 'idx.json')])
+    out = json.loads(capsys.readouterr().out)
+    assert out['total'] == {'files': 1, 'lines': 2, 'chars': 9}
+    assert out['extensions']['.html']['files'] == 1
@@ -0,0 +1,56 @@
+import time
+
+from api.context import compact_text, load_context
+from api.extractive import ExtractiveAnswerer, content_terms, passages, question_terms
+
+CONTEXT = (
+    "About Experience Contact. "
+    "Location Seattle, WA. Education MS Data Science, University at Buffalo. "
+    "Data Engineer Amazon 2022 to 2024 Managed Kafka streaming infrastructure handling 500,000 events per second "
+    "Led AWS Glue ETL development processing 750GB daily Reduced CPU utilization by 52% through Redshift tuning. "
+    "Email ram@example.com or connect on LinkedIn."
+)
+
+
+def test_passages_pack_sentences_and_window_long_ones():
+    assert passages('One two. Three four. Five six.', passage_words=4) == ['One two. Three four.', 'Five six.']
+    words = ' '.join(f'w{i}' for i in range(10))
+    assert passages(words, passage_words=4) == ['w0 w1 w2 w3', 'w2 w3 w4 w5', 'w4 w5 w6 w7', 'w6 w7 w8 w9']
+    assert passages('Short. ' + words, passage_words=4)[0] == 'Short.'
+    assert passages('') == []
+
+
+def test_answer_returns_best_matching_passage():
+    answerer = ExtractiveAnswerer(CONTEXT, passage_words=20)
+    assert 'Seattle' in answerer.answer('Where is his location?')
+    assert 'Kafka' in answerer.answer('What did he do at Amazon with Kafka?')
+    assert 'ram@example.com' in answerer.answer('What is his email?')
+    assert answerer.answer('favourite colour') is None
+    ranked = answerer.rank('Kafka streaming at Amazon', k=5)
+    assert [score for score, _ in ranked] == sorted((score for score, _ in ranked), reverse=True)
+    assert ExtractiveAnswerer('').answer('anything') is None
+
+
+def test_answers_real_context_in_single_digit_milliseconds():
+    answerer = ExtractiveAnswerer(load_context('index.html'))
+    questions = ['What did he do at Amazon?', 'What are his skills?', 'Tell me about his projects'] * 100
+    started = time.perf_counter()
+    for question in questions:
+        assert answerer.answer(question) is not None
+    assert (time.perf_counter() - started) / len(questions) < 0.005
+
+
+def test_question_words_and_generic_words_are_not_content():
+    assert content_terms("Where I've Worked / Let's Work Together") == {'together': 1}
+    assert question_terms('Where is he based?') == {'location': 1}
+    assert question_terms('What technologies does he work with?') == {'skill': 1}
+
+
+def test_real_page_answers_come_from_the_right_section():
+    with open('index.html', 'r', encoding='utf-8') as f:
+        answerer = ExtractiveAnswerer(compact_text(f.read()))
+    assert 'Seattle' in answerer.answer('where is he based')
+    skills = answerer.answer('What technologies does he work with?')
+    assert 'Python' in skills and "Let's Work Together" not in skills
+    # Nothing but question words left: no quote rather than a wrong one
+    assert answerer.answer('Where did he work?') is None
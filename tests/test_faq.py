@@ -0,0 +1,102 @@
+import json
+import threading
+
+import pytest
+
+from api import faq
+
+
+def test_load_questions(tmp_path):
+    path = tmp_path / 'faq.json'
+    path.write_text(json.dumps({'questions': ['Where is he based?']}), encoding='utf-8')
+    assert faq.load_questions(str(path)) == ['Where is he based?']
+
+    for bad in ({'questions': []}, {'questions': ['ok', '  ']}, ['not', 'a', 'dict']):
+        path.write_text(json.dumps(bad), encoding='utf-8')
+        with pytest.raises(ValueError):
+            faq.load_questions(str(path))
+
+
+def test_repo_faq_questions_are_valid():
+    assert faq.load_questions(faq.QUESTIONS_FILE)
+
+
+def test_load_bundle(tmp_path):
+    path = tmp_path / 'bundle.json'
+    assert faq.load_bundle(str(path)) is None
+    path.write_text('{broken', encoding='utf-8')
+    assert faq.load_bundle(str(path)) is None
+    path.write_text(json.dumps({'version': 999}), encoding='utf-8')
+    assert faq.load_bundle(str(path)) is None
+    path.write_text(json.dumps({'version': faq.BUNDLE_VERSION, 'answers': {}}), encoding='utf-8')
+    assert faq.load_bundle(str(path))['answers'] == {}
+
+
+def test_prerender_runs_concurrently_and_dedupes():
+    calls = []
+    barrier = threading.Barrier(2, timeout=2)
+
+    def generate(question, context_text):
+        calls.append(question)
+        barrier.wait()  # both distinct questions must be in flight at once
+        return f'answer to {question}'
+
+    bundle = faq.prerender(['Skills?', 'skills', 'Where is he based?'], 'ctx', 'h1', generate, concurrency=2)
+    assert sorted(calls) == ['Skills?', 'Where is he based?']
+    assert bundle['context_hash'] == 'h1'
+    assert bundle['answers']['skills'] == {'question': 'Skills?', 'reply': 'answer to Skills?'}
+    assert bundle['failed'] == {}
+
+
+def test_prerender_records_failures():
+    def generate(question, context_text):
+        if 'bad' in question:
+            raise RuntimeError('upstream down')
+        return 'ok'
+
+    bundle = faq.prerender(['good', 'bad'], 'ctx', 'h1', generate)
+    assert list(bundle['answers']) == ['good']
+    assert bundle['failed'] == {'bad': 'upstream down'}
+
+
+def test_answers_for_and_is_current():
+    bundle = {'version': 1, 'context_hash': 'h1', 'answers': {'skills': {'question': 'Skills?', 'reply': 'Python'}}}
+    assert faq.answers_for(bundle, 'h1') == {'skills': 'Python'}
+    assert faq.answers_for(bundle, 'h2') == {}
+    assert faq.answers_for(None, 'h1') == {}
+    for answers in (['skills'], {'skills': 'Python'}, {'skills': {'question': 'Skills?'}}):
+        with pytest.raises(ValueError):
+            faq.answers_for(dict(bundle, answers=answers), 'h1')
+
+    assert faq.is_current(bundle, ['Skills?'], 'h1')
+    assert not faq.is_current(bundle, ['Skills?', 'Contact?'], 'h1')
+    assert not faq.is_current(bundle, ['Skills?'], 'h2')
+    assert not faq.is_current(None, ['Skills?'], 'h1')
+
+
+def test_prerender_script_skips_current_bundle(tmp_path, monkeypatch):
+    import importlib.util
+    import os
+    spec = importlib.util.spec_from_file_location(
+        'prerender_faq', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scripts', 'prerender_faq.py'))
+    script = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(script)
+
+    from api import gemini_client
+    calls = []
+    monkeypatch.setattr(gemini_client, 'generate_response',
+                        lambda q, context_text, priority: calls.append((q, context_text, priority)) or 'Seattle')
+    (tmp_path / 'faq.json').write_text(json.dumps({'questions': ['Where is he based?']}), encoding='utf-8')
+    (tmp_path / 'index.html').write_text('<nav>Home</nav><p>Ram lives in Seattle</p>', encoding='utf-8')
+    out = tmp_path / 'faq-answers.json'
+    argv = ['--questions', str(tmp_path / 'faq.json'), '--html', str(tmp_path / 'index.html'), '--out', str(out)]
+
+    assert script.main(argv) == 0
+    assert json.loads(out.read_text())['answers']['where is he based']['reply'] == 'Seattle'
+    assert script.main(argv) == 0
+    assert calls == [('Where is he based?', 'Ram lives in Seattle', 'batch')]
+
+    # With compaction off, the prompt is the full extracted text, as the server sends it
+    monkeypatch.setenv('CONTEXT_COMPACTION', '0')
+    assert script.main(argv + ['--force']) == 0
+    assert calls[-1] == ('Where is he based?', 'Home Ram lives in Seattle', 'batch')
@@ -1,5 +1,6 @@
 import json
 import os
+import time
 from types import SimpleNamespace
 
 import pytest
@@ -175,3 +176,376 @@ def test_payload_includes_context(monkeypatch):
     payload = captured['payload']
     text = payload['contents'][0]['parts'][0]['text']
     assert 'Context:' in text and 'Context text here' in text and 'Question:' in text
+
+
+def test_config_swap_changes_request_url(monkeypatch):
+    os.environ['GEMINI_API_KEY'] = 'k'
+    urls = []
+
+    def fake_post(url, data=None, headers=None, timeout=None):
+        urls.append(url)
+        return DummyResp(data={'candidates': [{'content': {'parts': [{'text': 'ok'}]}}]})
+
+    monkeypatch.setattr(gc.requests, 'post', fake_post)
+    original = gc.get_config()
+    monkeypatch.setenv('GEMINI_MODEL', 'fast-model')
+    monkeypatch.setenv('GEMINI_BASE_URL', 'http://upstream.test')
+    try:
+        config = gc.load_config()
+        assert config == gc.ClientConfig('fast-model', 'http://upstream.test')
+        gc.set_config(config)
+        assert gc.GEMINI_MODEL == 'fast-model'
+        gc.generate_response('Q', 'ctx')
+        assert urls[-1].startswith('http://upstream.test/models/fast-model:generateContent')
+    finally:
+        gc.set_config(original)
+    assert gc.get_config() == original
+
+
+def test_generate_response_uses_session(monkeypatch):
+    os.environ['GEMINI_API_KEY'] = 'k'
+
+    class FakeSession:
+        def __init__(self):
+            self.calls = 0
+
+        def post(self, url, data=None, headers=None, timeout=None):
+            self.calls += 1
+            return DummyResp(data={'candidates': [{'content': {'parts': [{'text': 'pooled'}]}}]})
+
+    def fail_post(*a, **k):
+        raise AssertionError('module-level requests.post should not be used')
+
+    monkeypatch.setattr(gc.requests, 'post', fail_post)
+    session = FakeSession()
+    assert gc.generate_response('Q', 'ctx', session=session) == 'pooled'
+    assert session.calls == 1
+
+
+def _ok_resp():
+    return DummyResp(data={'candidates': [{'content': {'parts': [{'text': 'ok'}]}}]})
+
+
+def test_deadline_caps_timeout(monkeypatch):
+    os.environ['GEMINI_API_KEY'] = 'k'
+    seen = {}
+
+    def fake_post(url, data=None, headers=None, timeout=None):
+        seen['timeout'] = timeout
+        return _ok_resp()
+
+    monkeypatch.setattr(gc.requests, 'post', fake_post)
+    gc.generate_response('Q', 'ctx', deadline=gc.time.monotonic() + 2.0)
+    assert 1.5 < seen['timeout'] <= 2.0
+    gc.generate_response('Q', 'ctx', timeout=1.0, deadline=gc.time.monotonic() + 5.0)
+    assert seen['timeout'] == 1.0
+
+
+def test_deadline_already_passed(monkeypatch):
+    os.environ['GEMINI_API_KEY'] = 'k'
+    monkeypatch.setattr(gc.requests, 'post', lambda *a, **k: pytest.fail('should not call upstream'))
+    with pytest.raises(gc.DeadlineExceeded):
+        gc.generate_response('Q', 'ctx', deadline=gc.time.monotonic() - 1)
+
+
+def test_timeout_after_deadline_maps_to_deadline_exceeded(monkeypatch):
+    os.environ['GEMINI_API_KEY'] = 'k'
+    deadline = gc.time.monotonic() + 0.05
+
+    def fake_post(url, data=None, headers=None, timeout=None):
+        gc.time.sleep(0.06)
+        raise gc.requests.Timeout('read timed out')
+
+    monkeypatch.setattr(gc.requests, 'post', fake_post)
+    # The call was sent, so this is the model being slow (see server.py's router bookkeeping)
+    with pytest.raises(gc.UpstreamTimeout):
+        gc.generate_response('Q', 'ctx', deadline=deadline)
+
+
+def test_should_cancel_aborts_wait(monkeypatch):
+    os.environ['GEMINI_API_KEY'] = 'k'
+    release = gc.threading.Event()
+
+    def fake_post(url, data=None, headers=None, timeout=None):
+        release.wait(2)
+        return _ok_resp()
+
+    monkeypatch.setattr(gc.requests, 'post', fake_post)
+    polls = []
+    start = gc.time.monotonic()
+    monkeypatch.setattr(gc, 'KEYS', gc.KeyPool())
+    monkeypatch.setattr(gc, 'SCHEDULER', gc.PriorityScheduler(limit=1))
+    with pytest.raises(gc.GeminiCancelled):
+        gc.generate_response('Q', 'ctx', should_cancel=lambda: polls.append(1) or len(polls) >= 2)
+    assert gc.time.monotonic() - start < 1.0
+    # The abandoned call is still running: it keeps its slot and key until it ends
+    assert gc.SCHEDULER.snapshot()['in_flight'] == 1
+    assert gc.KEYS.snapshot()['key1']['in_flight'] == 1
+    release.set()
+    deadline = gc.time.monotonic() + 2
+    while gc.SCHEDULER.snapshot()['in_flight'] and gc.time.monotonic() < deadline:
+        gc.time.sleep(0.01)
+    assert gc.SCHEDULER.snapshot()['in_flight'] == 0
+    assert gc.KEYS.snapshot()['key1']['in_flight'] == 0
+
+
+def test_should_cancel_while_queued_sends_nothing(monkeypatch):
+    os.environ['GEMINI_API_KEY'] = 'k'
+    monkeypatch.setattr(gc.requests, 'post', lambda *a, **k: pytest.fail('should not call upstream'))
+    monkeypatch.setattr(gc, 'SCHEDULER', gc.PriorityScheduler(limit=1))
+    gc.SCHEDULER.acquire('batch')
+    with pytest.raises(gc.GeminiCancelled):
+        gc.generate_response('Q', 'ctx', should_cancel=lambda: True)
+    gc.SCHEDULER.release()
+
+    monkeypatch.setattr(gc, 'QUOTA', gc.QuotaScheduler(rpm=1, max_wait=100))
+    gc.QUOTA.acquire(1)
+    with pytest.raises(gc.GeminiCancelled):
+        gc.generate_response('Q', 'ctx', should_cancel=lambda: True)
+    assert gc.SCHEDULER.snapshot()['in_flight'] == 0
+
+
+def test_cleanup_deferred_after_call_already_ended():
+    call = gc._BackgroundCall(lambda: 'done')
+    call.thread.join()
+    ran = []
+    gc.GeminiCancelled('late', call).defer(lambda: ran.append(1))
+    gc.GeminiCancelled('queued').defer(lambda: ran.append(2))
+    assert ran == [1, 2] and call.resp == 'done'
+
+
+def test_should_cancel_passes_through_result_and_errors(monkeypatch):
+    os.environ['GEMINI_API_KEY'] = 'k'
+    monkeypatch.setattr(gc, 'CANCEL_POLL_INTERVAL', 0.01)
+
+    def slow_ok(url, data=None, headers=None, timeout=None):
+        gc.time.sleep(0.03)
+        return _ok_resp()
+
+    monkeypatch.setattr(gc.requests, 'post', slow_ok)
+    assert gc.generate_response('Q', 'ctx', should_cancel=lambda: False) == 'ok'
+
+    def failing(url, data=None, headers=None, timeout=None):
+        raise gc.requests.ConnectionError('refused')
+
+    monkeypatch.setattr(gc.requests, 'post', failing)
+    with pytest.raises(gc.GeminiError) as e:
+        gc.generate_response('Q', 'ctx', should_cancel=lambda: False)
+    assert not isinstance(e.value, gc.GeminiCancelled)
+
+
+def test_history_and_prebuilt_prefix_produce_same_parts(monkeypatch):
+    os.environ['GEMINI_API_KEY'] = 'k'
+    payloads = []
+
+    def fake_post(url, data=None, headers=None, timeout=None):
+        payloads.append(json.loads(data))
+        return DummyResp(data={'candidates': [{'content': {'parts': [{'text': 'ok'}]}}]})
+
+    monkeypatch.setattr(gc.requests, 'post', fake_post)
+    history = [{'role': 'user', 'text': 'hi'}, {'role': 'assistant', 'text': 'hello'}, {'role': 'user'}]
+    gc.generate_response('Skills?', 'ctx', history=history)
+    prefix = gc.build_prefix_parts('ctx', history)
+    gc.generate_response('Skills?', 'ignored', history=[{'role': 'user', 'text': 'ignored'}], prefix=prefix)
+
+    parts = payloads[0]['contents'][0]['parts']
+    assert [p['text'] for p in parts[1:]] == ['User: hi', 'Assistant: hello', 'Question: Skills?']
+    assert payloads[1] == payloads[0]
+    assert len(prefix) == 3  # the caller's prefix is not modified
+
+
+def test_model_override_and_fast_model_config(monkeypatch):
+    os.environ['GEMINI_API_KEY'] = 'k'
+    urls = []
+
+    def fake_post(url, data=None, headers=None, timeout=None):
+        urls.append(url)
+        return DummyResp(data={'candidates': [{'content': {'parts': [{'text': 'ok'}]}}]})
+
+    monkeypatch.setattr(gc.requests, 'post', fake_post)
+    gc.generate_response('Q', 'ctx', model='other-model')
+    assert '/models/other-model:generateContent' in urls[-1]
+
+    monkeypatch.setenv('GEMINI_FAST_MODEL', '')
+    assert gc.load_config().fast_model == ''
+    monkeypatch.delenv('GEMINI_FAST_MODEL')
+    assert gc.load_config().fast_model == gc.DEFAULT_FAST_MODEL
+
+
+def test_usage_is_recorded_and_quota_enforced(monkeypatch):
+    os.environ['GEMINI_API_KEY'] = 'k'
+    calls = []
+
+    def fake_post(url, data=None, headers=None, timeout=None):
+        calls.append(url)
+        return DummyResp(data={
+            'candidates': [{'content': {'parts': [{'text': 'ok'}]}}],
+            'usageMetadata': {'promptTokenCount': 120, 'candidatesTokenCount': 30, 'totalTokenCount': 150},
+        })
+
+    monkeypatch.setattr(gc.requests, 'post', fake_post)
+    monkeypatch.setattr(gc, 'QUOTA', gc.QuotaScheduler(rpm=1, max_wait=0))
+    assert gc.generate_response('Q', 'ctx') == 'ok'
+    assert gc.QUOTA.usage()['day'] == {'requests': 1, 'prompt_tokens': 120, 'output_tokens': 30}
+
+    # The budget is full: no request goes out
+    with pytest.raises(gc.RateLimited) as e:
+        gc.generate_response('Q', 'ctx')
+    assert e.value.retry_after > 50
+    assert len(calls) == 1
+
+
+def test_calls_wait_for_an_upstream_slot_by_priority(monkeypatch):
+    os.environ['GEMINI_API_KEY'] = 'k'
+    waits = []
+
+    def fake_post(url, data=None, headers=None, timeout=None):
+        assert gc.SCHEDULER.snapshot()['in_flight'] == 1  # held for the HTTP call only
+        return DummyResp(data={'candidates': [{'content': {'parts': [{'text': 'ok'}]}}]})
+
+    monkeypatch.setattr(gc.requests, 'post', fake_post)
+    monkeypatch.setattr(gc, 'SCHEDULER', gc.PriorityScheduler(limit=1, on_wait=lambda p, s: waits.append(p)))
+    assert gc.generate_response('Q', 'ctx', priority='batch') == 'ok'
+    assert gc.generate_response('Q', 'ctx') == 'ok'
+    assert waits == ['batch', 'interactive']
+
+    # Every slot busy until the deadline: nothing is sent
+    gc.SCHEDULER.acquire('interactive')
+    with pytest.raises(gc.DeadlineExceeded):
+        gc.generate_response('Q', 'ctx', deadline=time.monotonic() + 0.05)
+    assert gc.SCHEDULER.snapshot()['in_flight'] == 1
+
+
+def test_missing_usage_metadata_keeps_the_estimate(monkeypatch):
+    os.environ['GEMINI_API_KEY'] = 'k'
+    assert gc._extract_usage({}) is None
+    assert gc._extract_usage(['not', 'a', 'dict']) is None
+    assert gc._extract_usage({'usageMetadata': {'promptTokenCount': 7}}) == {'prompt_tokens': 7, 'output_tokens': 0}
+    assert gc._estimate_tokens([{'text': 'x' * 40}]) == 11
+    replies = iter([
+        DummyResp(data={'candidates': [{'content': {'parts': [{'text': 'ok'}]}}]}),
+        DummyResp(ok=False, status=500, data={'error': {'message': 'boom'}}),
+        DummyResp(ok=False, status=429, data={'error': {'message': 'slow down'},
+                                              'usageMetadata': {'promptTokenCount': 50}}),
+        DummyResp(data=ValueError('not json')),
+    ])
+    monkeypatch.setattr(gc.requests, 'post', lambda *a, **kw: next(replies))
+    monkeypatch.setattr(gc, 'QUOTA', gc.QuotaScheduler())
+    monkeypatch.setattr(gc, 'KEYS', gc.KeyPool(cooldown=0))
+    assert gc.generate_response('Q', 'ctx') == 'ok'
+    estimate = gc.QUOTA.usage()['minute']['tokens']
+    assert estimate > 0
+    # Calls that reached Gemini and failed still use budget
+    for _ in range(3):
+        with pytest.raises(gc.GeminiError):
+            gc.generate_response('Q', 'ctx')
+    assert gc.QUOTA.usage()['minute'] == {'requests': 4, 'tokens': 3 * estimate + 50}
+    assert gc.QUOTA.usage()['day']['prompt_tokens'] == 3 * estimate + 50
+
+
+def test_key_goes_in_header_not_url(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'AIzaSecret')
+    monkeypatch.setattr(gc, 'KEYS', gc.KeyPool())
+    seen = {}
+
+    def fake_post(url, data=None, headers=None, timeout=None):
+        seen['url'], seen['headers'] = url, headers
+        return _ok_resp()
+
+    monkeypatch.setattr(gc.requests, 'post', fake_post)
+    gc.generate_response('Q', 'ctx')
+    assert 'AIzaSecret' not in seen['url'] and seen['url'].endswith(':generateContent')
+    assert seen['headers']['x-goog-api-key'] == 'AIzaSecret'
+    gc.generate_response('Q', 'ctx', api_key='explicit')
+    assert seen['headers']['x-goog-api-key'] == 'explicit'
+    assert gc.KEYS.snapshot()['key1']['calls'] == 1  # an explicit key bypasses the pool
+
+    monkeypatch.delenv('GEMINI_API_KEY')
+    with pytest.raises(ValueError):
+        gc.generate_response('Q', 'ctx')
+    with pytest.raises(ValueError):
+        gc.generate_response('Q', 'ctx', api_key=123)
+
+
+def test_rate_limited_key_is_cooled_and_call_retried(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEYS', 'key-a, key-b')
+    monkeypatch.setattr(gc, 'KEYS', gc.KeyPool(cooldown=30))
+    sent = []
+
+    def fake_post(url, data=None, headers=None, timeout=None):
+        sent.append(headers['x-goog-api-key'])
+        if headers['x-goog-api-key'] == 'key-a':
+            return DummyResp(ok=False, status=429, data={'error': {'message': 'quota for key-a exhausted'}})
+        return _ok_resp()
+
+    monkeypatch.setattr(gc.requests, 'post', fake_post)
+    assert gc.generate_response('Q', 'ctx') == 'ok'
+    assert gc.generate_response('Q', 'ctx') == 'ok'
+    assert sent == ['key-a', 'key-b', 'key-b']  # key-a is cooling after its 429
+    snap = gc.KEYS.snapshot()
+    assert snap['key1']['rate_limited'] == 1 and snap['key1']['cooling_for'] > 0
+    assert snap['key2']['calls'] == 2 and snap['key2']['in_flight'] == 0
+
+
+def test_all_keys_rate_limited(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEYS', 'key-a,key-b')
+    monkeypatch.setattr(gc, 'KEYS', gc.KeyPool(cooldown=30))
+    sent = []
+
+    def fake_post(url, data=None, headers=None, timeout=None):
+        sent.append(headers['x-goog-api-key'])
+        return DummyResp(ok=False, status=429, data={'error': {'message': f"{headers['x-goog-api-key']} over quota"}})
+
+    monkeypatch.setattr(gc.requests, 'post', fake_post)
+    # The last key's 429 is an upstream error, with no key value in the message
+    with pytest.raises(gc.GeminiError) as e:
+        gc.generate_response('Q', 'ctx')
+    assert 'key-' not in str(e.value) and '<key2> over quota' in str(e.value)
+    # Every key cooling: nothing is sent until the first one is back
+    with pytest.raises(gc.KeysRateLimited) as e:
+        gc.generate_response('Q', 'ctx')
+    assert 0 < e.value.retry_after <= 30
+    assert sent == ['key-a', 'key-b']
+
+
+def test_retry_delay_from_429_response():
+    resp = DummyResp(ok=False, status=429, data={})
+    resp.headers = {'Retry-After': '3'}
+    assert gc._retry_delay(resp) == 3.0
+    retry_info = {'error': {'details': [
+        {'@type': 'type.googleapis.com/google.rpc.QuotaFailure'},
+        {'@type': 'type.googleapis.com/google.rpc.RetryInfo', 'retryDelay': '37s'},
+    ]}}
+    assert gc._retry_delay(DummyResp(ok=False, status=429, data=retry_info)) == 37.0
+    assert gc._retry_delay(DummyResp(ok=False, status=429, data={'error': {'details': []}})) is None
+    assert gc._retry_delay(DummyResp(ok=False, status=429, data=ValueError('not json'))) is None
+
+
+def test_retry_stops_at_deadline(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEYS', 'key-a,key-b')
+    monkeypatch.setattr(gc, 'KEYS', gc.KeyPool())
+    deadline = time.monotonic() + 0.05
+
+    def fake_post(url, data=None, headers=None, timeout=None):
+        time.sleep(0.06)
+        return DummyResp(ok=False, status=429, data={})
+
+    monkeypatch.setattr(gc.requests, 'post', fake_post)
+    with pytest.raises(gc.DeadlineExceeded):
+        gc.generate_response('Q', 'ctx', deadline=deadline)
+
+
+def test_request_errors_never_show_the_key(monkeypatch):
+    monkeypatch.setenv('GEMINI_API_KEY', 'AIzaSecret')
+    monkeypatch.setattr(gc, 'KEYS', gc.KeyPool())
+
+    def fake_post(url, data=None, headers=None, timeout=None):
+        raise gc.requests.ConnectionError(f"failed sending {headers['x-goog-api-key']}")
+
+    monkeypatch.setattr(gc.requests, 'post', fake_post)
+    with pytest.raises(gc.GeminiError) as e:
+        gc.generate_response('Q', 'ctx')
+    assert 'AIzaSecret' not in str(e.value) and '<key1>' in str(e.value)
+    with pytest.raises(gc.GeminiError) as e:
+        gc.generate_response('Q', 'ctx', api_key='explicit-secret')
+    assert 'explicit-secret' not in str(e.value) and '<api key>' in str(e.value)
@@ -0,0 +1,101 @@
+import pytest
+
+from api.keys import KeyPool, KeysCooling, parse_keys
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_parse_keys_splits_and_dedupes():
+    assert parse_keys(' a, b\nc ,a,, ') == ('a', 'b', 'c')
+    assert parse_keys('') == ()
+    assert parse_keys(None) == ()
+
+
+def test_empty_pool_is_not_configured():
+    pool = KeyPool()
+    assert len(pool) == 0
+    with pytest.raises(ValueError):
+        pool.acquire()
+
+
+def test_acquire_prefers_fewest_in_flight_then_fewest_recent_calls():
+    clock = FakeClock()
+    pool = KeyPool(['a', 'b', 'c'], clock=clock)
+    first, second, third = pool.acquire(), pool.acquire(), pool.acquire()
+    assert [first.value, second.value, third.value] == ['a', 'b', 'c']
+    pool.release(second)
+    assert pool.acquire().value == 'b'  # only key with nothing in flight
+    for handle in (first, second, third):
+        pool.release(handle)
+    # All idle; 'a' and 'c' made one call in the last minute, 'b' two
+    assert pool.acquire().value == 'a'
+
+
+def test_recent_calls_expire_after_a_minute():
+    clock = FakeClock()
+    pool = KeyPool(['a', 'b'], clock=clock)
+    pool.release(pool.acquire())
+    handle = pool.acquire()
+    assert handle.value == 'b'
+    pool.release(handle)
+    pool.release(pool.acquire())  # 'a' again: both have one call, 'a' comes first
+    clock.now += 61
+    assert pool.snapshot()['key1']['calls'] == 2
+    assert pool.acquire().value == 'a'  # 'b' would win if the old calls still counted
+
+
+def test_rate_limited_key_cools_down():
+    clock = FakeClock()
+    pool = KeyPool(['a', 'b'], cooldown=30, clock=clock)
+    pool.release(pool.acquire(), rate_limited=True)
+    for _ in range(3):
+        handle = pool.acquire()
+        assert handle.value == 'b'
+        pool.release(handle)
+    clock.now += 10
+    pool.release(pool.acquire(), rate_limited=True)
+    clock.now += 5
+    with pytest.raises(KeysCooling) as e:
+        pool.acquire()
+    assert e.value.retry_after == pytest.approx(15)  # until 'a' is back
+    assert 'retry in 15.0s' in str(e.value)
+    clock.now += 15
+    assert pool.acquire().value == 'a'
+    snap = pool.snapshot()
+    assert snap['key1']['rate_limited'] == 1 and snap['key2']['rate_limited'] == 1
+    assert snap['key2']['cooling_for'] == pytest.approx(10)
+
+
+def test_cooldown_follows_retry_hint_up_to_the_cap():
+    clock = FakeClock()
+    pool = KeyPool(['a', 'b', 'c'], cooldown=10, clock=clock)
+    pool.release(pool.acquire(), rate_limited=True, retry_after=2)
+    pool.release(pool.acquire(), rate_limited=True, retry_after=37)
+    pool.release(pool.acquire(), rate_limited=True, retry_after=-1)
+    snap = pool.snapshot()
+    assert [snap[k]['cooling_for'] for k in ('key1', 'key2', 'key3')] == [2, 10, 0]
+
+
+def test_update_keeps_state_of_remaining_keys():
+    pool = KeyPool(['a', 'b'])
+    pool.release(pool.acquire(), rate_limited=True)
+    before = pool._keys
+    pool.update(['a', 'b'])
+    assert pool._keys is before
+    pool.update(['c', 'a'])
+    assert len(pool) == 2
+    snap = pool.snapshot()
+    assert snap['key2']['rate_limited'] == 1 and snap['key1']['calls'] == 0
+
+
+def test_redact_and_snapshot_never_expose_key_values():
+    pool = KeyPool(['AIzaSecretOne', 'AIzaSecretTwo'])
+    text = 'url?key=AIzaSecretOne failed, tried AIzaSecretTwo'
+    assert pool.redact(text) == 'url?key=<key1> failed, tried <key2>'
+    assert 'AIza' not in repr(pool.snapshot())
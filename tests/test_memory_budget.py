@@ -0,0 +1,190 @@
+"""
+Allocation and memory budgets for the request path.
+
+Requests go through a real PortfolioHTTPRequestHandler over loopback and the
+real generate_response, with Gemini stubbed at the `requests` transport
+adapter so no network call is made. The client is a raw socket reading into a
+reused buffer, so almost everything tracemalloc sees is the server's work.
+
+Budgets are roughly twice today's measurements (Python 3.11). If a change
+legitimately needs more, raise the budget in the same commit and say why.
+"""
+
+import gc
+import json
+import os
+import socket
+import threading
+import time
+import tracemalloc
+
+import pytest
+import requests
+
+import server as srv
+from api import gemini_client
+from api.quota import DAY, QuotaScheduler
+from api.similarity import SimilarityCache
+
+# Median peak bytes allocated while serving one request, per route
+PEAK_BUDGETS = {
+    'static': ('GET', '/favicon.svg', None, 160 * 1024),
+    'page': ('GET', '/', None, 200 * 1024),
+    'metrics': ('GET', '/api/metrics', None, 48 * 1024),
+    'chat_post': ('POST', '/api/chat', {'question': 'What are his skills?'}, 96 * 1024),
+    'chat_get': ('GET', '/api/chat?q=skills', None, 96 * 1024),
+}
+# Traced memory still held after many requests, once bounded caches are full
+RETAINED_BUDGET = 32 * 1024
+# Resident set growth over a long run without tracemalloc
+RSS_BUDGET = 8 * 1024 * 1024
+
+STUB_BODY = json.dumps({
+    "candidates": [{"content": {"parts": [{"text": "Stub answer."}]}}],
+    "usageMetadata": {"promptTokenCount": 5000, "candidatesTokenCount": 20},
+}).encode('utf-8')
+
+
+def stub_send(adapter, request, **kwargs):
+    resp = requests.Response()
+    resp.status_code = 200
+    resp._content = STUB_BODY
+    resp.headers['Content-Type'] = 'application/json'
+    resp.url = request.url
+    resp.request = request
+    return resp
+
+
+class Client:
+    """Minimal HTTP client whose own allocations stay out of the measurements."""
+
+    def __init__(self, port):
+        self.port = port
+        self.buffer = bytearray(64 * 1024)
+
+    def request(self, method, path, body=None):
+        payload = b''
+        head = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            head += f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+        status = None
+        with socket.create_connection(('127.0.0.1', self.port)) as sock:
+            sock.sendall(head.encode('ascii') + b"\r\n" + payload)
+            # The server closes the connection once the handler has finished
+            while True:
+                n = sock.recv_into(self.buffer)
+                if not n:
+                    break
+                if status is None:
+                    status = int(self.buffer[9:12])
+        return status
+
+
+@pytest.fixture(scope='module')
+def client():
+    clock_offset = [0.0]
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('GEMINI_API_KEY', 'budget-key')
+        mp.setattr(requests.adapters.HTTPAdapter, 'send', stub_send)
+        mp.setattr(srv, 'STATE', srv.StateManager())
+        mp.setattr(srv, 'METRICS', srv.Metrics())
+        mp.setattr(srv, 'SESSIONS', srv.SessionStore(max_sessions=16))
+        mp.setattr(srv, 'SIMILAR', SimilarityCache(max_entries=16))
+        mp.setattr(srv, 'ANSWER_CACHE', None)
+        # The quota window keeps a minute of calls by design; the tests move
+        # this clock forward to let them age out, as a long-running server would
+        mp.setattr(gemini_client, 'QUOTA', QuotaScheduler(clock=lambda: time.monotonic() + clock_offset[0]))
+        httpd = srv.ReuseAddrTCPServer(('127.0.0.1', 0), srv.PortfolioHTTPRequestHandler)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        c = Client(httpd.socket.getsockname()[1])
+        c.clock_offset = clock_offset
+        for method, path, body, _ in PEAK_BUDGETS.values():
+            assert c.request(method, path, body) == 200
+        try:
+            yield c
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            thread.join(timeout=1)
+
+
+def mixed_requests(client, rounds, start=0):
+    """Every route, with new chat questions so the bounded caches keep evicting."""
+    for i in range(start, start + rounds):
+        for method, path, body, _ in PEAK_BUDGETS.values():
+            if body is not None:
+                body = {'question': f'What did he build in project {i}?'}
+            elif path.startswith('/api/chat'):
+                path = f'/api/chat?q=project+{i}'
+            assert client.request(method, path, body) == 200
+
+
+def settle(client):
+    """Let the quota window age out and collect reference cycles before measuring."""
+    client.clock_offset[0] += DAY + 60
+    assert client.request('POST', '/api/chat', {'question': 'Where is he based?'}) == 200
+    gc.collect()
+
+
+@pytest.fixture
+def traced():
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize('route', list(PEAK_BUDGETS))
+def test_peak_memory_per_request_within_budget(client, traced, route):
+    method, path, body, budget = PEAK_BUDGETS[route]
+    peaks = []
+    for _ in range(15):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        assert client.request(method, path, body) == 200
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    peak = sorted(peaks)[len(peaks) // 2]
+    assert peak <= budget, f"{route}: {peak} bytes peak per request (budget {budget})"
+
+
+def retained_snapshot():
+    # pytest-cov keeps state for every thread it has traced; that is not ours
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '*/coverage/*'),
+    ])
+
+
+def test_retained_memory_stays_flat(client, traced):
+    # Enough distinct URLs to fill the stdlib's own bounded caches (urlsplit keeps 128)
+    mixed_requests(client, 200)
+    settle(client)
+    before = retained_snapshot()
+
+    mixed_requests(client, 200, start=200)
+    settle(client)
+    after = retained_snapshot()
+    growth = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    if growth > RETAINED_BUDGET:
+        top = after.compare_to(before, 'lineno')[:5]
+        pytest.fail(f"retained {growth} bytes over 1000 requests (budget {RETAINED_BUDGET}):\n"
+                    + "\n".join(str(stat) for stat in top))
+
+
+def _rss_bytes():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/statm'), reason='needs /proc to read RSS')
+def test_rss_stays_flat_over_long_run(client):
+    mixed_requests(client, 100, start=400)
+    settle(client)
+    before = _rss_bytes()
+    mixed_requests(client, 400, start=500)
+    settle(client)
+    growth = _rss_bytes() - before
+    assert growth <= RSS_BUDGET, f"RSS grew {growth} bytes over 2000 requests (budget {RSS_BUDGET})"
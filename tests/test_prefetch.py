@@ -0,0 +1,129 @@
+import threading
+
+from api.context import compile_matchers
+from api.prefetch import Prefetcher, TransitionTable, classify, follow_up_questions
+
+KNOWLEDGE = {
+    'greeting': {'pattern': '^(hi|hello)'},
+    'experience': {'keywords': ['experience', 'meta'], 'follow_up': "What's his experience at Meta?"},
+    'projects': {'keywords': ['projects'], 'follow_up': 'Tell me about his projects'},
+    'contact': {'keywords': ['contact', 'email'], 'follow_up': 'How can I contact him?'},
+    'education': {'keywords': ['education'], 'follow_up': 'Where did he study?'},
+    'default': {'response': 'Ask me anything.'},
+}
+MATCHERS = compile_matchers(KNOWLEDGE)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_classify_and_follow_up_questions():
+    assert classify('Hello there', MATCHERS) == 'greeting'
+    assert classify('Any PROJECTS at Meta?', MATCHERS) == 'experience'
+    assert classify('Favourite colour?', MATCHERS) is None
+    assert follow_up_questions(KNOWLEDGE, MATCHERS) == {
+        'experience': "What's his experience at Meta?",
+        'projects': 'Tell me about his projects',
+        'contact': 'How can I contact him?',
+        'education': 'Where did he study?',
+    }
+
+
+def test_transition_table_seeded_then_learned():
+    table = TransitionTable()
+    candidates = ['experience', 'projects', 'contact', 'education']
+    # Seed weights only: ties keep knowledge order, never the current category
+    assert table.predict('experience', candidates, 2) == ['projects', 'contact']
+    table.observe('experience', 'contact')
+    table.observe('experience', 'education')
+    table.observe('experience', 'education')
+    assert table.predict('experience', candidates, 2) == ['education', 'contact']
+    assert table.snapshot() == {'experience': {'contact': 1, 'education': 2}}
+
+
+def make_prefetcher(calls, **kw):
+    def generate(question, turns, context_text):
+        calls.append((question, turns, context_text))
+        if question == 'boom':
+            raise RuntimeError('upstream down')
+        return f'answer to {question}'
+
+    events = []
+    prefetcher = Prefetcher(generate, on_event=events.append, **kw)
+    return prefetcher, events
+
+
+def test_suggest_learns_from_turns_and_skips_asked_questions():
+    prefetcher, _ = make_prefetcher([])
+    turns = [{'role': 'user', 'text': 'Tell me about his projects'}, {'role': 'assistant', 'text': 'Many.'}]
+    # projects -> experience observed; the projects follow-up was already asked
+    assert prefetcher.suggest('What experience does he have?', turns, KNOWLEDGE, MATCHERS) == [
+        'How can I contact him?', 'Where did he study?']
+    assert prefetcher.table.snapshot() == {'projects': {'experience': 1}}
+    assert prefetcher.suggest('Favourite colour?', [], KNOWLEDGE, MATCHERS) == []
+
+
+def test_prefetched_answer_is_served_once_for_the_exact_turn():
+    calls = []
+    prefetcher, events = make_prefetcher(calls)
+    turns = [{'role': 'user', 'text': 'experience'}, {'role': 'assistant', 'text': 'Meta.'}]
+    prefetcher.prefetch(['Tell me about his projects'], turns, 'ctx', 'h')
+    prefetcher.prefetch(['Tell me about his projects'], turns, 'ctx', 'h')  # already pending or stored
+    prefetcher.flush()
+    assert calls == [('Tell me about his projects', turns, 'ctx')]
+
+    assert prefetcher.take('Tell me about his projects', 'h', []) is None
+    assert prefetcher.take('tell me about his projects!', 'h', turns) == 'answer to Tell me about his projects'
+    assert prefetcher.take('Tell me about his projects', 'h', turns) is None
+    assert events == ['issued', 'hits']
+    prefetcher.close()
+
+
+def test_budget_failures_expiry_and_bound():
+    calls = []
+    clock = Clock()
+    prefetcher, events = make_prefetcher(calls, budget=2, ttl=10, max_entries=1, clock=clock)
+    prefetcher.prefetch(['a', 'boom', 'c'], [], 'ctx', 'h')
+    prefetcher.flush()
+    assert events == ['issued', 'issued', 'budget_skipped', 'failed']
+
+    clock.now += 61  # the minute's budget frees up
+    prefetcher.prefetch(['c', 'd'], [], 'ctx', 'h')
+    prefetcher.flush()
+    assert prefetcher.take('a', 'h', []) is None  # evicted by the bound
+    assert prefetcher.take('c', 'h', []) is None
+    clock.now += 11
+    assert prefetcher.take('d', 'h', []) is None  # expired
+    assert events.count('hits') == 0
+    prefetcher.close()
+
+
+def test_flush_gives_up_after_timeout():
+    release = threading.Event()
+    prefetcher = Prefetcher(lambda q, t, c: release.wait(5) and 'late')
+    prefetcher.prefetch(['slow'], [], 'ctx', 'h')
+    prefetcher.flush(timeout=0.05)
+    assert prefetcher.take('slow', 'h', []) is None
+    release.set()
+    prefetcher.flush()
+    assert prefetcher.take('slow', 'h', []) == 'late'
+    prefetcher.close()
+
+
+def test_events_are_optional():
+    prefetcher = Prefetcher(lambda q, t, c: 'x', budget=0)
+    prefetcher.prefetch(['a'], [], 'ctx', 'h')
+    assert prefetcher.take('a', 'h', []) is None
+    prefetcher.close()
+
+
+def test_greeting_suggests_the_seeded_topics():
+    prefetcher = Prefetcher(lambda q, t, c: 'x')
+    assert prefetcher.suggest('hello', [], KNOWLEDGE, MATCHERS) == [
+        "What's his experience at Meta?", 'Tell me about his projects']
+    prefetcher.close()
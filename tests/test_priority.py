@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from api.priority import BATCH, INTERACTIVE, PREFETCH, PriorityScheduler, SchedulerCancelled, SchedulerTimeout
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def queue_up(scheduler, priority, order):
+    """Start a caller that records when it gets a slot, and wait until it is queued."""
+    queued = len(scheduler._waiting)
+
+    def run():
+        with scheduler.slot(priority):
+            order.append(priority)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    while len(scheduler._waiting) == queued:
+        time.sleep(0.001)
+    return thread
+
+
+def test_unlimited_scheduler_never_waits_but_records():
+    seen = []
+    scheduler = PriorityScheduler(limit=0, on_wait=lambda p, s: seen.append((p, s)))
+    with scheduler.slot(BATCH), scheduler.slot(INTERACTIVE):
+        assert scheduler.snapshot()['in_flight'] == 2
+    assert seen == [(BATCH, 0.0), (INTERACTIVE, 0.0)]
+    snap = scheduler.snapshot()
+    assert snap['in_flight'] == 0
+    assert snap['wait'][BATCH] == {'count': 1, 'avg': 0.0, 'max': 0.0}
+    with pytest.raises(ValueError):
+        scheduler.acquire('urgent')
+
+
+def test_interactive_calls_jump_queued_background_work():
+    scheduler = PriorityScheduler(limit=1, aging=0)
+    order = []
+    scheduler.acquire(INTERACTIVE)
+    threads = [queue_up(scheduler, p, order) for p in (BATCH, PREFETCH, INTERACTIVE)]
+    assert scheduler.snapshot()['waiting'] == {'interactive': 1, 'refresh': 0, 'prefetch': 1, 'batch': 1}
+    scheduler.release()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == [INTERACTIVE, PREFETCH, BATCH]
+    wait = scheduler.snapshot()['wait']
+    assert wait[BATCH]['max'] >= wait[INTERACTIVE]['max'] > 0
+
+
+def test_aging_lets_long_waiting_work_through():
+    clock = Clock()
+    scheduler = PriorityScheduler(limit=1, aging=5.0, clock=clock)
+    order = []
+    scheduler.acquire(INTERACTIVE)
+    threads = [queue_up(scheduler, BATCH, order)]
+    clock.now += 20  # four classes' worth of waiting: now ahead of a fresh interactive call
+    threads.append(queue_up(scheduler, INTERACTIVE, order))
+    scheduler.release()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == [BATCH, INTERACTIVE]
+    assert scheduler.snapshot()['wait'][BATCH]['avg'] == 20
+
+
+def test_deadline_gives_up_waiting():
+    scheduler = PriorityScheduler(limit=1)
+    scheduler.acquire(INTERACTIVE)
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire(PREFETCH, deadline=time.monotonic() + 0.05)
+    assert scheduler.snapshot()['waiting'][PREFETCH] == 0
+    scheduler.release()
+    scheduler.acquire(PREFETCH, deadline=time.monotonic() + 0.05)
+
+
+def test_cancel_stops_waiting():
+    scheduler = PriorityScheduler(limit=1)
+    scheduler.acquire(INTERACTIVE)
+    polls = []
+    start = time.monotonic()
+    with pytest.raises(SchedulerCancelled):
+        scheduler.acquire(PREFETCH, should_cancel=lambda: polls.append(1) or len(polls) >= 3)
+    assert time.monotonic() - start < 1.0
+    with pytest.raises(SchedulerCancelled):
+        scheduler.acquire(PREFETCH, deadline=time.monotonic() + 5, should_cancel=lambda: True)
+    assert scheduler.snapshot()['waiting'][PREFETCH] == 0
+    assert scheduler.snapshot()['in_flight'] == 1
@@ -0,0 +1,88 @@
+import threading
+import time
+import tracemalloc
+
+import pytest
+
+from api import profiling
+from api.profiling import MemoryTracker, RequestProfiler
+
+
+def busy_work(n=20000):
+    return sum(i * i for i in range(n))
+
+
+def test_profiles_next_n_requests_only():
+    profiler = RequestProfiler()
+    assert profiler.profile(busy_work, 10) == busy_work(10)  # inactive: plain call
+    assert profiler.start(requests=2)
+    assert not profiler.start(requests=5)  # one run at a time
+    for _ in range(3):
+        profiler.profile(busy_work)
+    report = profiler.finish(timeout=1, sort='tottime', limit=5)
+    assert report.startswith('Profiled 2 request(s), skipped 0')
+    assert 'busy_work' in report
+    assert not profiler.active
+
+
+def test_time_window_and_timeout():
+    profiler = RequestProfiler()
+    profiler.start(seconds=0.2)
+    threading.Thread(target=profiler.profile, args=(busy_work,)).start()
+    start = time.monotonic()
+    report = profiler.finish(timeout=5, sort='bogus')
+    assert 0.1 < time.monotonic() - start < 2
+    assert 'Profiled 1 request(s)' in report
+    assert profiler.profile(busy_work, 10) == busy_work(10)  # window over
+
+    # Fewer requests than asked for: the timeout ends the run with an empty report
+    profiler.start(requests=3)
+    assert profiler.finish(timeout=0.05) == 'Profiled 0 request(s), skipped 0\n'
+
+
+def test_window_expiry_stops_claims():
+    now = [0.0]
+    profiler = RequestProfiler(clock=lambda: now[0])
+    profiler.start(seconds=1)
+    now[0] = 2.0
+    assert profiler.profile(busy_work, 10) == busy_work(10)
+    assert profiler.profiled == 0
+
+
+def test_overlapping_profiler_is_skipped(monkeypatch):
+    class Busy:
+        def enable(self):
+            raise ValueError('Another profiling tool is already active')
+
+    monkeypatch.setattr(profiling.cProfile, 'Profile', Busy)
+    profiler = RequestProfiler()
+    profiler.start(requests=1)
+    assert profiler.profile(busy_work, 10) == busy_work(10)
+    assert 'skipped 1' in profiler.finish(timeout=1)
+
+
+def test_memory_tracker_reports_growth_in_repo_code():
+    tracker = MemoryTracker()
+    with pytest.raises(RuntimeError):
+        tracker.diff()
+    assert tracker.start()['tracing']
+    hoard = [bytearray(1024) for _ in range(200)]  # noqa: F841 - kept alive for the diff
+    report = tracker.diff(limit=5)
+    assert report['since'] == 'last'
+    assert report['top'][0]['where'].startswith('tests/test_profiling.py:')
+    assert report['top'][0]['size_diff'] > 200 * 1024
+    # Nothing new since the previous diff; since=start still sees the growth
+    assert tracker.diff(limit=5)['top'][0]['size_diff'] < 200 * 1024
+    assert tracker.diff(since='start', everything=True)['top']
+    assert tracker.stop()['traced_bytes'] > 0
+    assert not tracemalloc.is_tracing()
+
+
+def test_finish_waits_for_requests_in_flight():
+    profiler = RequestProfiler()
+    profiler.start(seconds=0.05)
+    worker = threading.Thread(target=profiler.profile, args=(time.sleep, 0.3))
+    worker.start()
+    report = profiler.finish(timeout=5)
+    worker.join()
+    assert 'Profiled 1 request(s)' in report
@@ -0,0 +1,128 @@
+import threading
+import time
+
+import pytest
+
+from api import quota
+from api.quota import QuotaCancelled, QuotaExceeded, QuotaScheduler
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_unlimited_scheduler_only_records_usage():
+    seen = []
+    clock = Clock()
+    q = QuotaScheduler(clock=clock, on_record=seen.append)
+    for _ in range(3):
+        q.record(q.acquire(100), prompt_tokens=40, output_tokens=10)
+    assert q.usage() == {
+        'limits': {'rpm': 0, 'tpm': 0},
+        'minute': {'requests': 3, 'tokens': 150},
+        'day': {'requests': 3, 'prompt_tokens': 120, 'output_tokens': 30},
+    }
+    assert seen[-1] == {'prompt_tokens': 40, 'output_tokens': 10}
+
+    clock.now += 61  # out of the minute window, still in today's totals
+    usage = q.usage()
+    assert usage['minute'] == {'requests': 0, 'tokens': 0}
+    assert usage['day']['requests'] == 3
+    clock.now += 24 * 60 * 60
+    assert q.usage()['day'] == {'requests': 0, 'prompt_tokens': 0, 'output_tokens': 0}
+
+
+def test_record_without_counts_keeps_the_estimate():
+    seen = []
+    q = QuotaScheduler(tpm=1000, max_wait=0, clock=Clock(), on_record=seen.append)
+    q.record(q.acquire(900))
+    with pytest.raises(QuotaExceeded):
+        q.acquire(200)
+    assert q.usage()['day'] == {'requests': 1, 'prompt_tokens': 900, 'output_tokens': 0}
+    assert seen == [{'prompt_tokens': 900, 'output_tokens': 0}]
+
+
+def test_rpm_budget_refuses_beyond_max_wait():
+    clock = Clock()
+    q = QuotaScheduler(rpm=2, max_wait=5, clock=clock)
+    q.acquire(1)
+    clock.now += 10
+    q.acquire(1)
+    with pytest.raises(QuotaExceeded) as e:
+        q.acquire(1)
+    assert e.value.retry_after == pytest.approx(50)  # the first call leaves the window at +60s
+
+
+def test_tpm_budget_uses_reported_tokens():
+    clock = Clock()
+    q = QuotaScheduler(tpm=1000, max_wait=0, clock=clock)
+    ticket = q.acquire(900)  # estimate
+    with pytest.raises(QuotaExceeded):
+        q.acquire(200)
+    q.record(ticket, prompt_tokens=300, output_tokens=100)  # actual usage was lower
+    q.acquire(500)
+    # Calls bigger than the whole budget wait for an empty window
+    with pytest.raises(QuotaExceeded) as e:
+        q.acquire(5000)
+    assert e.value.retry_after == pytest.approx(60)
+    clock.now += 60
+    q.acquire(5000)
+
+
+def test_deadline_caps_the_wait():
+    clock = Clock()
+    q = QuotaScheduler(rpm=1, max_wait=100, clock=clock)
+    q.acquire(1)
+    with pytest.raises(QuotaExceeded):
+        q.acquire(1, deadline=clock.now + 10)
+
+
+def test_cancel_stops_waiting_for_budget():
+    q = QuotaScheduler(rpm=1, max_wait=100)
+    q.acquire(1)
+    polls = []
+    start = time.monotonic()
+    with pytest.raises(QuotaCancelled):
+        q.acquire(1, should_cancel=lambda: polls.append(1) or len(polls) >= 3)
+    assert time.monotonic() - start < 1.0
+    assert q.usage()['minute']['requests'] == 1
+
+
+def test_waits_for_budget_instead_of_failing(monkeypatch):
+    monkeypatch.setattr(quota, 'WINDOW', 0.2)
+    q = QuotaScheduler(rpm=1, max_wait=2)
+    q.acquire(1)
+    start = time.monotonic()
+    q.acquire(1)
+    assert 0.1 < time.monotonic() - start < 1.5
+
+
+def test_record_wakes_waiting_callers(monkeypatch):
+    monkeypatch.setattr(quota, 'WINDOW', 3)
+    q = QuotaScheduler(tpm=100, max_wait=5)
+    ticket = q.acquire(100)
+    done = []
+    start = time.monotonic()
+    waiter = threading.Thread(target=lambda: done.append(q.acquire(50)))
+    waiter.start()
+    time.sleep(0.1)
+    assert not done
+    q.record(ticket, prompt_tokens=20, output_tokens=10)
+    waiter.join(timeout=5)
+    # Woken by the lower actual usage, well before the first call left the window
+    assert done and time.monotonic() - start < 1.5
+
+
+def test_split_shares_budgets_between_workers():
+    q = QuotaScheduler(rpm=10, tpm=0)
+    q.split(1)
+    assert (q.rpm, q.tpm) == (10, 0)
+    q.split(4)
+    assert (q.rpm, q.tpm) == (2, 0)
+    q = QuotaScheduler(rpm=1, tpm=3)
+    q.split(4)
+    assert (q.rpm, q.tpm) == (1, 1)
@@ -0,0 +1,135 @@
+import http.server
+import importlib.util
+import json
+import os
+import random
+import threading
+
+import pytest
+
+spec = importlib.util.spec_from_file_location(
+    'replay_access_log',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'scripts', 'replay_access_log.py'),
+)
+replay = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(replay)
+
+LOG = """\
+🚀 Starting portfolio server on http://0.0.0.0:5000
+127.0.0.1 - - [19/Oct/2026 03:55:17] "GET / HTTP/1.1" 200 -
+127.0.0.1 - - [19/Oct/2026 03:55:17] "GET /styles.css HTTP/1.1" 200 -
+Traceback (most recent call last):
+127.0.0.1 - - [19/Oct/2026 03:55:19] "POST /api/chat HTTP/1.1" 200 -
+127.0.0.1 - - [31/Foo/2026 03:55:19] "GET /bad-date HTTP/1.1" 200 -
+"""
+
+
+def test_parse_classic_log_spreads_requests_within_a_second():
+    logged = replay.parse_log(LOG.splitlines())
+    assert [(r.method, r.path) for r in logged] == [('GET', '/'), ('GET', '/styles.css'), ('POST', '/api/chat')]
+    assert replay.schedule(logged, 1.0) == [(0.0, 'GET', '/'), (0.5, 'GET', '/styles.css'),
+                                            (2.0, 'POST', '/api/chat')]
+    assert [offset for offset, _, _ in replay.schedule(logged, 10.0)] == [0.0, 0.05, 0.2]
+    assert replay.schedule([], 1.0) == []
+
+
+def test_parse_json_lines():
+    lines = [
+        json.dumps({'ts': 100.25, 'method': 'get', 'path': '/'}),
+        json.dumps({'time': '1970-01-01T00:01:40Z', 'method': 'POST', 'url': '/api/chat'}),
+        json.dumps({'ts': 'yesterday', 'method': 'GET', 'path': '/x'}),
+        json.dumps({'ts': None, 'method': 'GET', 'path': '/x'}),
+        json.dumps({'ts': 1, 'method': 'GET'}),
+        json.dumps(['not', 'an', 'object']),
+        '{broken',
+        '',
+    ]
+    logged = replay.parse_log(lines)
+    assert logged == [replay.LoggedRequest(100.0, 'POST', '/api/chat'), replay.LoggedRequest(100.25, 'GET', '/')]
+
+
+@pytest.mark.parametrize('method,path,route', [
+    ('POST', '/api/chat', 'POST /api/chat'),
+    ('GET', '/api/chat?q=skills', 'GET /api/chat'),
+    ('GET', '/api/metrics', 'api'),
+    ('GET', '/', 'page'),
+    ('GET', '/classic/', 'page'),
+    ('GET', '/main.js', 'static'),
+])
+def test_route_of(method, path, route):
+    assert replay.route_of(method, path) == route
+
+
+def test_summarize_counts_errors_per_route():
+    results = [
+        replay.Result('page', 0.010, 200),
+        replay.Result('page', 0.030, 200),
+        replay.Result('POST /api/chat', 0.5, 503),
+        replay.Result('POST /api/chat', 1.0, None),
+        replay.Result('static', 0.001, 404),
+    ]
+    report = replay.summarize(results)
+    assert list(report) == ['POST /api/chat', 'page', 'static']
+    assert report['page']['count'] == 2 and report['page']['errors'] == 0
+    assert report['page']['p50'] == pytest.approx(20.0)
+    assert report['page']['max'] == pytest.approx(30.0)
+    assert report['POST /api/chat']['errors'] == 2
+    assert report['static']['client_errors'] == 1
+
+
+class RecordingHandler(http.server.BaseHTTPRequestHandler):
+    seen = []
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length', '0'))
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        RecordingHandler.seen.append((self.command, self.path, body))
+        self.send_response(500 if self.path == '/boom' else 200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def target():
+    RecordingHandler.seen = []
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RecordingHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_replay_sends_requests_with_questions(target):
+    stream = [(0.0, 'GET', '/'), (0.01, 'POST', '/api/chat'), (0.02, 'GET', '/boom')]
+    results = replay.replay(stream, target, ['Where is he based?'], rng=random.Random(1))
+    assert sorted(r.status for r in results) == [200, 200, 500]
+    assert ('POST', '/api/chat', json.dumps({'question': 'Where is he based?'})) in RecordingHandler.seen
+    assert all(r.seconds >= 0 for r in results)
+
+    results = replay.replay([(0.0, 'GET', '/')], 'http://127.0.0.1:9', ['Q'], timeout=1)
+    assert results[0].status is None
+
+
+def test_main_reports_json(tmp_path, target, capsys):
+    log = tmp_path / 'server.log'
+    log.write_text(LOG, encoding='utf-8')
+    questions = tmp_path / 'faq.json'
+    questions.write_text(json.dumps({'questions': ['Skills?']}), encoding='utf-8')
+
+    assert replay.main([str(log), '--url', target + '/', '--speed', '100', '--questions', str(questions),
+                        '--json']) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report['POST /api/chat']['count'] == 1
+    assert report['page']['count'] == 1
+
+    assert replay.main([str(log), '--url', target, '--speed', '100', '--questions', str(questions)]) == 0
+    assert 'Replayed 3 requests' in capsys.readouterr().out
+
+    empty = tmp_path / 'empty.log'
+    empty.write_text('nothing here\n', encoding='utf-8')
+    assert replay.main([str(empty), '--url', target]) == 1
@@ -0,0 +1,55 @@
+from api.gemini_client import ClientConfig
+from api.router import COMPLEX, SIMPLE, ModelRouter, classify
+
+CONFIG = ClientConfig('full', 'http://upstream.test', fast_model='fast')
+
+
+class Clock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_classify():
+    assert classify('Where is he based?') == SIMPLE
+    assert classify('What is his email?', [{'role': 'user', 'text': 'hi'}] * 2) == SIMPLE
+    assert classify('Why did he move from Meta to a startup?') == COMPLEX
+    assert classify('Compare his Spark and Flink work') == COMPLEX
+    assert classify('What ' + 'really ' * 12 + 'matters?') == COMPLEX
+    assert classify('What is his email?', [{'role': 'user', 'text': 'hi'}] * 5) == COMPLEX
+
+
+def test_routes_by_class_and_respects_single_model_config():
+    router = ModelRouter()
+    assert router.choose('Where is he based?', [], CONFIG) == 'fast'
+    assert router.choose('Explain his data platform design', [], CONFIG) == 'full'
+    assert router.choose('Where is he based?', [], CONFIG._replace(fast_model='')) == 'full'
+    assert router.choose('Where is he based?', [], CONFIG._replace(fast_model='full')) == 'full'
+
+
+def test_shifts_traffic_away_from_degraded_model_until_window_passes():
+    clock = Clock()
+    router = ModelRouter(window=60, min_samples=3, max_error_rate=0.5, max_latency=5, clock=clock)
+    for _ in range(2):
+        router.record('fast', 0.5, ok=False)
+    assert not router.degraded('fast')  # too few samples to judge
+    router.record('fast', 0.5, ok=False)
+    assert router.degraded('fast')
+    assert router.choose('Where is he based?', [], CONFIG) == 'full'
+
+    # Slow (but successful) calls also count as degraded
+    for _ in range(3):
+        router.record('full', 6.0, ok=True)
+    assert router.degraded('full')
+    # With both degraded the question stays on its preferred model
+    assert router.choose('Where is he based?', [], CONFIG) == 'fast'
+
+    snapshot = router.snapshot()
+    assert snapshot['fast'] == {'count': 3, 'error_rate': 1.0, 'avg_latency': 0.5, 'degraded': True}
+
+    clock.now += 61
+    assert not router.degraded('fast')
+    assert router.snapshot()['full'] == {'count': 0, 'error_rate': 0.0, 'avg_latency': 0.0, 'degraded': False}
+    assert router.choose('Where is he based?', [], CONFIG) == 'fast'
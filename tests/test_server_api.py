@@ -1,3 +1,4 @@
+import json
 import os
 import threading
 import time
@@ -7,6 +8,13 @@ import pytest
 import requests
 
 import server as srv
+from api.similarity import SimilarityCache
+
+
+@pytest.fixture(autouse=True)
+def no_similarity_cache(monkeypatch):
+    # Tests that ask the same question twice expect two upstream calls
+    monkeypatch.setattr(srv, 'SIMILAR', None)
 
 
 @contextmanager
@@ -44,7 +52,7 @@ def test_chat_missing_question(monkeypatch):
 
 def test_chat_success(monkeypatch):
     # Monkeypatch the generate_response to avoid network
-    def fake_generate_response(q, context_text):
+    def fake_generate_response(q, context_text, **kwargs):
         assert 'Ramachandra' in context_text or 'Ramachandra' in q
         return 'Hello! I am a test reply.'
 
@@ -61,7 +69,7 @@ def test_chat_upstream_error(monkeypatch):
     class FakeErr(Exception):
         pass
 
-    def fake_generate_response(q, context_text):
+    def fake_generate_response(q, context_text, **kwargs):
         raise srv.GeminiError('upstream failed')
 
     monkeypatch.setattr(srv, 'generate_response', fake_generate_response)
@@ -73,7 +81,7 @@ def test_chat_upstream_error(monkeypatch):
 
 
 def test_chat_config_error(monkeypatch):
-    def fake_generate_response(q, context_text):
+    def fake_generate_response(q, context_text, **kwargs):
         raise ValueError('Gemini API key not configured')
 
     monkeypatch.setattr(srv, 'generate_response', fake_generate_response)
@@ -128,8 +136,1032 @@ def test_chat_context_load_failure(monkeypatch):
     def boom(*a, **k):
         raise OSError('nope')
     monkeypatch.setattr(builtins, 'open', boom)
-    monkeypatch.setattr(srv, 'generate_response', lambda q, context_text: 'ok')
+    monkeypatch.setattr(srv, 'generate_response', lambda q, context_text, **kwargs: 'ok')
     with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
         r = requests.post(base + '/api/chat', json={'question': 'Q'})
         assert r.status_code == 200
         assert r.json()['reply'] == 'ok'
+
+
+def test_hashed_assets_cached_immutably(tmp_path):
+    import functools
+    (tmp_path / 'main.0123456789.js').write_text('x', encoding='utf-8')
+    (tmp_path / 'main.js').write_text('x', encoding='utf-8')
+    handler = functools.partial(srv.PortfolioHTTPRequestHandler, directory=str(tmp_path))
+    with run_server_in_thread(handler) as base:
+        r = requests.get(base + '/main.0123456789.js')
+        assert r.status_code == 200
+        assert 'immutable' in r.headers['Cache-Control']
+
+        r = requests.get(base + '/main.js')
+        assert 'no-store' in r.headers['Cache-Control']
+
+        r = requests.get(base + '/missing.abcdef0123.js')
+        assert r.status_code == 404
+        assert 'no-store' in r.headers['Cache-Control']
+
+
+def test_metrics_snapshot_and_merge():
+    m = srv.Metrics()
+    m.incr('a')
+    m.incr('a', 2)
+    m.observe('t', 0.5)
+    m.observe('t', 0.1)
+    snap = m.snapshot()
+    assert snap['counters'] == {'a': 3}
+    assert snap['timings']['t']['count'] == 2
+    assert snap['timings']['t']['max'] == 0.5
+
+    merged = srv.merge_snapshots([snap, {'counters': {'a': 1, 'b': 1}, 'timings': {'t': {'count': 1, 'total': 2.0, 'max': 2.0}}}])
+    assert merged['counters'] == {'a': 4, 'b': 1}
+    assert merged['timings']['t'] == {'count': 3, 'total': 2.6, 'max': 2.0}
+
+
+def test_metrics_endpoint_counts_requests(monkeypatch):
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    import socket
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        requests.get(base + '/')
+        requests.post(base + '/api/chat', data='{}')
+        requests.post(base + '/api/other', json={})
+        requests.get(base + '/api/metrics')
+        # Rejected before parse_request() sets a path
+        with socket.create_connection(base[len('http://'):].split(':')) as sock:
+            sock.sendall(b'GET / HTTP/x.y\r\n\r\n')
+            assert b'400' in sock.makefile('rb').read()
+        data = requests.get(base + '/api/metrics').json()
+    assert data['workers'] == 1
+    counters = data['aggregate']['counters']
+    # Only /api/chat counts as chat traffic; metrics and other endpoints are cheap like static files
+    assert counters['requests.static.2xx'] == 2
+    assert counters['requests.static.4xx'] == 2
+    assert counters['requests.chat.4xx'] == 1
+    assert data['aggregate']['timings']['latency.static']['count'] == 4
+    assert data['aggregate']['timings']['latency.chat']['count'] == 1
+
+
+def test_collect_metrics_reads_sibling_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(srv, 'WORKER_ID', 0)
+    srv.METRICS.incr('requests.static.2xx')
+    (tmp_path / 'worker-1.json').write_text('{"counters": {"requests.static.2xx": 4}, "timings": {}, "pid": 1}')
+    (tmp_path / 'worker-2.json').write_text('{broken')
+    data = srv.collect_metrics()
+    assert data['workers'] == 2
+    assert data['aggregate']['counters']['requests.static.2xx'] == 5
+
+
+def test_supervisor_keeps_counts_of_dead_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    supervisor = srv.PreforkSupervisor('127.0.0.1', 0, 2)
+    supervisor.metrics_dir = str(tmp_path)
+    dead = {'counters': {'requests.static.2xx': 4}, 'timings': {}, 'gauges': {'pool.static.active': 1}, 'pid': 1}
+    for _ in range(2):
+        (tmp_path / 'worker-0.json').write_text(json.dumps(dead))
+        supervisor._retire_metrics(0)
+    supervisor._retire_metrics(1)  # never exported
+    srv.METRICS.incr('workers.restarts')
+    srv.write_metrics_snapshot(str(tmp_path), 'supervisor', supervisor._retired)
+    # The replacement worker starts from zero
+    (tmp_path / 'worker-0.json').write_text('{"counters": {"requests.static.2xx": 1}, "timings": {}, "pid": 2}')
+    monkeypatch.setattr(srv, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(srv, 'WORKER_ID', 1)
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    aggregate = srv.collect_metrics()['aggregate']
+    assert aggregate['counters'] == {'requests.static.2xx': 9, 'workers.restarts': 1}
+    assert aggregate['gauges'] == {}
+
+
+@pytest.mark.skipif(not srv.can_prefork(), reason='needs fork and SO_REUSEPORT')
+def test_reuse_port_servers_share_a_port():
+    a = srv.ReusePortTCPServer(('127.0.0.1', 0), srv.PortfolioHTTPRequestHandler)
+    try:
+        port = a.socket.getsockname()[1]
+        b = srv.ReusePortTCPServer(('127.0.0.1', port), srv.PortfolioHTTPRequestHandler)
+        b.server_close()
+    finally:
+        a.server_close()
+
+
+@pytest.mark.skipif(not srv.can_prefork(), reason='needs fork and SO_REUSEPORT')
+def test_prefork_supervisor_restarts_and_stops_workers():
+    import signal
+    import socket
+    import subprocess
+    import sys
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, WORKERS='2', PORT=str(port), HOST='127.0.0.1')
+    proc = subprocess.Popen([sys.executable, srv.__file__], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            try:
+                requests.get(base + '/api/metrics', timeout=1)
+                break
+            except requests.RequestException:
+                time.sleep(0.1)
+        assert requests.get(base + '/').status_code == 200
+
+        # Kill one worker; the supervisor should replace it
+        time.sleep(srv.METRICS_EXPORT_INTERVAL + 0.5)
+        data = requests.get(base + '/api/metrics').json()
+        served_before = data['aggregate']['counters']['requests.static.2xx']
+        victim = next(w['pid'] for w in data['per_worker'].values() if w['counters'].get('requests.static.2xx'))
+        os.kill(victim, signal.SIGKILL)
+        deadline = time.time() + 10
+        new_pids = set()
+        while time.time() < deadline:
+            try:
+                data = requests.get(base + '/api/metrics', timeout=2).json()
+            except requests.RequestException:
+                # Connections queued on the killed worker's socket are reset
+                time.sleep(0.1)
+                continue
+            new_pids = {w['pid'] for k, w in data['per_worker'].items() if k != 'supervisor'}
+            if victim not in new_pids and len(new_pids) == 2:
+                break
+            time.sleep(0.5)
+        assert victim not in new_pids and len(new_pids) == 2
+        assert data['aggregate']['counters']['workers.restarts'] == 1
+        # The dead worker's requests are still counted (the supervisor keeps its last export)
+        assert data['aggregate']['counters']['requests.static.2xx'] >= served_before
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=15) == 0
+
+
+def test_state_manager_reload_swaps_snapshot(monkeypatch):
+    contexts = iter(['first context', 'second context'])
+    manager = srv.StateManager(loader=lambda: srv.PortfolioState(next(contexts)))
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+
+    old = manager.current
+    assert old.context_text == 'first context'
+    manager.reload('test', wait=True)
+    new = manager.current
+    assert new.context_text == 'second context'
+    assert new.context_hash != old.context_hash
+    # A snapshot taken before the reload is untouched
+    assert old.context_text == 'first context'
+    assert srv.METRICS.snapshot()['counters']['reload.ok'] == 1
+
+
+def test_state_manager_keeps_old_state_on_failure(monkeypatch):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        if len(calls) > 1:
+            raise RuntimeError('broken')
+        return srv.PortfolioState('stable')
+
+    manager = srv.StateManager(loader=loader)
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    assert manager.current.context_text == 'stable'
+    manager.reload('test', wait=True)
+    assert manager.current.context_text == 'stable'
+    assert srv.METRICS.snapshot()['counters']['reload.failed'] == 1
+
+
+def test_chat_uses_reloaded_context(monkeypatch):
+    seen = []
+    monkeypatch.setattr(srv, 'generate_response', lambda q, context_text, **kw: seen.append(context_text) or 'ok')
+    contexts = iter(['v1', 'v2'])
+    monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=lambda: srv.PortfolioState(next(contexts))))
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        requests.post(base + '/api/chat', json={'question': 'Q'})
+        requests.post(base + '/api/chat', json={'question': 'Q'})
+        srv.STATE.reload('test', wait=True)
+        requests.post(base + '/api/chat', json={'question': 'Q'})
+    assert seen == ['v1', 'v1', 'v2']
+
+
+def test_build_state_reads_site_files(tmp_path, monkeypatch):
+    (tmp_path / 'index.html').write_text('<p>Ram in Seattle</p>', encoding='utf-8')
+    (tmp_path / 'chatbot-knowledge.json').write_text('{"location": {"keywords": ["seattle"]}}', encoding='utf-8')
+    monkeypatch.chdir(tmp_path)
+    state = srv.build_state()
+    assert state.context_text == 'Ram in Seattle'
+    assert 'location' in state.matchers
+    assert state.mtimes['index.html'] is not None
+    assert state.mtimes['.env'] is None
+
+
+def test_build_state_ignores_malformed_faq_bundle(tmp_path, monkeypatch, capsys):
+    (tmp_path / 'index.html').write_text('<p>Ram in Seattle</p>', encoding='utf-8')
+    bundle = {'version': 1, 'context_hash': srv.fingerprint('Ram in Seattle'), 'answers': {'skills': 'Python'}}
+    (tmp_path / 'faq-answers.json').write_text(json.dumps(bundle), encoding='utf-8')
+    monkeypatch.chdir(tmp_path)
+    state = srv.build_state()
+    assert state.context_text == 'Ram in Seattle' and state.faq_answers == {}
+    assert 'Ignoring malformed faq-answers.json' in capsys.readouterr().out
+
+
+def test_model_gets_compacted_context(tmp_path, monkeypatch):
+    (tmp_path / 'index.html').write_text(
+        '<nav><a href="#about">About</a></nav><section id="about"><h2>About</h2><p>Ram in Seattle</p></section>',
+        encoding='utf-8')
+    monkeypatch.chdir(tmp_path)
+    seen = []
+    monkeypatch.setattr(srv, 'generate_response', lambda q, context_text, **kw: seen.append(context_text) or 'ok')
+    monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=srv.build_state))
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        requests.post(base + '/api/chat', json={'question': 'Q'})
+        metrics = requests.get(base + '/api/metrics').json()
+    # The page is still identified by its full text, so caches and FAQ bundles stay valid
+    assert srv.STATE.current.context_text == 'About About Ram in Seattle'
+    assert seen == ['## About\nRam in Seattle']
+    assert metrics['context'] == {'chars': 26, 'prompt_chars': 23, 'saved_chars': 3}
+
+    monkeypatch.setattr(srv, 'CONTEXT_COMPACTION', False)
+    assert srv.build_state().prompt_text == 'About About Ram in Seattle'
+
+
+@contextmanager
+def run_bulkhead_server(handler_cls, pools):
+    httpd = srv.BulkheadTCPServer(('127.0.0.1', 0), handler_cls, pools=pools)
+    sa = httpd.socket.getsockname()
+    t = threading.Thread(target=httpd.serve_forever, daemon=True)
+    t.start()
+    try:
+        time.sleep(0.05)
+        yield f"http://{sa[0]}:{sa[1]}"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        t.join(timeout=1)
+
+
+def test_bulkhead_classifies_requests():
+    httpd = srv.BulkheadTCPServer(('127.0.0.1', 0), srv.PortfolioHTTPRequestHandler,
+                                  pools={'static': None, 'chat': None})
+    try:
+        import socket
+        for line, expected in [
+            (b'POST /api/chat HTTP/1.1\r\n', 'chat'),
+            (b'GET /api/chat?q=skills HTTP/1.1\r\n', 'chat'),
+            (b'GET /api/chatter HTTP/1.1\r\n', 'static'),
+            (b'GET /index.html HTTP/1.1\r\n', 'static'),
+        ]:
+            a, b = socket.socketpair()
+            a.sendall(line)
+            assert httpd.classify(b) == expected
+            a.close()
+            b.close()
+    finally:
+        httpd.socket.close()
+
+
+def test_idle_connections_do_not_stall_accepts(monkeypatch):
+    import socket
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv.BulkheadTCPServer, 'classify_timeout', 0.5)
+    pools = {'static': srv.WorkerPool('static', 2, 8), 'chat': srv.WorkerPool('chat', 1, 1)}
+    with run_bulkhead_server(srv.PortfolioHTTPRequestHandler, pools) as base:
+        host, port = base[len('http://'):].split(':')
+        # Preconnects that never send a request line
+        idle = [socket.create_connection((host, int(port))) for _ in range(6)]
+        start = time.time()
+        assert requests.get(base + '/', timeout=5).status_code == 200
+        assert time.time() - start < 0.3
+        # Silent connections are closed without ever taking a pool thread
+        for sock in idle:
+            sock.settimeout(2)
+            assert sock.recv(1) == b''
+            sock.close()
+    snap = srv.METRICS.snapshot()
+    assert snap['counters']['connections.idle_closed'] == 6
+    assert snap['timings']['queue_wait.static']['count'] == 1
+
+
+def test_static_unaffected_by_saturated_chat_pool(monkeypatch):
+    release = threading.Event()
+
+    def slow_generate(q, context_text, **kwargs):
+        release.wait(5)
+        return 'late reply'
+
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'LOAD_SHEDDER', srv.LoadShedder(budget=60))
+    monkeypatch.setattr(srv, 'generate_response', slow_generate)
+    pools = {'static': srv.WorkerPool('static', 2, 8), 'chat': srv.WorkerPool('chat', 1, 1)}
+    results = []
+
+    with run_bulkhead_server(srv.PortfolioHTTPRequestHandler, pools) as base:
+        def chat():
+            results.append(requests.post(base + '/api/chat', json={'question': 'Q'}, timeout=10))
+
+        # One chat request occupies the only chat thread, one waits in its queue
+        threads = [threading.Thread(target=chat) for _ in range(2)]
+        for t in threads:
+            t.start()
+            time.sleep(0.2)
+
+        # The chat queue is full: new chat work is rejected immediately...
+        r = requests.post(base + '/api/chat', json={'question': 'Q'}, timeout=5)
+        assert r.status_code == 503
+        assert r.headers['Retry-After'] == '1'
+
+        # ...while static pages are still served promptly
+        start = time.time()
+        assert requests.get(base + '/', timeout=5).status_code == 200
+        assert time.time() - start < 1.0
+
+        release.set()
+        for t in threads:
+            t.join(timeout=10)
+
+    assert [r.status_code for r in results] == [200, 200]
+    snap = srv.METRICS.snapshot()
+    assert snap['counters']['pool.chat.rejected'] == 1
+    assert snap['timings']['queue_wait.chat']['count'] == 2
+    assert snap['timings']['queue_wait.chat']['max'] > 0.1
+    assert snap['timings']['queue_wait.static']['count'] >= 1
+
+
+def test_chat_deadline_defaults_and_header_tightens(monkeypatch):
+    seen = []
+
+    def fake_generate_response(q, context_text, deadline=None, **kwargs):
+        seen.append(deadline - time.monotonic())
+        return 'ok'
+
+    monkeypatch.setattr(srv, 'generate_response', fake_generate_response)
+    monkeypatch.setattr(srv, 'CHAT_DEADLINE', 10.0)
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        requests.post(base + '/api/chat', json={'question': 'Q'})
+        requests.post(base + '/api/chat', json={'question': 'Q'}, headers={srv.DEADLINE_HEADER: '2000'})
+        # A client can't extend the server's budget, and junk is ignored
+        requests.post(base + '/api/chat', json={'question': 'Q'}, headers={srv.DEADLINE_HEADER: '60000'})
+        requests.post(base + '/api/chat', json={'question': 'Q'}, headers={srv.DEADLINE_HEADER: 'soon'})
+    assert 9 < seen[0] <= 10
+    assert 1 < seen[1] <= 2
+    assert 9 < seen[2] <= 10
+    assert 9 < seen[3] <= 10
+
+
+def test_chat_deadline_exceeded_returns_504(monkeypatch):
+    def fake_generate_response(q, context_text, **kwargs):
+        raise srv.DeadlineExceeded('too slow')
+
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'generate_response', fake_generate_response)
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        r = requests.post(base + '/api/chat', json={'question': 'Q'})
+        assert r.status_code == 504
+        # A budget already spent never reaches the upstream
+        monkeypatch.setattr(srv, 'CHAT_DEADLINE', 0.0)
+        r = requests.post(base + '/api/chat', json={'question': 'Q'})
+        assert r.status_code == 504
+    assert srv.METRICS.snapshot()['counters']['chat.deadline_exceeded'] == 2
+
+
+def test_chat_cancelled_when_client_disconnects(monkeypatch):
+    import socket
+    cancelled = threading.Event()
+
+    def fake_generate_response(q, context_text, should_cancel=None, **kwargs):
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            if should_cancel():
+                cancelled.set()
+                raise srv.GeminiCancelled('gone')
+            time.sleep(0.02)
+        return 'too late'
+
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'generate_response', fake_generate_response)
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        host, port = base[len('http://'):].split(':')
+        body = b'{"question": "Q"}'
+        sock = socket.create_connection((host, int(port)))
+        sock.sendall(
+            b'POST /api/chat HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\n'
+            b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body
+        )
+        time.sleep(0.2)
+        sock.close()
+        assert cancelled.wait(3)
+        time.sleep(0.1)
+    assert srv.METRICS.snapshot()['counters']['chat.cancelled'] == 1
+
+
+def test_chat_serves_prerendered_faq_without_upstream(monkeypatch):
+    from api.context import fingerprint
+    bundle = {
+        'version': 1,
+        'context_hash': fingerprint('ctx'),
+        'answers': {'where is he based': {'question': 'Where is he based?', 'reply': 'Seattle, WA.'}},
+    }
+    stale = dict(bundle, context_hash='something-else')
+    calls = []
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'generate_response', lambda q, context_text, **kw: calls.append(q) or 'live')
+    monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=lambda: srv.PortfolioState('ctx', faq_bundle=bundle)))
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        r = requests.post(base + '/api/chat', json={'question': 'where is he BASED'})
+        assert r.json()['reply'] == 'Seattle, WA.'
+        # With history the prerendered answer may not fit the conversation
+        r = requests.post(base + '/api/chat', json={'question': 'Where is he based?',
+                                                    'history': [{'role': 'user', 'text': 'hi'}]})
+        assert r.json()['reply'] == 'live'
+
+        monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=lambda: srv.PortfolioState('ctx', faq_bundle=stale)))
+        r = requests.post(base + '/api/chat', json={'question': 'Where is he based?'})
+        assert r.json()['reply'] == 'live'
+        # ...and the chatbot doesn't get the stale bundle either
+        assert requests.get(base + '/faq-answers.json').status_code == 404
+    assert len(calls) == 2
+    assert srv.METRICS.snapshot()['counters']['chat.faq_hits'] == 1
+
+
+def test_chat_answer_cache_shared_across_restarts(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'generate_response', lambda q, context_text, **kw: calls.append(q) or 'live')
+    monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=lambda: srv.PortfolioState('ctx')))
+    monkeypatch.setattr(srv, 'ANSWER_CACHE', None)
+    monkeypatch.setattr(srv, 'ANSWER_CACHE_PATH', str(tmp_path / 'answers.db'))
+    history = [{'role': 'user', 'text': 'hi'}]
+
+    for _ in range(2):  # second pass simulates a restarted worker with a cold process
+        srv.open_answer_cache()
+        with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+            assert requests.post(base + '/api/chat', json={'question': 'Skills?'}).json()['reply'] == 'live'
+            assert requests.post(base + '/api/chat', json={'question': 'skills',
+                                                        'history': history}).json()['reply'] == 'live'
+        srv.ANSWER_CACHE.close()
+
+    # Different history is a different conversation, so two upstream calls in total
+    assert calls == ['Skills?', 'skills']
+    counters = srv.METRICS.snapshot()['counters']
+    assert counters['chat.cache_hits'] == 2
+    assert counters['chat.cache_misses'] == 2
+
+
+def test_chat_stale_answer_served_while_one_refresh_runs(tmp_path, monkeypatch):
+    clock = [1000.0]
+    release = threading.Event()
+    calls = []
+
+    def slow_generate(q, context_text, **kw):
+        calls.append(q)
+        if len(calls) > 1:
+            release.wait(5)
+        return f'answer {len(calls)}'
+
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'generate_response', slow_generate)
+    monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=lambda: srv.PortfolioState('ctx')))
+    cache = srv.AnswerCache(str(tmp_path / 'answers.db'), ttl=100, soft_ttl=10, clock=lambda: clock[0],
+                            on_event=lambda name: srv.METRICS.incr(f"chat.cache_{name}"))
+    monkeypatch.setattr(srv, 'ANSWER_CACHE', cache)
+
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        ask = lambda: requests.post(base + '/api/chat', json={'question': 'Skills?'}).json()['reply']
+        assert ask() == 'answer 1'
+        clock[0] += 20
+        # Past the soft TTL: every visitor gets the old answer at once, one refresh runs
+        assert [ask() for _ in range(3)] == ['answer 1'] * 3
+        release.set()
+        while cache._refreshing:
+            time.sleep(0.01)
+        assert ask() == 'answer 2'
+        clock[0] += 200
+        assert ask() == 'answer 3'  # past the hard TTL the request waits for a new answer
+    cache.close()
+
+    assert len(calls) == 3
+    counters = srv.METRICS.snapshot()['counters']
+    assert counters['chat.cache_stale'] == 3
+    assert counters['chat.cache_refreshes'] == 1
+
+
+def test_open_answer_cache_disabled_or_broken(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(srv, 'ANSWER_CACHE', None)
+    monkeypatch.setattr(srv, 'ANSWER_CACHE_PATH', '')
+    assert srv.open_answer_cache() is None
+    monkeypatch.setattr(srv, 'ANSWER_CACHE_PATH', str(tmp_path / 'missing' / 'answers.db'))
+    assert srv.open_answer_cache() is None
+    assert 'Answer cache disabled' in capsys.readouterr().out
+
+
+def test_chat_similar_question_reuses_answer(monkeypatch):
+    calls = []
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'SIMILAR', SimilarityCache(sample_rate=1.0))
+    monkeypatch.setattr(srv, 'generate_response', lambda q, context_text, **kw: calls.append(q) or f'answer {len(calls)}')
+    monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=lambda: srv.PortfolioState('ctx')))
+    history = [{'role': 'user', 'text': 'hi'}]
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        assert requests.post(base + '/api/chat', json={'question': 'What are his skills?'}).json()['reply'] == 'answer 1'
+        assert requests.post(base + '/api/chat', json={'question': 'skills'}).json()['reply'] == 'answer 1'
+        # A conversation can change what the question means, so history always goes upstream
+        assert requests.post(base + '/api/chat', json={'question': 'skills',
+                                                       'history': history}).json()['reply'] == 'answer 2'
+        assert requests.post(base + '/api/chat', json={'question': 'Where is he based?'}).json()['reply'] == 'answer 3'
+        data = requests.get(base + '/api/metrics').json()
+
+    assert calls == ['What are his skills?', 'skills', 'Where is he based?']
+    assert data['similarity']['hit_rate'] == 1 / 3
+    assert data['similarity']['entries'] == 2
+    assert data['similarity']['samples'] == [
+        {'question': 'skills', 'matched': 'What are his skills?', 'similarity': 1.0}]
+    assert data['aggregate']['timings']['chat.similar_lookup']['count'] == 3
+
+
+def test_get_chat_is_cacheable_and_revalidates(monkeypatch):
+    calls = []
+    contexts = iter(['ctx', 'new ctx'])
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'generate_response', lambda q, context_text, **kw: calls.append(kw) or 'Seattle.')
+    monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=lambda: srv.PortfolioState(next(contexts))))
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        r = requests.get(base + '/api/chat', params={'q': 'Where is he based?'})
+        assert r.status_code == 200
+        assert r.json() == {'reply': 'Seattle.'}
+        assert r.headers['Cache-Control'] == 'public, max-age=300'
+        assert r.headers['Vary'] == 'Accept-Encoding'
+        assert 'Pragma' not in r.headers
+        etag = r.headers['ETag']
+
+        # Revalidating the same normalized question needs no upstream call
+        r = requests.get(base + '/api/chat', params={'q': 'where is he based'}, headers={'If-None-Match': etag})
+        assert r.status_code == 304
+        assert r.headers['ETag'] == etag
+        assert r.headers['Cache-Control'] == 'public, max-age=300'
+
+        # A reloaded context changes the validator
+        srv.STATE.reload('test', wait=True)
+        r = requests.get(base + '/api/chat', params={'q': 'Where is he based?'}, headers={'If-None-Match': etag})
+        assert r.status_code == 200
+        assert r.headers['ETag'] != etag
+
+        r = requests.get(base + '/api/chat', params={'q': '?!'})
+        assert r.status_code == 400
+        assert 'no-store' in r.headers['Cache-Control']
+
+    assert len(calls) == 2
+    assert calls[0]['history'] == [] and calls[0]['prefix'] is None
+    assert srv.METRICS.snapshot()['counters']['chat.not_modified'] == 1
+
+
+def test_get_chat_errors_are_not_cacheable(monkeypatch):
+    def failing(q, context_text, **kw):
+        raise srv.GeminiError('boom')
+
+    monkeypatch.setattr(srv, 'generate_response', failing)
+    monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=lambda: srv.PortfolioState('ctx')))
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        r = requests.get(base + '/api/chat?q=skills')
+        assert r.status_code == 502
+        assert 'no-store' in r.headers['Cache-Control']
+        assert 'ETag' not in r.headers
+        monkeypatch.setattr(srv, 'generate_response', None)
+        assert requests.get(base + '/api/chat?q=skills').status_code == 500
+
+
+def test_chat_speculative_prefetch_answers_follow_ups(monkeypatch):
+    calls = []
+
+    def fake_generate(q, context_text, history=None, **kw):
+        calls.append((q, [t['text'] for t in history or []]))
+        return f'answer {len(calls)}'
+
+    knowledge = {
+        'experience': {'keywords': ['experience'], 'follow_up': 'What is his experience?'},
+        'projects': {'keywords': ['projects'], 'follow_up': 'Tell me about his projects'},
+        'contact': {'keywords': ['contact'], 'follow_up': 'How can I contact him?'},
+    }
+    state = srv.PortfolioState('ctx', knowledge, srv.compile_matchers(knowledge))
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'SESSIONS', srv.SessionStore())
+    monkeypatch.setattr(srv, 'generate_response', fake_generate)
+    monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=lambda: state))
+    prefetcher = srv.Prefetcher(srv.background_answer, top_k=1,
+                                on_event=lambda name: srv.METRICS.incr(f"prefetch.{name}"))
+    monkeypatch.setattr(srv, 'PREFETCH', prefetcher)
+
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        # First question as a GET; its likeliest follow-up is prepared in the background
+        first = requests.get(base + '/api/chat', params={'q': 'Experience?'}).json()
+        assert first == {'reply': 'answer 1', 'suggestions': ['Tell me about his projects']}
+        prefetcher.flush()
+        assert calls[1] == ('Tell me about his projects', ['Experience?', 'answer 1'])
+
+        # The chatbot then POSTs the suggestion with its own copy of the history
+        history = [{'role': 'user', 'text': 'Experience?'}, {'role': 'assistant', 'text': 'answer 1'}]
+        second = requests.post(base + '/api/chat', json={'question': 'Tell me about his projects',
+                                                         'history': history}).json()
+        assert second['reply'] == 'answer 2'
+        # Only the exact follow-up wording counts as already asked
+        assert second['suggestions'] == ['What is his experience?']
+        prefetcher.flush()
+
+        # A question nobody prepared still goes upstream
+        third = requests.post(base + '/api/chat', json={'question': 'Anything else?',
+                                                        'session_id': second['session_id']}).json()
+        assert 'suggestions' not in third
+        data = requests.get(base + '/api/metrics').json()
+
+    prefetcher.close()
+    assert [q for q, _ in calls] == ['Experience?', 'Tell me about his projects', 'What is his experience?',
+                                     'Anything else?']
+    counters = data['aggregate']['counters']
+    assert counters['prefetch.issued'] == 2 and counters['prefetch.hits'] == 1
+    assert data['prefetch']['hit_rate'] == 0.5
+    assert data['prefetch']['transitions'] == {'experience': {'projects': 1}}
+
+
+def test_chat_sessions_send_only_new_question(monkeypatch):
+    seen = []
+
+    def fake_generate(q, context_text, history=None, prefix=None, **kw):
+        seen.append([p['text'] for p in prefix[1:]])
+        return f'answer {len(seen)}'
+
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'SESSIONS', srv.SessionStore())
+    monkeypatch.setattr(srv, 'generate_response', fake_generate)
+    monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=lambda: srv.PortfolioState('ctx')))
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        first = requests.post(base + '/api/chat', json={'question': 'Skills?'}).json()
+        sid = first['session_id']
+        second = requests.post(base + '/api/chat', json={'question': 'More?', 'session_id': sid}).json()
+        assert second == {'reply': 'answer 2', 'session_id': sid}
+        assert seen[1] == ['User: Skills?', 'Assistant: answer 1']
+
+        # Unknown session without history: the client must resend it
+        r = requests.post(base + '/api/chat', json={'question': 'More?', 'session_id': 'gone'})
+        assert r.status_code == 410
+        # ...and with history a fresh session is seeded from it
+        r = requests.post(base + '/api/chat', json={'question': 'More?', 'session_id': 'gone',
+                                                    'history': [{'role': 'user', 'text': 'Skills?'},
+                                                                {'role': 'assistant', 'text': 'answer 1'}]})
+        assert r.json()['session_id'] not in (sid, 'gone')
+        assert seen[2] == seen[1]
+    assert srv.METRICS.snapshot()['counters']['chat.session_expired'] == 1
+
+
+def test_chat_routes_models_and_records_upstream_health(monkeypatch):
+    from api.gemini_client import ClientConfig
+    models = []
+
+    def fake_generate(q, context_text, model=None, **kw):
+        models.append(model)
+        if q == 'fail':
+            raise srv.GeminiError('upstream down')
+        if q == 'slow':
+            raise srv.UpstreamTimeout('too slow')
+        return 'ok'
+
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'ROUTER', srv.ModelRouter(min_samples=3))
+    monkeypatch.setattr(srv, 'generate_response', fake_generate)
+    monkeypatch.setattr(srv.gemini_client, '_config', ClientConfig('full', 'http://x', fast_model='fast'))
+    monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=lambda: srv.PortfolioState('ctx')))
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        def ask(q):
+            return requests.post(base + '/api/chat', json={'question': q}).status_code
+
+        assert ask('Where is he based?') == 200
+        assert ask('Explain his pipeline design') == 200
+        assert ask('fail') == 502
+        assert ask('slow') == 504
+        # Two of three fast-model calls failed: simple questions now go to the full model
+        assert ask('Where is he based?') == 200
+    assert models == ['fast', 'full', 'fast', 'fast', 'full']
+    snap = srv.METRICS.snapshot()
+    assert snap['counters']['upstream.fast.errors'] == 2
+    assert snap['counters']['chat.route.full'] == 2
+    assert snap['timings']['upstream.fast']['count'] == 3
+
+
+def test_client_deadlines_do_not_degrade_models(monkeypatch):
+    from api.gemini_client import ClientConfig
+
+    def fake_generate(q, context_text, **kw):
+        if q == 'queued':
+            raise srv.DeadlineExceeded('no upstream slot')
+        raise srv.UpstreamTimeout('too slow')
+
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'ROUTER', srv.ModelRouter(min_samples=3))
+    monkeypatch.setattr(srv, 'EXTRACTIVE_FALLBACK', False)
+    monkeypatch.setattr(srv, 'generate_response', fake_generate)
+    monkeypatch.setattr(srv.gemini_client, '_config', ClientConfig('full', 'http://x', fast_model=''))
+    monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=lambda: srv.PortfolioState('Skills: Python.')))
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        for _ in range(5):
+            r = requests.post(base + '/api/chat', json={'question': 'Skills?'}, headers={'X-Request-Timeout-Ms': '30'})
+            assert r.status_code == 504
+            assert requests.post(base + '/api/chat', json={'question': 'queued'}).status_code == 504
+        assert not srv.ROUTER.degraded('full')
+        # Timeouts under the server's own budget still count
+        for _ in range(3):
+            requests.post(base + '/api/chat', json={'question': 'Skills?'})
+        router = requests.get(base + '/api/metrics').json()['router']
+    assert router['full']['degraded'] is True and router['full']['count'] == 3
+    assert srv.METRICS.snapshot()['counters']['chat.deadline_exceeded'] == 13
+
+
+def test_client_deadline_spent_before_the_upstream_call(monkeypatch):
+    from api.gemini_client import ClientConfig
+    calls = []
+    context = 'Location Seattle, WA. Data Engineer Amazon 2022 to 2024 managing Kafka streaming.'
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'ROUTER', srv.ModelRouter(min_samples=1))
+    monkeypatch.setattr(srv, 'generate_response', lambda *a, **kw: calls.append(a))
+    monkeypatch.setattr(srv.gemini_client, '_config', ClientConfig('full', 'http://x', fast_model=''))
+    monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=lambda: srv.PortfolioState(context)))
+    headers = {'X-Request-Timeout-Ms': '0.001'}
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        r = requests.post(base + '/api/chat', json={'question': 'What is his location?'}, headers=headers)
+        assert r.status_code == 200 and r.json()['fallback'] is True
+        monkeypatch.setattr(srv, 'EXTRACTIVE_FALLBACK', False)
+        r = requests.post(base + '/api/chat', json={'question': 'Favourite colour?'}, headers=headers)
+        assert r.status_code == 504
+    assert calls == [] and not srv.ROUTER.degraded('full')
+
+
+def test_chat_falls_back_to_page_passage_when_gemini_cannot_answer(monkeypatch):
+    from api.gemini_client import ClientConfig
+    deadlines = []
+
+    def fake_generate(q, context_text, deadline=None, **kw):
+        deadlines.append(deadline - time.monotonic())
+        if 'Amazon' in q:
+            raise srv.UpstreamTimeout('too slow')
+        raise srv.GeminiError('upstream down')
+
+    context = 'Location Seattle, WA. Data Engineer Amazon 2022 to 2024 managing Kafka streaming.'
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'ROUTER', srv.ModelRouter(min_samples=3))
+    monkeypatch.setattr(srv, 'UPSTREAM_LATENCY_BUDGET', 2.0)
+    monkeypatch.setattr(srv, 'generate_response', fake_generate)
+    monkeypatch.setattr(srv.gemini_client, '_config', ClientConfig('full', 'http://x', fast_model=''))
+    monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=lambda: srv.PortfolioState(context)))
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        r = requests.post(base + '/api/chat', json={'question': 'What is his location?'})
+        assert r.status_code == 200
+        assert r.json()['fallback'] is True and 'Seattle' in r.json()['reply']
+        # The quote is not recorded as a turn the model would see later
+        assert srv.SESSIONS.get(r.json()['session_id']).turns == []
+        r = requests.get(base + '/api/chat', params={'q': 'What did he do at Amazon?'})
+        assert r.json() == {'reply': context, 'fallback': True}
+        assert 'no-store' in r.headers['Cache-Control'] and 'ETag' not in r.headers
+        # Nothing on the page matches: the upstream error stands
+        assert requests.post(base + '/api/chat', json={'question': 'Favourite colour?'}).status_code == 502
+        # Three failures open the circuit: answered from the page without calling Gemini
+        r = requests.post(base + '/api/chat', json={'question': 'Kafka?'})
+        assert r.json()['fallback'] is True
+        assert requests.post(base + '/api/chat', json={'question': 'Favourite colour?'}).status_code == 502
+    assert len(deadlines) == 4
+    assert all(0 < d <= 2.0 for d in deadlines)  # the upstream only gets the latency budget
+    counters = srv.METRICS.snapshot()['counters']
+    assert counters['chat.fallback.upstream_error'] == 1
+    assert counters['chat.fallback.deadline'] == 1
+    assert counters['chat.fallback.circuit_open'] == 1
+    assert counters['chat.fallback_misses'] == 3
+
+
+def test_load_shedder_estimates_queueing_delay():
+    class Pool:
+        name, threads = 'chat', 2
+
+        def __init__(self, busy):
+            self._busy = busy
+
+        def busy(self):
+            return self._busy
+
+    shedder = srv.LoadShedder(budget=2.0, alpha=0.5, initial_latency=1.0)
+    assert shedder.estimated_wait(Pool(1)) == 0.0  # a thread is free
+    assert shedder.estimated_wait(Pool(3)) == 1.0  # two ahead, two threads, 1 s each
+    shedder.observe(3.0)
+    assert shedder.latency == 2.0
+    assert shedder.check(Pool(2)) == 0
+    assert shedder.check(Pool(5)) == 2  # 4 s expected wait, 2 s over budget
+    assert srv.shed_rates({'pool.chat.accepted': 3, 'load.chat.shed': 1}) == {'static': 0.0, 'chat': 0.25}
+
+
+def test_chat_shed_when_expected_wait_exceeds_budget(monkeypatch):
+    release = threading.Event()
+
+    def slow_generate(q, context_text, **kwargs):
+        release.wait(5)
+        return 'late reply'
+
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'LOAD_SHEDDER', srv.LoadShedder(budget=1.0, initial_latency=3.0))
+    monkeypatch.setattr(srv, 'generate_response', slow_generate)
+    pools = {'static': srv.WorkerPool('static', 2, 8), 'chat': srv.WorkerPool('chat', 1, 8)}
+    results = []
+
+    with run_bulkhead_server(srv.PortfolioHTTPRequestHandler, pools) as base:
+        first = threading.Thread(target=lambda: results.append(
+            requests.post(base + '/api/chat', json={'question': 'Q'}, timeout=10)))
+        first.start()
+        time.sleep(0.2)
+
+        # The queue has room, but at ~3 s per request the next one would wait past the budget
+        r = requests.post(base + '/api/chat', json={'question': 'Q'}, timeout=5)
+        assert r.status_code == 503
+        assert r.headers['Retry-After'] == '2'
+        assert requests.get(base + '/', timeout=5).status_code == 200
+
+        release.set()
+        first.join(timeout=10)
+        assert results[0].status_code == 200
+        # The fast completion pulled the latency estimate down
+        assert srv.LOAD_SHEDDER.latency < 3.0
+        assert requests.get(base + '/api/metrics').json()['shed_rate']['chat'] == 0.5
+
+
+def test_chat_rate_limited_and_token_usage_metrics(monkeypatch):
+    def fake_generate(q, context_text, **kw):
+        if q == 'busy':
+            raise srv.RateLimited('budget full', retry_after=4.2)
+        srv.gemini_client.QUOTA.record(srv.gemini_client.QUOTA.acquire(10), 120, 30)
+        return 'ok'
+
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv.gemini_client, 'QUOTA', srv.gemini_client.QuotaScheduler(
+        on_record=srv.record_token_usage))
+    monkeypatch.setattr(srv, 'generate_response', fake_generate)
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        r = requests.post(base + '/api/chat', json={'question': 'busy'})
+        assert r.status_code == 503
+        assert r.headers['Retry-After'] == '5'
+        assert requests.post(base + '/api/chat', json={'question': 'Q'}).status_code == 200
+        metrics = requests.get(base + '/api/metrics').json()
+    assert metrics['aggregate']['counters']['chat.rate_limited'] == 1
+    assert metrics['aggregate']['counters']['tokens.prompt'] == 120
+    assert metrics['aggregate']['counters']['tokens.output'] == 30
+    assert metrics['quota']['day']['requests'] == 1
+
+
+def test_upstream_queue_wait_reported_per_priority(monkeypatch):
+    priorities = []
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'generate_response', lambda q, context_text, priority, **kw: priorities.append(priority))
+    srv.background_answer('Skills?', [], 'ctx')
+    srv.background_answer('Skills?', [], 'ctx', srv.REFRESH_PRIORITY)
+    assert priorities == ['prefetch', 'refresh']
+
+    monkeypatch.setattr(srv.gemini_client, 'SCHEDULER', srv.gemini_client.PriorityScheduler(
+        limit=2, on_wait=srv.record_upstream_wait))
+    with srv.gemini_client.SCHEDULER.slot('batch'):
+        with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+            metrics = requests.get(base + '/api/metrics').json()
+    assert metrics['upstream_queue']['limit'] == 2
+    assert metrics['upstream_queue']['in_flight'] == 1
+    assert metrics['aggregate']['timings']['upstream_wait.batch']['count'] == 1
+
+
+def test_single_rate_limited_key_falls_back_to_page(monkeypatch):
+    from api.gemini_client import ClientConfig
+    posts = []
+    real_post = requests.post
+
+    def fake_post(url, data=None, headers=None, timeout=None, **kw):
+        if not url.startswith('http://x/'):
+            return real_post(url, data=data, headers=headers, timeout=timeout, **kw)
+        posts.append(url)
+        resp = requests.models.Response()
+        resp.status_code, resp._content = 429, b'{"error": {"message": "quota"}}'
+        resp.headers['Retry-After'] = '4'
+        return resp
+
+    context = 'Location Seattle, WA. Data Engineer at Amazon.'
+    monkeypatch.setenv('GEMINI_API_KEY', 'only-key')
+    monkeypatch.setattr(srv, 'METRICS', srv.Metrics())
+    monkeypatch.setattr(srv, 'ROUTER', srv.ModelRouter())
+    monkeypatch.setattr(srv.gemini_client, 'KEYS', srv.gemini_client.KeyPool(cooldown=10))
+    monkeypatch.setattr(srv.gemini_client.requests, 'post', fake_post)
+    monkeypatch.setattr(srv.gemini_client, '_config', ClientConfig('full', 'http://x', fast_model=''))
+    monkeypatch.setattr(srv, 'STATE', srv.StateManager(loader=lambda: srv.PortfolioState(context)))
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        assert requests.post(base + '/api/chat', json={'question': 'Where is his location?'}).json()['fallback']
+        # The key rests for the 4 s Gemini asked for; meanwhile chats are answered from the page
+        r = requests.post(base + '/api/chat', json={'question': 'Did he work at Amazon?'})
+        assert r.status_code == 200 and r.json()['fallback'] is True
+        r = requests.post(base + '/api/chat', json={'question': 'Favourite colour?'})
+        assert r.status_code == 503 and r.headers['Retry-After'] == '4'
+    assert len(posts) == 1
+    assert 0 < srv.gemini_client.KEYS.snapshot()['key1']['cooling_for'] <= 4
+    counters = srv.METRICS.snapshot()['counters']
+    assert counters['chat.fallback.upstream_error'] == 1 and counters['chat.fallback.rate_limited'] == 1
+
+
+def test_key_pool_reported_without_key_values(monkeypatch):
+    monkeypatch.setattr(srv.gemini_client, 'KEYS', srv.gemini_client.KeyPool(['secret-a', 'secret-b']))
+    handle = srv.gemini_client.KEYS.acquire()
+    srv.gemini_client.KEYS.release(handle, rate_limited=True)
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        r = requests.get(base + '/api/metrics')
+    assert 'secret' not in r.text
+    keys = r.json()['keys']
+    assert keys['key1']['rate_limited'] == 1 and keys['key1']['cooling_for'] > 0
+    assert keys['key2']['calls'] == 0
+
+
+def test_debug_endpoints_are_gated(monkeypatch):
+    monkeypatch.setattr(srv, 'DEBUG_TOKEN', '')
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        assert requests.get(base + '/api/debug/memory', headers={'X-Debug-Token': ''}).status_code == 404
+        monkeypatch.setattr(srv, 'DEBUG_TOKEN', 's3cret')
+        assert requests.get(base + '/api/debug/memory').status_code == 403
+        assert requests.get(base + '/api/debug/memory', headers={'X-Debug-Token': 'wrong'}).status_code == 403
+        ok = {'X-Debug-Token': 's3cret'}
+        assert requests.get(base + '/api/debug/other', headers=ok).status_code == 404
+        assert requests.get(base + '/api/debug/profile?requests=x', headers=ok).status_code == 400
+
+
+def test_debug_profile_reports_next_requests(monkeypatch):
+    monkeypatch.setattr(srv, 'DEBUG_TOKEN', 's3cret')
+    monkeypatch.setattr(srv, 'PROFILER', srv.RequestProfiler())
+    monkeypatch.setattr(srv, 'generate_response', lambda q, context_text, **kw: 'ok')
+    monkeypatch.setattr(srv, 'LOAD_SHEDDER', srv.LoadShedder(budget=60))
+    headers = {'X-Debug-Token': 's3cret'}
+    pools = {'static': srv.WorkerPool('static', 4, 8), 'chat': srv.WorkerPool('chat', 2, 8)}
+    with run_bulkhead_server(srv.PortfolioHTTPRequestHandler, pools) as base:
+        result = {}
+        debug = threading.Thread(target=lambda: result.setdefault('r', requests.get(
+            base + '/api/debug/profile?requests=2&limit=10', headers=headers, timeout=10)))
+        debug.start()
+        while not srv.PROFILER.active:
+            time.sleep(0.01)
+        assert requests.get(base + '/api/debug/profile', headers=headers).status_code == 409
+        requests.post(base + '/api/chat', json={'question': 'Q'})
+        requests.get(base + '/index.html')
+        debug.join(timeout=10)
+    assert result['r'].status_code == 200
+    assert result['r'].text.startswith('Profiled 2 request(s)')
+    assert '_handle_post' in result['r'].text
+
+
+def test_debug_memory_diff(monkeypatch):
+    monkeypatch.setattr(srv, 'DEBUG_TOKEN', 's3cret')
+    monkeypatch.setattr(srv, 'MEMORY', srv.MemoryTracker())
+    headers = {'X-Debug-Token': 's3cret'}
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        def memory(query):
+            return requests.get(base + '/api/debug/memory' + query, headers=headers)
+
+        assert memory('?action=diff').status_code == 409
+        assert memory('?action=start').json()['tracing'] is True
+        report = memory('?since=start&limit=5').json()
+        assert report['since'] == 'start' and len(report['top']) <= 5
+        assert memory('?action=stop').json()['tracing'] is True
+    assert not srv.MEMORY._baseline
+
+
+def test_pages_send_preload_links_cached_by_mtime(tmp_path, monkeypatch):
+    page = tmp_path / 'index.html'
+    page.write_text('<link rel="stylesheet" href="styles.css"><script src="main.js"></script>', encoding='utf-8')
+    (tmp_path / 'styles.css').write_text('body{}', encoding='utf-8')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(srv, 'PRELOAD_HINTS', srv.PreloadHints())
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        r = requests.get(base + '/')
+        assert r.headers['Link'] == '</styles.css>; rel=preload; as=style, </main.js>; rel=preload; as=script'
+        assert 'Link' not in requests.get(base + '/styles.css').headers
+        assert 'Link' not in requests.get(base + '/classic/').headers  # no such page here
+
+        page.write_text('<script src="chatbot.js"></script>', encoding='utf-8')
+        os.utime(page, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        assert requests.get(base + '/').headers['Link'] == '</chatbot.js>; rel=preload; as=script'
+
+    page.write_bytes(b'\xff\xfe broken')
+    os.utime(page, ns=(time.time_ns(), time.time_ns() + 2 * 10 ** 9))
+    assert srv.PRELOAD_HINTS.header('index.html', '/') == ''
+
+
+def test_early_hints_sent_before_page(tmp_path, monkeypatch):
+    import socket
+    (tmp_path / 'index.html').write_text('<script src="main.js"></script>', encoding='utf-8')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(srv, 'PRELOAD_HINTS', srv.PreloadHints())
+    monkeypatch.setattr(srv, 'EARLY_HINTS', True)
+    with run_server_in_thread(srv.PortfolioHTTPRequestHandler) as base:
+        host, port = base[len('http://'):].split(':')
+        with socket.create_connection((host, int(port))) as conn:
+            conn.sendall(b'GET / HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n')
+            raw = b''
+            while chunk := conn.recv(65536):
+                raw += chunk
+        with socket.create_connection((host, int(port))) as conn:
+            conn.sendall(b'GET / HTTP/1.0\r\n\r\n')
+            raw10 = b''
+            while chunk := conn.recv(65536):
+                raw10 += chunk
+    assert raw.startswith(b'HTTP/1.1 103 Early Hints\r\nLink: </main.js>; rel=preload; as=script\r\n\r\n')
+    assert b' 200 OK\r\n' in raw and raw.count(b'Link: ') == 2
+    assert not raw10.startswith(b'HTTP/1.1 103')
@@ -0,0 +1,166 @@
+import base64
+import json
+
+import pytest
+
+from api import gemini_client as gc
+from api import serverless as sl
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(tmp_path, monkeypatch):
+    artifact = tmp_path / 'context.json'
+    artifact.write_text(json.dumps({'context': 'Ram lives in Seattle.', 'fingerprint': 'abc'}), encoding='utf-8')
+    monkeypatch.setattr(sl, 'CONTEXT_ARTIFACT', str(artifact))
+    monkeypatch.setattr(sl, '_context', None)
+    monkeypatch.setattr(sl, '_client', None)
+    monkeypatch.setattr(sl, '_session', None)
+    monkeypatch.setattr(sl, '_answers', sl.OrderedDict())
+    return tmp_path
+
+
+def _event(body, method='POST', content_type='application/json', b64=False):
+    raw = body if isinstance(body, str) else json.dumps(body)
+    if b64:
+        raw = base64.b64encode(raw.encode('utf-8')).decode('ascii')
+    return {
+        'httpMethod': method,
+        'headers': {'content-type': content_type},
+        'body': raw,
+        'isBase64Encoded': b64,
+    }
+
+
+def _stub(monkeypatch, result):
+    calls = []
+
+    def fake(question, context_text, history=None, session=None):
+        calls.append({'question': question, 'context': context_text, 'history': history, 'session': session})
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(gc, 'generate_response', fake)
+    return calls
+
+
+def test_success_uses_artifact_and_caches(monkeypatch):
+    calls = _stub(monkeypatch, 'Seattle, WA.')
+    first = sl.handler(_event({'question': 'Where is he based?'}))
+    second = sl.handler(_event({'question': '  where IS he   based? '}))
+
+    assert first['statusCode'] == 200
+    assert json.loads(first['body']) == {'reply': 'Seattle, WA.'}
+    assert second == first
+    assert len(calls) == 1
+    assert calls[0]['context'] == 'Ram lives in Seattle.'
+    assert isinstance(calls[0]['session'], gc.requests.Session)
+
+
+def test_history_bypasses_cache(monkeypatch):
+    calls = _stub(monkeypatch, 'ok')
+    history = [{'role': 'user', 'text': 'hi'}]
+    sl.handler(_event({'question': 'Q', 'history': history}))
+    sl.handler(_event({'question': 'Q', 'history': history}))
+    assert len(calls) == 2
+    assert calls[0]['history'] == history
+
+
+def test_cache_is_bounded(monkeypatch):
+    _stub(monkeypatch, 'ok')
+    monkeypatch.setattr(sl, 'ANSWER_CACHE_SIZE', 2)
+    for q in ('a', 'b', 'c'):
+        sl.handler(_event({'question': q}))
+    assert [k[0] for k in sl._answers] == ['b', 'c']
+
+
+def test_base64_body(monkeypatch):
+    _stub(monkeypatch, 'ok')
+    resp = sl.handler(_event({'question': 'Q'}, b64=True))
+    assert resp['statusCode'] == 200
+
+
+@pytest.mark.parametrize('event,status', [
+    (_event({'question': 'Q'}, method='PUT'), 405),
+    (_event({'question': 'Q'}, content_type='text/plain'), 415),
+    (_event('{not json'), 400),
+    (_event({'question': '   '}), 400),
+    ({'headers': {'Content-Type': 'application/json'}}, 400),
+])
+def test_request_validation(event, status):
+    assert sl.handler(event)['statusCode'] == status
+
+
+def _get(q=None, if_none_match=None):
+    headers = {'If-None-Match': if_none_match} if if_none_match else {}
+    return {'httpMethod': 'GET', 'headers': headers, 'queryStringParameters': {'q': q} if q is not None else None}
+
+
+def test_get_chat_is_cacheable_and_revalidates(monkeypatch):
+    calls = _stub(monkeypatch, 'Seattle, WA.')
+    resp = sl.handler(_get('Where is he based?'))
+    assert resp['statusCode'] == 200
+    assert json.loads(resp['body']) == {'reply': 'Seattle, WA.'}
+    assert resp['headers']['Cache-Control'] == 'public, max-age=300'
+    assert resp['headers']['Vary'] == 'Accept-Encoding'
+    etag = resp['headers']['ETag']
+
+    # Same normalized question: the stored answer is still valid
+    resp = sl.handler(_get('where is he based', if_none_match=etag))
+    assert resp['statusCode'] == 304
+    assert resp['headers']['ETag'] == etag
+    assert resp['body'] == ''
+    assert len(calls) == 1
+
+    assert sl.handler(_get('  '))['statusCode'] == 400
+    assert sl.handler(_get())['statusCode'] == 400
+
+
+def test_get_chat_errors_are_not_cacheable(monkeypatch):
+    _stub(monkeypatch, gc.GeminiError('boom'))
+    resp = sl.handler(_get('Q'))
+    assert resp['statusCode'] == 502
+    assert 'Cache-Control' not in resp['headers']
+
+
+def test_upstream_errors(monkeypatch):
+    _stub(monkeypatch, gc.GeminiError('boom'))
+    resp = sl.handler(_event({'question': 'Q'}))
+    assert resp['statusCode'] == 502
+    assert 'boom' in json.loads(resp['body'])['error']
+
+    _stub(monkeypatch, ValueError('Gemini API key not configured'))
+    resp = sl.handler(_event({'question': 'Q2'}))
+    assert resp['statusCode'] == 500
+
+    _stub(monkeypatch, gc.RateLimited('budget full', retry_after=2.2))
+    resp = sl.handler(_event({'question': 'Q3'}))
+    assert resp['statusCode'] == 503
+    assert resp['headers']['Retry-After'] == '3'
+
+
+def test_prompt_text_from_artifact_is_sent_when_present(tmp_path, monkeypatch):
+    calls = _stub(monkeypatch, 'ok')
+    artifact = tmp_path / 'context.json'
+    artifact.write_text(json.dumps({'context': 'Home Ram lives in Seattle.', 'fingerprint': 'abc',
+                                    'prompt': 'Ram lives in Seattle.'}), encoding='utf-8')
+    sl.handler(_event({'question': 'Q'}))
+    assert calls[0]['context'] == 'Ram lives in Seattle.'
+
+
+def test_falls_back_to_html_when_artifact_missing(tmp_path, monkeypatch):
+    calls = _stub(monkeypatch, 'ok')
+    html = tmp_path / 'index.html'
+    html.write_text('<p>From HTML</p>', encoding='utf-8')
+    monkeypatch.setattr(sl, 'CONTEXT_ARTIFACT', str(tmp_path / 'missing.json'))
+    monkeypatch.setattr(sl, 'FALLBACK_HTML', str(html))
+    sl.handler(_event({'question': 'Q'}))
+    assert calls[0]['context'] == 'From HTML'
+
+
+def test_empty_context_when_nothing_available(tmp_path, monkeypatch):
+    calls = _stub(monkeypatch, 'ok')
+    monkeypatch.setattr(sl, 'CONTEXT_ARTIFACT', str(tmp_path / 'missing.json'))
+    monkeypatch.setattr(sl, 'FALLBACK_HTML', str(tmp_path / 'missing.html'))
+    sl.handler(_event({'question': 'Q'}))
+    assert calls[0]['context'] == ''
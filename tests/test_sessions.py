@@ -0,0 +1,66 @@
+from api import gemini_client
+from api.sessions import SessionStore, clean_history
+
+
+class Clock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_clean_history_drops_malformed_turns():
+    history = [{'role': 'user', 'text': 'hi', 'extra': 1}, {'role': 'user'}, 'junk', {'role': '', 'text': 'x'},
+               {'role': 'assistant', 'text': 5}]
+    assert clean_history(history) == [{'role': 'user', 'text': 'hi'}]
+    assert clean_history('nope') == []
+
+
+def test_prefix_is_built_once_and_extended(monkeypatch):
+    builds = []
+    original = gemini_client.build_prefix_parts
+    monkeypatch.setattr(gemini_client, 'build_prefix_parts', lambda *a: builds.append(a) or original(*a))
+    session = SessionStore().create([{'role': 'user', 'text': 'hi'}, {'role': 'assistant', 'text': 'hello'}])
+
+    first = session.prompt_prefix('ctx')
+    assert [p['text'] for p in first[1:]] == ['User: hi', 'Assistant: hello']
+    session.record('Skills?', 'Python')
+    second = session.prompt_prefix('ctx')
+    assert second[len(first):] == [{'text': 'User: Skills?'}, {'text': 'Assistant: Python'}]
+    assert len(builds) == 1
+
+    # A reloaded context rebuilds the prefix with the same turns
+    third = session.prompt_prefix('new ctx')
+    assert 'new ctx' in third[0]['text'] and third[1:] == second[1:]
+    assert len(builds) == 2
+
+
+def test_old_turns_are_trimmed():
+    store = SessionStore(max_turns=2)
+    session = store.create()
+    session.record('q0', 'a0')  # before any prefix is built
+    session.prompt_prefix('ctx')
+    for i in range(1, 4):
+        session.record(f'q{i}', f'a{i}')
+    assert [t['text'] for t in session.turns] == ['q2', 'a2', 'q3', 'a3']
+    assert [p['text'] for p in session.prompt_prefix('ctx')[1:]] == ['User: q2', 'Assistant: a2',
+                                                                     'User: q3', 'Assistant: a3']
+    assert len(store.create([{'role': 'user', 'text': str(i)} for i in range(9)]).turns) == 4
+
+
+def test_sessions_expire_when_idle_and_are_bounded():
+    clock = Clock()
+    store = SessionStore(max_sessions=2, idle_ttl=10, clock=clock)
+    a = store.create()
+    clock.now += 5
+    b = store.create()
+    assert store.get(a.id) is a  # touching a makes b the least recently used
+    store.create()
+    assert store.get(b.id) is None and len(store) == 2
+
+    clock.now += 11
+    assert store.get(a.id) is None
+    store.create()  # expires idle sessions from the front
+    assert len(store) == 1
+    assert store.get('unknown') is None and store.get(None) is None
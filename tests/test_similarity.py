@@ -0,0 +1,109 @@
+import random
+import threading
+import time
+
+from api.similarity import SimilarityCache, terms
+
+
+def test_terms_drop_stopwords_and_stem():
+    assert terms("What are Ram's skills?") == {'skill': 1}
+    assert terms('Which technologies is he working with?') == {'technology': 1, 'work': 1, 'with': 1}
+    assert terms('Has he worked on projects, projects?') == {'work': 1, 'project': 2}
+    assert terms('class') == {'class': 1}
+    assert terms('What is the?') == {}
+
+
+def test_rephrased_question_hits():
+    cache = SimilarityCache()
+    cache.add('What projects has he built?', 'Many projects.', 'h1')
+    reply, matched, score = cache.lookup('projects he built', 'h1')
+    assert (reply, matched) == ('Many projects.', 'What projects has he built?')
+    assert score > 0.99
+
+
+def test_below_threshold_and_unrelated_questions_miss():
+    cache = SimilarityCache(threshold=0.9)
+    cache.add('Where did he study computer science?', 'MIT.', 'h1')
+    cache.add('Where is he based?', 'Boston.', 'h1')
+    # Shares a word but asks something else
+    assert cache.lookup('Where did he work?', 'h1') is None
+    assert cache.lookup('Favourite food?', 'h1') is None
+    assert cache.lookup('what is the', 'h1') is None
+
+
+def test_not_and_question_words_keep_questions_apart():
+    cache = SimilarityCache()
+    cache.add('Why Python?', 'Because.', 'h1')
+    cache.add('Does he use Java?', 'Yes.', 'h1')
+    assert cache.lookup('How python?', 'h1') is None
+    assert cache.lookup('Does he not use Java?', 'h1') is None
+
+
+def test_context_change_clears_index():
+    cache = SimilarityCache()
+    cache.add('Skills?', 'old', 'h1')
+    assert cache.lookup('skills', 'h2') is None
+    assert len(cache) == 0
+    cache.add('Skills?', 'new', 'h2')
+    assert cache.lookup('skills', 'h2')[0] == 'new'
+
+
+def test_readding_replaces_and_size_is_bounded():
+    cache = SimilarityCache(max_entries=2)
+    cache.add('Skills?', 'a', 'h')
+    cache.add('skills', 'b', 'h')
+    assert len(cache) == 1
+    assert cache.lookup('skills', 'h')[0] == 'b'
+    cache.add('Projects?', 'p', 'h')
+    cache.lookup('skills', 'h')  # most recently used survives eviction
+    cache.add('Education?', 'e', 'h')
+    assert len(cache) == 2
+    assert cache.lookup('projects', 'h') is None
+    assert cache.lookup('skills', 'h')[0] == 'b'
+    cache.add('the', 'ignored', 'h')
+    assert len(cache) == 2
+
+
+def test_hits_are_sampled_for_review():
+    cache = SimilarityCache(sample_rate=0.5, max_samples=2, rng=random.Random(1))
+    cache.add('Skills?', 'a', 'h')
+    for _ in range(20):
+        cache.lookup('his skills', 'h')
+    samples = cache.samples()
+    assert len(samples) == 2
+    assert samples[0] == {'question': 'his skills', 'matched': 'Skills?', 'similarity': 1.0}
+    assert SimilarityCache(sample_rate=0).samples() == []
+
+
+def test_lookup_is_sub_millisecond_on_a_full_index():
+    cache = SimilarityCache(max_entries=512)
+    rng = random.Random(7)
+    vocab = [f'word{i}' for i in range(400)]
+    for i in range(512):
+        cache.add(' '.join(rng.sample(vocab, 6)) + f' topic{i}', f'a{i}', 'h')
+    queries = [' '.join(rng.sample(vocab, 5)) for _ in range(200)]
+    start = time.perf_counter()
+    for q in queries:
+        cache.lookup(q, 'h')
+    assert (time.perf_counter() - start) / len(queries) < 0.001
+
+
+def test_concurrent_add_and_lookup():
+    cache = SimilarityCache(max_entries=50)
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(200):
+                cache.add(f'question {n} {i}', 'x', 'h')
+                cache.lookup(f'question {n} {i}', 'h')
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert len(cache) == 50
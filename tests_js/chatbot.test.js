@@ -530,3 +530,201 @@ describe('Knowledge base preloading', () => {
     consoleErrorSpy.mockRestore();
   });
 });
+
+describe('Request cancellation', () => {
+  // Drop any unconsumed mockResolvedValueOnce() left by earlier tests
+  beforeEach(() => global.fetch.mockReset());
+  afterEach(() => global.fetch.mockReset());
+
+  test('closing the chatbot aborts the pending chat request', async () => {
+    const { chatbot } = setupDOM();
+    let signal;
+    let apiCalled;
+    const apiCall = new Promise(resolve => { apiCalled = resolve; });
+    global.fetch.mockImplementation((url, opts) => {
+      if (url === '/faq-answers.json') {
+        return Promise.resolve({ ok: false });
+      }
+      signal = opts.signal;
+      apiCalled();
+      expect(opts.headers['X-Request-Timeout-Ms']).toBe('15000');
+      return new Promise((resolve, reject) => {
+        signal.addEventListener('abort', () => {
+          const err = new Error('aborted');
+          err.name = 'AbortError';
+          reject(err);
+        });
+      });
+    });
+
+    chatbot.toggleChatbot();
+    const pending = chatbot.sendMessage('What are his skills?');
+    await apiCall;
+    expect(chatbot._getState().pendingRequest).not.toBeNull();
+
+    chatbot.toggleChatbot();
+    await pending;
+
+    expect(signal.aborted).toBe(true);
+    const state = chatbot._getState();
+    expect(state.pendingRequest).toBeNull();
+    expect(state.sending).toBe(false);
+    expect(state.conversationHistory).toEqual([]);
+    expect(document.querySelectorAll('.chat-message.assistant').length).toBe(0);
+  });
+});
+
+describe('Prerendered FAQ answers', () => {
+  beforeEach(() => global.fetch.mockReset());
+  afterEach(() => global.fetch.mockReset());
+
+  test('normalizeQuestion matches the server normalization', () => {
+    const { chatbot } = setupDOM();
+    expect(chatbot.normalizeQuestion("  What's Ram's experience at META? ")).toBe("what's ram's experience at meta");
+    expect(chatbot.normalizeQuestion('skills?!')).toBe('skills');
+  });
+
+  test('first question is answered from the bundle without calling the API', async () => {
+    const { chatbot } = setupDOM();
+    global.fetch.mockImplementation(url => {
+      if (url === '/faq-answers.json') {
+        return Promise.resolve({
+          ok: true,
+          json: async () => ({ answers: { 'how can i contact him': { reply: 'Email him.' } } })
+        });
+      }
+      throw new Error('unexpected fetch ' + url);
+    });
+
+    await chatbot.sendMessage('How can I contact him?');
+
+    const urls = global.fetch.mock.calls.map(c => c[0]);
+    expect(urls).toEqual(['/faq-answers.json']);
+    expect(chatbot._getState().conversationHistory).toEqual([
+      { role: 'user', text: 'How can I contact him?' },
+      { role: 'assistant', text: 'Email him.' }
+    ]);
+  });
+
+  test('unknown questions fall through to the API', async () => {
+    const { chatbot } = setupDOM();
+    global.fetch.mockImplementation(url => {
+      if (url === '/faq-answers.json') {
+        return Promise.reject(new Error('offline'));
+      }
+      return Promise.resolve({ ok: true, json: async () => ({ reply: 'From the API.' }) });
+    });
+
+    await chatbot.sendMessage('Something else');
+
+    const urls = global.fetch.mock.calls.map(c => c[0]);
+    expect(urls).toEqual(['/faq-answers.json', '/api/chat?q=Something%20else']);
+    expect(chatbot._getState().conversationHistory[1].text).toBe('From the API.');
+  });
+});
+
+describe('Server-side sessions', () => {
+  beforeEach(() => global.fetch.mockReset());
+  afterEach(() => global.fetch.mockReset());
+
+  const chatBodies = () => global.fetch.mock.calls
+    .filter(c => c[0] === '/api/chat')
+    .map(c => JSON.parse(c[1].body));
+
+  test('follow-up questions send only the session id and question', async () => {
+    const { chatbot } = setupDOM();
+    global.fetch.mockImplementation((url, opts) => {
+      if (url === '/faq-answers.json') return Promise.resolve({ ok: false });
+      if (opts && opts.method === 'POST') {
+        return Promise.resolve({ ok: true, status: 200, json: async () => ({ reply: 'ok', session_id: 's1' }) });
+      }
+      return Promise.resolve({ ok: true, status: 200, json: async () => ({ reply: 'cached' }) });
+    });
+
+    await chatbot.sendMessage('First?');
+    await chatbot.sendMessage('Second?');
+    await chatbot.sendMessage('Third?');
+
+    // The first question is a GET without a session; the second starts one
+    expect(global.fetch.mock.calls.map(c => c[0])).toContain('/api/chat?q=First%3F');
+    expect(chatBodies()).toEqual([
+      { question: 'Second?', history: [{ role: 'user', text: 'First?' }, { role: 'assistant', text: 'cached' }] },
+      { question: 'Third?', session_id: 's1' }
+    ]);
+  });
+
+  test('first questions use a cacheable GET with the question as typed', async () => {
+    const { chatbot } = setupDOM();
+    global.fetch.mockImplementation(url => {
+      if (url === '/faq-answers.json') return Promise.resolve({ ok: false });
+      return Promise.resolve({ ok: true, status: 200, json: async () => ({ reply: 'Seattle.' }) });
+    });
+
+    await chatbot.sendMessage('  Does he know C++ or C#? ');
+
+    const [url, opts] = global.fetch.mock.calls[1];
+    expect(url).toBe('/api/chat?q=' + encodeURIComponent('Does he know C++ or C#?'));
+    expect(opts.method).toBeUndefined();
+    expect(opts.headers['X-Request-Timeout-Ms']).toBe('15000');
+    expect(chatbot._getState().sessionId).toBeNull();
+    expect(chatbot._getState().conversationHistory[1].text).toBe('Seattle.');
+  });
+
+  test('an expired session is retried once with the full history', async () => {
+    const { chatbot } = setupDOM();
+    const state = chatbot._getState();
+    state.sessionId = 'old';
+    state.conversationHistory.push({ role: 'user', text: 'First?' }, { role: 'assistant', text: 'ok' });
+    global.fetch
+      .mockResolvedValueOnce({ ok: false, status: 410, json: async () => ({ error: 'Session expired' }) })
+      .mockResolvedValueOnce({ ok: true, status: 200, json: async () => ({ reply: 'again', session_id: 's2' }) });
+
+    await chatbot.sendMessage('Second?');
+
+    expect(chatBodies()).toEqual([
+      { question: 'Second?', session_id: 'old' },
+      { question: 'Second?', history: [{ role: 'user', text: 'First?' }, { role: 'assistant', text: 'ok' }] }
+    ]);
+    expect(state.sessionId).toBe('s2');
+    expect(state.conversationHistory[3].text).toBe('again');
+  });
+
+  test('suggested follow-ups render as pills that ask the question', async () => {
+    const { chatbot } = setupDOM();
+    global.fetch.mockImplementation(url => {
+      if (url === '/faq-answers.json') return Promise.resolve({ ok: false });
+      return Promise.resolve({
+        ok: true, status: 200,
+        json: async () => ({ reply: 'ok', suggestions: ['What projects has he built?'] })
+      });
+    });
+
+    await chatbot.sendMessage('Skills?');
+    const pills = document.querySelectorAll('.follow-up-pills .suggestion-pill');
+    expect(Array.from(pills).map(p => p.textContent)).toEqual(['What projects has he built?']);
+
+    pills[0].click();
+    await new Promise(resolve => setTimeout(resolve, 0));
+
+    expect(chatbot._getState().conversationHistory[2].text).toBe('What projects has he built?');
+    // The old pills go away once a question is asked; the new reply brings its own
+    expect(document.querySelectorAll('.follow-up-pills').length).toBe(1);
+  });
+
+  test('fallback replies are labelled as quotes from the page', async () => {
+    const { chatbot } = setupDOM();
+    global.fetch.mockImplementation(url => {
+      if (url === '/faq-answers.json') return Promise.resolve({ ok: false });
+      return Promise.resolve({ ok: true, status: 200, json: async () => ({ reply: 'Location Seattle, WA.', fallback: true }) });
+    });
+
+    await chatbot.sendMessage('Where is he based?');
+
+    const bubbles = document.querySelectorAll('.chat-message.assistant .message-bubble');
+    const shown = bubbles[bubbles.length - 1].textContent;
+    expect(shown).toContain('unavailable');
+    expect(shown).toContain('"Location Seattle, WA."');
+    // Page quotes are not sent back to the model as part of the conversation
+    expect(chatbot._getState().conversationHistory).toEqual([]);
+  });
+});